@@ -0,0 +1,60 @@
+"""
+Missed-ball frames and throughput of the ball ROI pass (`Tracker(ball_roi_size=...)`)
+against full-frame detection at low and high input resolution, on the
+reference clip. Needs input_videos/08fd33_4.mp4 and models/best.pt, which are
+not in the repository, so no missed-ball or throughput figures have been
+recorded yet.
+
+Run from the repository root:
+    python -m benchmarks.bench_ball_roi
+"""
+
+import os
+import time
+
+from trackers import Tracker
+from utils import VideoReader
+
+VIDEO_PATH = "input_videos/08fd33_4.mp4"
+MODEL_PATH = "models/best.pt"
+N_FRAMES = 300
+RUNS = [
+    ("full frame at 640", dict(imgsz=640)),
+    ("full frame at 1280", dict(imgsz=1280)),
+    ("full frame at 640 + ball ROI", dict(imgsz=640, ball_roi_size=640)),
+    ("full frame at 480 + ball ROI", dict(imgsz=480, ball_roi_size=640)),
+]
+
+
+def main():
+    if not (os.path.exists(VIDEO_PATH) and os.path.exists(MODEL_PATH)):
+        print(f"{VIDEO_PATH} and {MODEL_PATH} are needed for this benchmark")
+        return
+
+    frames = list(VideoReader(VIDEO_PATH).frames(0, N_FRAMES))
+    print(f"{len(frames)} frames of {VIDEO_PATH}")
+
+    for name, options in RUNS:
+        tracker = Tracker(model_path=MODEL_PATH, **options)
+        # Warm up the models outside of the timing
+        tracker.load_models()
+        tracker.predict(tracker.model, frames[:1])
+        if tracker.ball_detector is not None:
+            tracker.ball_detector.detect_crops(frames[0], [(0, 0)])
+            tracker.ball_detector.crop_count = 0
+
+        start = time.perf_counter()
+        tracks = tracker.get_object_tracks(frames)
+        elapsed = time.perf_counter() - start
+
+        missed = sum(not ball for ball in tracks["ball"])
+        crops = tracker.ball_detector.crop_count if tracker.ball_detector else 0
+        print(
+            f"{name:<30} {len(frames) / elapsed:>6.1f} frames/s "
+            f"ball missed on {missed:>4} frames ({missed / len(frames) * 100:>5.1f}%) "
+            f"ROI crops {crops:>5}"
+        )
+
+
+if __name__ == "__main__":
+    main()
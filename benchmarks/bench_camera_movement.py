@@ -0,0 +1,120 @@
+"""
+Benchmark of `CameraMovementEstimator` against the original per-feature Python loop.
+
+With the reference clip at input_videos/08fd33_4.mp4 the estimates are also
+compared with the shipped stubs/camera_movement.pkl output. Without it, a synthetic
+clip of a textured image panned by a known random walk is used instead.
+
+Run from the repository root:
+    python -m benchmarks.bench_camera_movement
+"""
+
+import os
+import pickle
+import time
+
+import cv2
+import numpy as np
+
+from camera_movement_estimator import CameraMovementEstimator
+from utils import measure_distance, measure_xy_distance, read_video
+
+VIDEO_PATH = "input_videos/08fd33_4.mp4"
+STUB_PATH = "stubs/camera_movement.pkl"
+
+
+def legacy_camera_movement(estimator, frames):
+    # The loop `get_camera_movement` used before it was vectorized
+    camera_movement = [[0, 0]] * len(frames)
+    old_grey = cv2.cvtColor(frames[0], cv2.COLOR_BGR2GRAY)
+    old_features = cv2.goodFeaturesToTrack(image=old_grey, **estimator.features)
+
+    for frame_num in range(1, len(frames)):
+        frame_gray = cv2.cvtColor(frames[frame_num], cv2.COLOR_BGR2GRAY)
+        new_features, _, _ = cv2.calcOpticalFlowPyrLK(
+            prevImg=old_grey,
+            nextImg=frame_gray,
+            prevPts=old_features,
+            nextPts=None,
+            **estimator.lk_params,
+        )
+
+        max_distance = 0
+        camera_movement_x, camera_movement_y = 0, 0
+        for new, old in zip(new_features, old_features):
+            new_features_points = new.ravel()
+            old_features_points = old.ravel()
+            distance = measure_distance(new_features_points, old_features_points)
+            if distance > max_distance:
+                max_distance = distance
+                camera_movement_x, camera_movement_y = measure_xy_distance(
+                    old_features_points, new_features_points
+                )
+
+        if max_distance > estimator.minimum_distance:
+            camera_movement[frame_num] = [camera_movement_x, camera_movement_y]
+            old_features = cv2.goodFeaturesToTrack(frame_gray, **estimator.features)
+
+        old_grey = frame_gray.copy()
+
+    return camera_movement
+
+
+def synthetic_clip(n_frames=200, rng=None):
+    rng = rng or np.random.default_rng(0)
+    texture = cv2.GaussianBlur(
+        rng.integers(0, 255, (1400, 2400, 3), dtype=np.uint8), (5, 5), 0
+    )
+    steps = rng.normal(0, 6, (n_frames, 2))
+    steps[0] = 0
+    offsets = np.clip(np.cumsum(steps, axis=0) + [150, 150], 0, [300, 300])
+    frames = []
+    for x, y in offsets.astype(int):
+        frames.append(np.ascontiguousarray(texture[y : y + 1080, x : x + 1920]))
+
+    # A pan to the right moves the content left, so movement = old - new = +dx
+    truth = np.zeros((n_frames, 2))
+    truth[1:] = np.diff(offsets.astype(int), axis=0)
+    return frames, truth
+
+
+def compare(name, estimate, reference, elapsed, n_frames):
+    error = np.abs(
+        np.asarray(estimate, dtype=float) - np.asarray(reference, dtype=float)
+    )
+    print(
+        f"{name:<28} {elapsed / n_frames * 1e3:>8.2f} ms/frame "
+        f"mean abs err {error.mean():>6.2f} px  "
+        f"frames within 1px {np.mean(error.max(axis=1) <= 1) * 100:>5.1f}%"
+    )
+
+
+def main():
+    if os.path.exists(VIDEO_PATH):
+        frames = read_video(VIDEO_PATH)
+        with open(STUB_PATH, "rb") as f:
+            reference = pickle.load(f)
+        print(f"Reference: {STUB_PATH} ({len(frames)} frames)")
+    else:
+        frames, reference = synthetic_clip()
+        print(f"{VIDEO_PATH} not found, using a synthetic pan of {len(frames)} frames")
+
+    runs = [("legacy loop", None)] + [
+        (f"{mode}, downscale {downscale}", dict(mode=mode, downscale=downscale))
+        for mode in CameraMovementEstimator.MODES
+        for downscale in (1.0, 0.5)
+    ]
+    for name, kwargs in runs:
+        if kwargs is None:
+            estimator = CameraMovementEstimator(frames[0])
+            start = time.perf_counter()
+            estimate = legacy_camera_movement(estimator, frames)
+        else:
+            estimator = CameraMovementEstimator(frames[0], **kwargs)
+            start = time.perf_counter()
+            estimate = estimator.get_camera_movement(frames)
+        compare(name, estimate, reference, time.perf_counter() - start, len(frames))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Load time, first batch latency and throughput of the detector on each inference
+backend (see `trackers.detector_backend.DetectorBackend`), with and without
+warm-up. Models are exported on the first run and cached next to the weights.
+Needs input_videos/08fd33_4.mp4 and models/best.pt.
+
+Run from the repository root:
+    python -m benchmarks.bench_detector_backends
+"""
+
+import os
+import time
+
+from trackers.detector_backend import DetectorBackend
+from utils import VideoReader
+
+VIDEO_PATH = "input_videos/08fd33_4.mp4"
+MODEL_PATH = "models/best.pt"
+N_FRAMES = 100
+BATCH_SIZE = 20
+RUNS = [("ultralytics", "fp32"), ("onnx", "fp32"), ("openvino", "fp32")]
+
+
+def main():
+    if not (os.path.exists(VIDEO_PATH) and os.path.exists(MODEL_PATH)):
+        print(f"{VIDEO_PATH} and {MODEL_PATH} are needed for this benchmark")
+        return
+
+    frames = list(VideoReader(VIDEO_PATH).frames(0, N_FRAMES))
+    batches = [
+        frames[start : start + BATCH_SIZE]
+        for start in range(0, len(frames), BATCH_SIZE)
+    ]
+    print(f"{len(frames)} frames of {VIDEO_PATH} in batches of {BATCH_SIZE}")
+
+    for backend, precision in RUNS:
+        detector_backend = DetectorBackend(MODEL_PATH, backend, precision)
+        try:
+            start = time.perf_counter()
+            detector_backend.get_detector_path()
+            export_time = time.perf_counter() - start
+        except Exception as e:
+            print(f"{backend} {precision}: not available ({e})")
+            continue
+
+        for warm_up in (False, True):
+            start = time.perf_counter()
+            model = detector_backend.load()
+            if warm_up:
+                DetectorBackend.warm_up(model, batch_size=BATCH_SIZE, conf=0.1)
+            load_time = time.perf_counter() - start
+
+            latencies = []
+            for batch in batches:
+                start = time.perf_counter()
+                model.predict(batch, conf=0.1, verbose=False)
+                latencies.append(time.perf_counter() - start)
+
+            # Throughput after the first batch
+            steady_fps = (len(frames) - len(batches[0])) / max(sum(latencies[1:]), 1e-9)
+            print(
+                f"{backend:<12} {precision} warm-up {str(warm_up):<5} "
+                f"export/lookup {export_time:>6.2f} s, load {load_time:>6.2f} s, "
+                f"first batch {latencies[0]:>6.2f} s, then {steady_fps:>6.1f} frames/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Hand-off of 1080p frames to a worker process: a multiprocessing queue, which
+pickles every frame, against the shared-memory `FrameRingBuffer`, which copies
+each frame once and lets the worker read it in place.
+
+The worker only reads one pixel per frame, so nothing but the hand-off is timed.
+
+Run from the repository root:
+    python -m benchmarks.bench_frame_ring_buffer
+"""
+
+import multiprocessing
+import time
+
+import numpy as np
+
+from pipeline import FrameRingBuffer
+
+N_FRAMES = 300
+FRAME_SHAPE = (1080, 1920, 3)
+N_SLOTS = 16
+
+
+def read_queue(frames, results):
+    total = 0
+    while (frame := frames.get()) is not None:
+        total += int(frame[0, 0, 0])
+    results.put(total)
+
+
+def read_ring(ring, results):
+    total = 0
+    for _, frame in ring.frames():
+        total += int(frame[0, 0, 0])
+    results.put(total)
+    ring.close()
+
+
+def run_worker(context, target, args, put_frames):
+    results = context.Queue()
+    worker = context.Process(target=target, args=(*args, results))
+    worker.start()
+    # Wait for the worker to be up, so its start-up is not timed
+    time.sleep(2.0)
+
+    start = time.perf_counter()
+    put_frames()
+    total = results.get()
+    elapsed = time.perf_counter() - start
+    worker.join()
+    return total, elapsed
+
+
+def main():
+    context = multiprocessing.get_context("spawn")
+    rng = np.random.default_rng(0)
+    frames = [
+        np.full(FRAME_SHAPE, value, dtype=np.uint8) for value in rng.integers(0, 256, 8)
+    ]
+    expected = sum(int(frames[i % len(frames)][0, 0, 0]) for i in range(N_FRAMES))
+    print(f"{N_FRAMES} frames of {FRAME_SHAPE}")
+
+    frame_queue = context.Queue(maxsize=N_SLOTS)
+
+    def put_queue():
+        for frame_num in range(N_FRAMES):
+            frame_queue.put(frames[frame_num % len(frames)])
+        frame_queue.put(None)
+
+    total, elapsed = run_worker(context, read_queue, (frame_queue,), put_queue)
+    print(
+        f"{'pickled queue':<20} {N_FRAMES / elapsed:>8.1f} frames/s  "
+        f"correct: {total == expected}"
+    )
+
+    with FrameRingBuffer(N_SLOTS, FRAME_SHAPE, context=context) as ring:
+
+        def put_ring():
+            for frame_num in range(N_FRAMES):
+                ring.put(frames[frame_num % len(frames)])
+            ring.finish()
+
+        total, elapsed = run_worker(context, read_ring, (ring,), put_ring)
+    print(
+        f"{'shared ring buffer':<20} {N_FRAMES / elapsed:>8.1f} frames/s  "
+        f"correct: {total == expected}"
+    )
+
+
+if __name__ == "__main__":
+    main()
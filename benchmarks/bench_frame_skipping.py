@@ -0,0 +1,104 @@
+"""
+Throughput and tracking quality of keyframe detection (`Tracker(detect_every=N)`)
+against running the detector on every frame, on the reference clip.
+
+For every interval, the tracks of players are compared with those of
+`detect_every=1`: boxes are matched per frame by mutual best IoU, and an ID
+switch is counted whenever the track matched to a reference track changes ID.
+Needs input_videos/08fd33_4.mp4 and models/best.pt, which are not in the
+repository, so no throughput or ID-switch figures have been recorded yet.
+
+Run from the repository root:
+    python -m benchmarks.bench_frame_skipping
+"""
+
+import os
+import time
+
+import numpy as np
+
+from pipeline.chunked_pipeline import box_iou
+from trackers import Tracker
+from utils import VideoReader
+
+VIDEO_PATH = "input_videos/08fd33_4.mp4"
+MODEL_PATH = "models/best.pt"
+N_FRAMES = 300
+DETECT_EVERY = (1, 2, 3, 5, 8)
+MINIMUM_IOU = 0.5
+
+
+def compare_tracks(reference_tracks, tracks):
+    """
+    Returns the number of ID switches, the share of reference boxes matched and
+    the mean IoU of the matched boxes.
+    """
+    matched_ids = {}
+    id_switches = 0
+    n_matched = 0
+    n_reference = 0
+    ious = []
+    for reference_track, track in zip(reference_tracks, tracks):
+        n_reference += len(reference_track)
+        if not reference_track or not track:
+            continue
+
+        reference_ids = list(reference_track)
+        track_ids = list(track)
+        iou = box_iou(
+            [reference_track[track_id]["bbox"] for track_id in reference_ids],
+            [track[track_id]["bbox"] for track_id in track_ids],
+        )
+        best_track = iou.argmax(axis=1)
+        best_reference = iou.argmax(axis=0)
+        for reference_index, track_index in enumerate(best_track):
+            if (
+                best_reference[track_index] != reference_index
+                or iou[reference_index, track_index] < MINIMUM_IOU
+            ):
+                continue
+            reference_id = reference_ids[reference_index]
+            track_id = track_ids[track_index]
+            if matched_ids.get(reference_id, track_id) != track_id:
+                id_switches += 1
+            matched_ids[reference_id] = track_id
+            n_matched += 1
+            ious.append(iou[reference_index, track_index])
+
+    return id_switches, n_matched / max(n_reference, 1), float(np.mean(ious))
+
+
+def main():
+    if not (os.path.exists(VIDEO_PATH) and os.path.exists(MODEL_PATH)):
+        print(f"{VIDEO_PATH} and {MODEL_PATH} are needed for this benchmark")
+        return
+
+    frames = list(VideoReader(VIDEO_PATH).frames(0, N_FRAMES))
+    print(f"{len(frames)} frames of {VIDEO_PATH}")
+
+    reference = None
+    for detect_every in DETECT_EVERY:
+        tracker = Tracker(model_path=MODEL_PATH, detect_every=detect_every)
+        # Warm up the model outside of the timing
+        tracker.load_models()
+        tracker.model.predict(frames[:1], conf=tracker.conf, verbose=False)
+
+        start = time.perf_counter()
+        tracks = tracker.get_object_tracks(frames)
+        elapsed = time.perf_counter() - start
+        if reference is None:
+            reference = tracks
+
+        id_switches, recall, mean_iou = compare_tracks(
+            reference["players"], tracks["players"]
+        )
+        print(
+            f"detect every {detect_every}: {len(frames) / elapsed:>6.1f} frames/s "
+            f"detector on {len(tracker.detected_frames):>4} frames, "
+            f"ID switches {id_switches:>3}, "
+            f"players matched {recall * 100:>5.1f}% at mean IoU {mean_iou:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
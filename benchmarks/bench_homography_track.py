@@ -0,0 +1,98 @@
+"""
+Accuracy and speed of `HomographyTrack` on a synthetic broadcast-like camera
+that pans and zooms over a textured pitch, where the true motion is known.
+
+For each frame, a grid of pixel positions is mapped back to the first frame
+with the estimated and the true motion, and the largest difference is reported.
+Chaining frame-to-frame homographies (a keyframe every frame) is compared with
+keyframe re-anchoring. The batched per-frame transform is compared with
+`ViewTransformer.transform_points`, the static matrix with its polygon test.
+
+Run from the repository root:
+    python -m benchmarks.bench_homography_track
+"""
+
+import time
+
+import cv2
+import numpy as np
+
+from view_transformer import HomographyTrack, ViewTransformer
+
+N_FRAMES = 240
+FRAME_SIZE = (1920, 1080)
+N_POINTS = 100_000
+
+
+def camera(frame_num):
+    """
+    Homography from the pitch texture to the pixels of frame `frame_num`.
+    """
+    zoom = 1 + 0.25 * np.sin(frame_num / 60)
+    x = 200 + 2.0 * frame_num
+    y = 150 + 40 * np.sin(frame_num / 30)
+    return np.array([[zoom, 0.0, -zoom * x], [0.0, zoom, -zoom * y], [0.0, 0.0, 1.0]])
+
+
+def make_frames(rng):
+    texture = rng.integers(0, 256, (350, 650, 3), dtype=np.uint8)
+    texture = cv2.resize(cv2.GaussianBlur(texture, (0, 0), 1), (2600, 1400))
+    texture = cv2.add(texture, rng.integers(0, 40, texture.shape, dtype=np.uint8))
+    return [
+        cv2.warpPerspective(texture, camera(frame_num), FRAME_SIZE)
+        for frame_num in range(N_FRAMES)
+    ]
+
+
+def get_errors(homographies, calibration):
+    grid = np.stack(
+        np.meshgrid(np.linspace(100, 1800, 8), np.linspace(100, 1000, 5)), axis=-1
+    ).reshape(-1, 2)
+    to_pixels = np.linalg.inv(calibration)
+    errors = []
+    for frame_num, homography in enumerate(homographies):
+        true_motion = camera(0) @ np.linalg.inv(camera(frame_num))
+        motion = to_pixels @ homography.astype(np.float64)
+        error = HomographyTrack.transform_points(
+            grid, true_motion
+        ) - HomographyTrack.transform_points(grid, motion)
+        errors.append(np.abs(error).max())
+    return np.array(errors)
+
+
+def main():
+    rng = np.random.default_rng(0)
+    frames = make_frames(rng)
+    print(f"{N_FRAMES} frames, error in pixels of the first frame")
+
+    for name, keyframe_interval in (("chained", 1), ("keyframes", 48)):
+        homography_track = HomographyTrack(keyframe_interval=keyframe_interval)
+        start = time.perf_counter()
+        homographies = homography_track.get_homographies(frames)
+        elapsed = time.perf_counter() - start
+        errors = get_errors(homographies, homography_track.calibration)
+        print(
+            f"{name:<10} {N_FRAMES / elapsed:>7.1f} frames/s  "
+            f"mean error {errors.mean():>5.2f}  max error {errors.max():>5.2f}  "
+            f"last frame {errors[-1]:>5.2f}"
+        )
+
+    view_transformer = ViewTransformer()
+    points = rng.uniform(0, 1920, (N_POINTS, 2)).astype(np.float32)
+    frame_nums = rng.integers(0, N_FRAMES, N_POINTS)
+
+    start = time.perf_counter()
+    view_transformer.transform_points(points)
+    static_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    HomographyTrack.transform_points(points, homographies[frame_nums])
+    track_time = time.perf_counter() - start
+    print(
+        f"transform {N_POINTS} points: static {static_time * 1e3:.1f} ms, "
+        f"per-frame homographies {track_time * 1e3:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Start-up cost of the command line: the time to import `main` in a fresh
+interpreter, the slowest modules it imports (from `python -X importtime`) and
+which heavy dependencies were loaded. The detector, ByteTrack and KMeans
+dependencies are only imported by the stages that use them, so none should be.
+
+Run from the repository root:
+    python -m benchmarks.bench_import_time
+"""
+
+import subprocess
+import sys
+
+N_RUNS = 5
+HEAVY_MODULES = ("ultralytics", "supervision", "torch", "sklearn", "pandas", "pyarrow")
+CHECK_MODULES = (
+    "import sys, main; "
+    f"print(*[name for name in {HEAVY_MODULES!r} if name in sys.modules])"
+)
+
+
+def import_main():
+    """
+    Import `main` once, returns the cumulative import time of every module in
+    seconds and the heavy modules loaded.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHECK_MODULES],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    import_times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            import_times[name.strip()] = int(cumulative) / 1e6
+    return import_times, result.stdout.split()
+
+
+def main():
+    runs = [import_main() for _ in range(N_RUNS)]
+    import_times, heavy_modules = min(runs, key=lambda run: run[0]["main"])
+    print(f"import main: {import_times['main'] * 1e3:.0f} ms (best of {N_RUNS})")
+
+    print("slowest imports:")
+    slowest = sorted(import_times.items(), key=lambda item: -item[1])[1:11]
+    for name, seconds in slowest:
+        print(f"    {name:<40} {seconds * 1e3:>8.1f} ms")
+    print(f"heavy modules loaded: {', '.join(heavy_modules) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Offline benchmark of every stage after detection, driven by the shipped stubs:
+position, camera adjust, view transform, speed and distance, ball interpolation,
+team assignment, ball assignment and drawing, run the way `main` runs them.
+
+Tracks come from stubs/track_stubs.pkl and camera movement from
+stubs/camera_movement.pkl. The scaling runs tile them to 10x and 100x their
+length, with new player and referee ids in every repetition as in a longer match.
+Frames are a small pool of synthetic 1080p frames with the jerseys of the stub
+players, reused over the video, so the frames never have to fit in memory.
+
+Results are stored per commit in benchmarks/results/<commit>.json and can be
+compared with the results of another commit.
+
+Run from the repository root:
+    python -m benchmarks.bench_pipeline_stages
+    python -m benchmarks.bench_pipeline_stages --scales 1 10 --compare <commit>
+"""
+
+import argparse
+import json
+import os
+import pickle
+import platform
+import subprocess
+import time
+
+import numpy as np
+
+from benchmarks.bench_team_colors import synthetic_frame
+from camera_movement_estimator import CameraMovementEstimator
+from player_ball_assigner import PlayerBallAssiginer, PossessionCounter
+from profiling import PipelineProfiler
+from renderer import OverlayRenderer
+from speed_and_distance_estimator import SpeedAndDistanceEstimator
+from team_assignier import PlayerColorExtractor, TeamAssiginer
+from track_store import OBJECT_CLASSES, TrackStore
+from trackers import Tracker
+from view_transformer import ViewTransformer
+
+TRACK_STUB_PATH = "stubs/track_stubs.pkl"
+CAMERA_MOVEMENT_STUB_PATH = "stubs/camera_movement.pkl"
+RESULTS_DIR = "benchmarks/results"
+SCALES = (1, 10, 100)
+FRAME_POOL_SIZE = 16
+FPS = 24.0
+# Added to the player and referee ids of every repetition, above the stub ids
+ID_OFFSET = 1000
+
+
+def load_stubs():
+    with open(TRACK_STUB_PATH, "rb") as f:
+        tracks = pickle.load(f)
+    with open(CAMERA_MOVEMENT_STUB_PATH, "rb") as f:
+        camera_movement = pickle.load(f)
+    return TrackStore.from_tracks(tracks), camera_movement
+
+
+def tile_store(store, scale):
+    """
+    Repeat the rows of `store` `scale` times one after the other, giving the
+    players and referees of every repetition new ids. The ball keeps its id.
+    """
+    repetition = np.repeat(np.arange(scale), len(store))
+    is_ball = np.tile(store.object_class == OBJECT_CLASSES.index("ball"), scale)
+    return TrackStore(
+        np.tile(store.frame, scale) + repetition * store.n_frames,
+        np.tile(store.object_class, scale),
+        np.tile(store.track_id, scale) + np.where(is_ball, 0, repetition * ID_OFFSET),
+        np.tile(store.bbox, (scale, 1)),
+        n_frames=store.n_frames * scale,
+    )
+
+
+def make_frame_pool(store, rng):
+    return [
+        synthetic_frame(store.frame_tracks(frame_num)["players"], rng)
+        for frame_num in range(min(FRAME_POOL_SIZE, store.n_frames))
+    ]
+
+
+def run_stages(store, camera_movement, frame_pool, profiler, color_method="kmeans"):
+    n_frames = store.n_frames
+    frames = [frame_pool[frame_num % len(frame_pool)] for frame_num in range(n_frames)]
+
+    # Only the store and interpolation methods are used, so no model is loaded
+    tracker = Tracker.__new__(Tracker)
+    cm_estimator = CameraMovementEstimator(frame=frame_pool[0])
+
+    with profiler.stage("positions", n_frames):
+        tracker.add_position_to_store(store)
+    with profiler.stage("camera_adjust", n_frames):
+        cm_estimator.adjust_positions_to_store(store, camera_movement)
+    with profiler.stage("view_transform", n_frames):
+        ViewTransformer().add_transformed_position_to_store(store)
+    with profiler.stage("speed_and_distance", n_frames):
+        speed_distance_estimator = SpeedAndDistanceEstimator(frame_rate=FPS)
+        speed_distance_estimator.add_speed_and_distance_to_store(store)
+    with profiler.stage("store_to_tracks", n_frames):
+        tracks = store.to_tracks()
+
+    with profiler.stage("ball_interpolation", n_frames):
+        tracks["ball"] = tracker.interpolate_ball_positions(tracks["ball"])
+
+    with profiler.stage("team_assignment", n_frames):
+        team_assignier = TeamAssiginer(color_method=color_method)
+        team_assignier.assign_team_color(frames[0], tracks["players"][0])
+        for frame_num, player_track in enumerate(tracks["players"]):
+            player_teams = team_assignier.get_players_teams(
+                frames[frame_num], player_track, frame_num
+            )
+            for player_id, team_id in player_teams.items():
+                player_track[player_id]["team"] = team_id
+                player_track[player_id]["color"] = team_assignier.team_colors[team_id]
+
+    with profiler.stage("ball_assignment", n_frames):
+        player_assigner = PlayerBallAssiginer()
+        assigned_players = player_assigner.assign_ball_to_tracks(tracks)
+        team_ball_control = player_assigner.get_team_ball_control(
+            tracks, assigned_players
+        )
+
+    # Like `OverlayRenderer.render_frames`, on a copy of the pooled frame
+    with profiler.stage("drawing", n_frames):
+        renderer = OverlayRenderer()
+        possession = PossessionCounter()
+        for frame_num, team_id in enumerate(team_ball_control):
+            possession.update(team_id)
+            renderer.render_frame(
+                frames[frame_num].copy(),
+                {objects: tracks[objects][frame_num] for objects in tracks},
+                possession.percentages(),
+                camera_movement[frame_num],
+            )
+
+
+def get_commit():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        changes = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if changes else commit
+
+
+def get_results_path(commit):
+    return os.path.join(RESULTS_DIR, f"{commit}.json")
+
+
+def load_results(commit_or_path):
+    path = commit_or_path
+    if not os.path.exists(path):
+        path = get_results_path(commit_or_path)
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_results(results):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = get_results_path(results["commit"])
+    # Runs of other scales on the same commit are kept
+    if os.path.exists(path):
+        previous = load_results(path)
+        previous["scales"].update(results["scales"])
+        results["scales"] = previous["scales"]
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    return path
+
+
+def print_results(results, reference=None):
+    header = f"{'scale':>6} {'stage':<20} {'seconds':>9} {'frames/s':>10}"
+    if reference is not None:
+        header += f" {'reference':>10} {'speedup':>8}"
+    print(header)
+
+    for scale, stages in sorted(results["scales"].items(), key=lambda x: int(x[0])):
+        reference_stages = (reference or {}).get("scales", {}).get(scale, {})
+        for stage, stats in stages.items():
+            line = (
+                f"{scale + 'x':>6} {stage:<20} {stats['seconds']:>9.3f} "
+                f"{stats['frames_per_second']:>10.1f}"
+            )
+            reference_stats = reference_stages.get(stage)
+            if reference is not None and reference_stats is not None:
+                line += (
+                    f" {reference_stats['frames_per_second']:>10.1f} "
+                    f"{reference_stats['seconds'] / stats['seconds']:>7.2f}x"
+                )
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--scales",
+        type=int,
+        nargs="+",
+        default=SCALES,
+        help="lengths to run, as multiples of the stub length",
+    )
+    parser.add_argument(
+        "--compare",
+        metavar="COMMIT",
+        default=None,
+        help="commit (or results file) to compare the results with",
+    )
+    parser.add_argument(
+        "--color-method",
+        choices=PlayerColorExtractor.METHODS,
+        default="kmeans",
+        help="jersey colour extraction of the team assignment stage",
+    )
+    args = parser.parse_args()
+
+    store, camera_movement = load_stubs()
+    frame_pool = make_frame_pool(store, np.random.default_rng(0))
+    reference = load_results(args.compare) if args.compare else None
+
+    results = {
+        "commit": get_commit(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "color_method": args.color_method,
+        "scales": {},
+    }
+    for scale in args.scales:
+        print(f"{scale}x: {store.n_frames * scale} frames")
+        profiler = PipelineProfiler()
+        run_stages(
+            tile_store(store, scale),
+            camera_movement * scale,
+            frame_pool,
+            profiler,
+            args.color_method,
+        )
+        results["scales"][str(scale)] = {
+            stage: {
+                "seconds": stats["seconds"],
+                "frames_per_second": stats["frames_per_second"],
+                "peak_rss_bytes": stats["peak_rss_bytes"],
+            }
+            for stage, stats in profiler.get_report()["stages"].items()
+        }
+
+    print(f"Results saved at path: {save_results(results)}")
+    print_results(results, reference)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark of the positional stages (position, camera adjust, view transform):
+nested-dict per-object loops against the vectorized `TrackStore` methods.
+
+Run from the repository root:
+    python -m benchmarks.bench_positional_stages
+"""
+
+import time
+
+import numpy as np
+
+from camera_movement_estimator import CameraMovementEstimator
+from track_store import OBJECT_CLASSES, TrackStore
+from utils import (
+    get_center_of_bbox,
+    get_centers_of_bboxes,
+    get_foot_position,
+    get_foot_positions,
+)
+from view_transformer import ViewTransformer
+
+OBJECTS_PER_FRAME = 25
+ROW_COUNTS = (1_000, 10_000, 100_000)
+
+
+def make_store(n_rows, rng):
+    n_frames = n_rows // OBJECTS_PER_FRAME
+    frame = np.repeat(np.arange(n_frames), OBJECTS_PER_FRAME)
+    track_id = np.tile(np.arange(OBJECTS_PER_FRAME), n_frames)
+    object_class = np.where(
+        track_id == 0, OBJECT_CLASSES.index("ball"), OBJECT_CLASSES.index("players")
+    )
+    x1 = rng.uniform(0, 1850, len(frame))
+    y1 = rng.uniform(200, 1000, len(frame))
+    bbox = np.stack([x1, y1, x1 + 40, y1 + 80], axis=1)
+    return TrackStore(frame, object_class, track_id, bbox, n_frames=n_frames)
+
+
+def run_dict_stages(tracks, camera_movement, cm_estimator, view_transformer):
+    # Inline copy of `Tracker.add_position_to_tracks`, without loading the tracker model
+    for objects, object_track in tracks.items():
+        for track in object_track:
+            for track_info in track.values():
+                bbox = track_info["bbox"]
+                if objects == "ball":
+                    track_info["position"] = get_center_of_bbox(bbox)
+                else:
+                    track_info["position"] = get_foot_position(bbox)
+    cm_estimator.adjust_positions_to_tracks(tracks, camera_movement)
+    view_transformer.add_transformed_position_to_tracks(tracks)
+
+
+def run_store_stages(store, camera_movement, cm_estimator, view_transformer):
+    # Same as `Tracker.add_position_to_store`, without loading the tracker model
+    is_ball = store.object_class == OBJECT_CLASSES.index("ball")
+    positions = get_foot_positions(store.bbox)
+    positions[is_ball] = get_centers_of_bboxes(store.bbox[is_ball])
+    store.set("position", positions)
+    cm_estimator.adjust_positions_to_store(store, camera_movement)
+    view_transformer.add_transformed_position_to_store(store)
+
+
+def main():
+    rng = np.random.default_rng(0)
+    cm_estimator = CameraMovementEstimator(np.zeros((1080, 1920, 3), dtype=np.uint8))
+    view_transformer = ViewTransformer()
+
+    print(
+        f"{'rows':>8} {'frames':>7} {'dict us/frame':>14} {'store us/frame':>15} {'speedup':>8}"
+    )
+    for n_rows in ROW_COUNTS:
+        store = make_store(n_rows, rng)
+        camera_movement = rng.normal(0, 3, (store.n_frames, 2)).tolist()
+        tracks = store.to_tracks()
+
+        start = time.perf_counter()
+        run_dict_stages(tracks, camera_movement, cm_estimator, view_transformer)
+        dict_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        run_store_stages(store, camera_movement, cm_estimator, view_transformer)
+        store_time = time.perf_counter() - start
+
+        print(
+            f"{n_rows:>8} {store.n_frames:>7} "
+            f"{dict_time / store.n_frames * 1e6:>14.1f} "
+            f"{store_time / store.n_frames * 1e6:>15.1f} "
+            f"{dict_time / store_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Render-only benchmark of the annotation overlay: the original two passes
+(`Tracker.draw_annotations` then `SpeedAndDistanceEstimator.draw_speed_and_distance`)
+against `OverlayRenderer` with one and several worker threads.
+
+Tracks come from stubs/track_stubs.pkl with synthetic team colours, ball
+possession and speed/distance values, drawn over noise frames so nothing but
+drawing is timed. Every renderer output is checked to be pixel identical to
+the original.
+
+Run from the repository root:
+    python -m benchmarks.bench_render
+"""
+
+import os
+import pickle
+import time
+
+import numpy as np
+
+from renderer import OverlayRenderer
+from speed_and_distance_estimator import SpeedAndDistanceEstimator
+from trackers import Tracker
+
+STUB_PATH = "stubs/track_stubs.pkl"
+N_FRAMES = 120
+FRAME_WINDOW = 5
+
+
+def make_annotations(rng):
+    with open(STUB_PATH, "rb") as f:
+        tracks = pickle.load(f)
+    n_frames = min(N_FRAMES, len(tracks["players"]))
+    tracks = {objects: track[:n_frames] for objects, track in tracks.items()}
+
+    team_colors = {1: (220.4, 225.7, 230.1), 2: (150.2, 230.9, 180.5)}
+    for frame_num, player_track in enumerate(tracks["players"]):
+        # Like the estimator, speed and distance change once per frame window
+        window_rng = np.random.default_rng(frame_num // FRAME_WINDOW)
+        for track_id, player in player_track.items():
+            player["team"] = 1 + track_id % 2
+            player["color"] = team_colors[player["team"]]
+            player["speed"] = float(window_rng.uniform(0, 30)) + track_id
+            player["distance"] = float(window_rng.uniform(0, 500)) + track_id
+
+    team_ball_control = rng.choice([0, 1, 2], n_frames, p=[0.3, 0.35, 0.35])
+    camera_movement = rng.normal(0, 3, (n_frames, 2)).tolist()
+    return tracks, team_ball_control, camera_movement
+
+
+def main():
+    rng = np.random.default_rng(0)
+    tracks, team_ball_control, camera_movement = make_annotations(rng)
+    n_frames = len(team_ball_control)
+    base = rng.integers(0, 256, (n_frames, 1080, 1920, 3), dtype=np.uint8)
+    print(f"{n_frames} frames of {len(tracks['players'][0])} players")
+
+    # Only the drawing methods are used, so the detection model is not loaded
+    tracker = Tracker.__new__(Tracker)
+    speed_distance_estimator = SpeedAndDistanceEstimator()
+    start = time.perf_counter()
+    reference = tracker.draw_annotations(
+        list(base), team_ball_control, tracks, camera_movement
+    )
+    reference = speed_distance_estimator.draw_speed_and_distance(reference, tracks)
+    elapsed = time.perf_counter() - start
+    print(f"{'original two passes':<24} {n_frames / elapsed:>8.1f} frames/s")
+
+    for num_workers in sorted({1, 2, os.cpu_count() or 1}):
+        renderer = OverlayRenderer()
+        frames = list(base.copy())
+        start = time.perf_counter()
+        renderer.render_frames(
+            frames, tracks, team_ball_control, camera_movement, num_workers
+        )
+        elapsed = time.perf_counter() - start
+        identical = all(np.array_equal(a, b) for a, b in zip(frames, reference))
+        print(
+            f"{f'renderer, {num_workers} workers':<24} "
+            f"{n_frames / elapsed:>8.1f} frames/s  pixel identical: {identical}"
+        )
+
+
+if __name__ == "__main__":
+    main()
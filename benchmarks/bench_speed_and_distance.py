@@ -0,0 +1,74 @@
+"""
+Benchmark of the speed and distance engine on a 90-minute match worth of player
+tracks (24 fps, 22 players on the pitch, a new track ID roughly every 2 minutes).
+
+The windowed nested-dict method is timed on the first minute only and
+extrapolated, since it would take far longer on the full match.
+
+Run from the repository root:
+    python -m benchmarks.bench_speed_and_distance
+"""
+
+import time
+
+import numpy as np
+
+from speed_and_distance_estimator import SpeedAndDistanceEstimator
+from track_store import OBJECT_CLASSES, TrackStore
+
+FRAME_RATE = 24
+MATCH_MINUTES = 90
+PLAYERS = 22
+TRACK_FRAMES = 2 * 60 * FRAME_RATE
+
+
+def make_match(n_frames, rng):
+    frame = np.repeat(np.arange(n_frames), PLAYERS)
+    slot = np.tile(np.arange(PLAYERS), n_frames)
+    # Every slot gets a new track ID every TRACK_FRAMES frames, shifted per slot
+    track_id = slot + PLAYERS * ((frame + slot * 97) // TRACK_FRAMES)
+
+    store = TrackStore(
+        frame,
+        np.full(len(frame), OBJECT_CLASSES.index("players")),
+        track_id,
+        np.zeros((len(frame), 4)),
+        n_frames=n_frames,
+    )
+
+    steps = rng.normal(0, 0.15, (n_frames, PLAYERS, 2))
+    positions = np.cumsum(steps, axis=0).reshape(-1, 2) + [11, 34]
+    # Rows of the store are sorted by (frame, class, track_id), match them up
+    transformed = positions[np.lexsort((track_id, frame))]
+    # About 2% of positions fall outside the calibrated area
+    transformed[rng.random(len(transformed)) < 0.02] = np.nan
+    store.set("transformed_position", transformed)
+    return store
+
+
+def main():
+    rng = np.random.default_rng(0)
+    n_frames = MATCH_MINUTES * 60 * FRAME_RATE
+    store = make_match(n_frames, rng)
+    print(f"{n_frames} frames, {len(store)} player rows")
+
+    for smoothing in SpeedAndDistanceEstimator.SMOOTHING_METHODS:
+        estimator = SpeedAndDistanceEstimator(
+            frame_rate=FRAME_RATE, smoothing=smoothing
+        )
+        start = time.perf_counter()
+        estimator.add_speed_and_distance_to_store(store)
+        elapsed = time.perf_counter() - start
+        print(f"store, {smoothing:<8} {elapsed:>8.2f} s")
+
+    minute_frames = 60 * FRAME_RATE
+    tracks = make_match(minute_frames, rng).to_tracks()
+    estimator = SpeedAndDistanceEstimator(frame_rate=FRAME_RATE)
+    start = time.perf_counter()
+    estimator.add_speed_and_distance_to_tracks(tracks)
+    elapsed = (time.perf_counter() - start) * MATCH_MINUTES
+    print(f"nested dicts     {elapsed:>8.2f} s (extrapolated from 1 minute)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Accuracy and speed of the `PlayerColorExtractor` methods against the original
+per-player scikit-learn KMeans.
+
+Player bboxes come from stubs/track_stubs.pkl. Frames are decoded from the
+reference clip when input_videos/08fd33_4.mp4 exists; otherwise synthetic frames
+are drawn with two jersey colours on a grass background.
+
+Run from the repository root:
+    python -m benchmarks.bench_team_colors
+"""
+
+import os
+import pickle
+import time
+
+import cv2
+import numpy as np
+from sklearn.cluster import KMeans
+
+from team_assignier import PlayerColorExtractor
+from utils import iter_video
+
+VIDEO_PATH = "input_videos/08fd33_4.mp4"
+STUB_PATH = "stubs/track_stubs.pkl"
+N_FRAMES = 20
+
+
+def synthetic_frame(player_track, rng):
+    frame = np.full((1080, 1920, 3), (60, 140, 70), dtype=np.uint8)
+    jerseys = [(220, 225, 230), (150, 230, 180)]
+    for track_id, player in player_track.items():
+        x1, y1, x2, y2 = map(int, player["bbox"])
+        shirt_y = y1 + (y2 - y1) // 2
+        cv2.rectangle(
+            frame, (x1 + 4, y1 + 6), (x2 - 4, shirt_y), jerseys[track_id % 2], -1
+        )
+        cv2.rectangle(frame, (x1 + 4, shirt_y), (x2 - 4, y2), (30, 30, 30), -1)
+    noise = rng.normal(0, 12, frame.shape)
+    return np.clip(frame + noise, 0, 255).astype(np.uint8)
+
+
+def team_labels(colors, fit_colors):
+    kmeans = KMeans(n_clusters=2, init="k-means++", n_init=1, random_state=0)
+    kmeans.fit(fit_colors)
+    return kmeans.predict(colors)
+
+
+def main():
+    with open(STUB_PATH, "rb") as f:
+        tracks = pickle.load(f)
+    player_tracks = tracks["players"][:N_FRAMES]
+
+    if os.path.exists(VIDEO_PATH):
+        frames = list(iter_video(VIDEO_PATH, 0, N_FRAMES))
+        print(f"Frames from {VIDEO_PATH}")
+    else:
+        rng = np.random.default_rng(0)
+        frames = [synthetic_frame(track, rng) for track in player_tracks]
+        print(f"{VIDEO_PATH} not found, using synthetic frames")
+
+    results = {}
+    for method in PlayerColorExtractor.METHODS:
+        extractor = PlayerColorExtractor(method=method)
+        start = time.perf_counter()
+        colors = [
+            extractor.get_player_colors(
+                frame, [player["bbox"] for player in track.values()]
+            )
+            for frame, track in zip(frames, player_tracks)
+        ]
+        elapsed = time.perf_counter() - start
+        results[method] = (np.concatenate(colors), elapsed)
+
+    reference_colors = results["kmeans"][0]
+    reference_teams = team_labels(reference_colors, reference_colors)
+    n_players = len(reference_colors)
+
+    print(f"{n_players} player crops over {len(frames)} frames")
+    for method, (colors, elapsed) in results.items():
+        color_error = np.linalg.norm(colors - reference_colors, axis=1)
+        teams = team_labels(colors, colors)
+        # Team numbers are arbitrary, so compare up to a swap
+        agreement = max(
+            np.mean(teams == reference_teams), np.mean(teams != reference_teams)
+        )
+        print(
+            f"{method:<10} {elapsed / len(frames) * 1e3:>8.2f} ms/frame "
+            f"median colour distance to kmeans {np.median(color_error):>6.1f} "
+            f"team agreement {agreement * 100:>5.1f}%"
+        )
+
+
+if __name__ == "__main__":
+    main()
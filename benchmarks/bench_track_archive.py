@@ -0,0 +1,97 @@
+"""
+Range queries on a `TrackArchive` against unpickling the nested tracks dict.
+
+stubs/track_stubs.pkl is tiled to a longer match (new player ids in every
+repetition, see `bench_pipeline_stages`), saved both as a pickle and as an
+archive, and the same questions are answered from each: the positions of one
+track over a time range, and all players of a short frame range.
+
+Needs pyarrow. Run from the repository root:
+    python -m benchmarks.bench_track_archive
+"""
+
+import os
+import pickle
+import shutil
+import tempfile
+import time
+
+from benchmarks.bench_pipeline_stages import ID_OFFSET, tile_store
+from track_archive import TrackArchive, TrackArchiveWriter
+from track_store import TrackStore
+from utils import get_foot_positions
+
+STUB_PATH = "stubs/track_stubs.pkl"
+SCALE = 40
+FPS = 24.0
+
+
+def time_call(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def main():
+    with open(STUB_PATH, "rb") as f:
+        store = TrackStore.from_tracks(pickle.load(f))
+    store = tile_store(store, SCALE)
+    store.set("position", get_foot_positions(store.bbox))
+    store.set("team", 1 + store.track_id % 2)
+    track_id = 12 + ID_OFFSET * (SCALE // 2)
+    start_frame = store.n_frames // 2 - int(60 * FPS)
+    stop_frame = start_frame + int(120 * FPS)
+    print(f"{store.n_frames} frames, {len(store)} rows")
+
+    directory = tempfile.mkdtemp()
+    try:
+        pickle_path = os.path.join(directory, "tracks.pkl")
+        archive_path = os.path.join(directory, "tracks")
+        with open(pickle_path, "wb") as f:
+            pickle.dump(store.to_tracks(), f)
+        with TrackArchiveWriter(archive_path, fps=FPS) as writer:
+            writer.append(store)
+
+        def query_pickle():
+            with open(pickle_path, "rb") as f:
+                tracks = pickle.load(f)
+            track = [
+                (frame_num, tracks["players"][frame_num][track_id]["position"])
+                for frame_num in range(start_frame, stop_frame)
+                if track_id in tracks["players"][frame_num]
+            ]
+            players = tracks["players"][start_frame : start_frame + 25]
+            return len(track), sum(len(frame) for frame in players)
+
+        def query_archive():
+            archive = TrackArchive(archive_path)
+            track = archive.read_track(
+                "players", track_id, start_frame / FPS, stop_frame / FPS
+            )
+            players = archive.read_tracks(
+                start_frame, start_frame + 25, objects="players"
+            )
+            return len(track["frame"]), len(players["frame"])
+
+        pickle_result, pickle_time = time_call(query_pickle)
+        archive_result, archive_time = time_call(query_archive)
+        print(f"{'pickle':<8} {pickle_time * 1e3:>8.1f} ms  {pickle_result}")
+        print(
+            f"{'archive':<8} {archive_time * 1e3:>8.1f} ms  {archive_result}  "
+            f"same rows: {pickle_result == archive_result}"
+        )
+        sizes = {
+            "pickle": os.path.getsize(pickle_path),
+            "archive": sum(
+                os.path.getsize(os.path.join(root, name))
+                for root, _, names in os.walk(archive_path)
+                for name in names
+            ),
+        }
+        print(", ".join(f"{name} {size / 1e6:.1f} MB" for name, size in sizes.items()))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
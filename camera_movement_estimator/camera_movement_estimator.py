@@ -4,30 +4,44 @@ import pickle
 import cv2
 import numpy as np
 
-from utils import measure_distance, measure_xy_distance
-
 
 class CameraMovementEstimator:
-    def __init__(self, frame) -> None:
+    MODES = ("max", "median", "affine")
+
+    def __init__(self, frame, mode="max", downscale=1.0) -> None:
         """
         Initialize the CameraMovementEstimator class.
 
         Args:
             frame: The first frame of the video.
+            mode: How the movement is estimated from the tracked features:
+                "max" uses the feature that moved the most (the original behaviour),
+                "median" the per-axis median displacement, and "affine" a RANSAC
+                partial affine fit (`cv2.estimateAffinePartial2D`) evaluated at the
+                centroid of the features.
+            downscale: Factor applied to the grey frames before tracking features,
+                e.g. 0.5 tracks at half resolution. Movements are reported in pixels
+                of the original frame.
         """
+        if mode not in self.MODES:
+            raise ValueError(
+                f"Unknown camera movement mode {mode!r}, use one of {self.MODES}"
+            )
+        self.mode = mode
+        self.downscale = downscale
 
         # Set the minimum distance threshold for considering a camera movement.
         self.minimum_distance = 5
 
         # Convert the first frame to grayscale.
-        first_frame_greyscale = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        first_frame_greyscale = self.to_grey(frame)
 
         # Create a mask for the features to track.
         # The mask is a binary image where 1 indicates the feature is trackable.
-        # In this case, we are setting the first 20 columns and the pixel at (900, 1050) to 1.
+        # In this case, we are setting the first 20 columns and the columns 900 to 1050 to 1.
         mask_features = np.zeros_like(first_frame_greyscale)
-        mask_features[:, 0:20] = 1
-        mask_features[:, 900:1050] = 1
+        mask_features[:, 0 : int(20 * downscale)] = 1
+        mask_features[:, int(900 * downscale) : int(1050 * downscale)] = 1
 
         # Set the parameters for the goodFeaturesToTrack function.
         # These parameters specify the maximum number of corners, quality level, minimum distance,
@@ -53,18 +67,28 @@ class CameraMovementEstimator:
         )
 
     def adjust_positions_to_tracks(self, tracks, camera_movement_per_frame):
-        for objects, object_track in tracks.items():
-            for frame_num, track in enumerate(object_track):
-                for track_id, track_info in track.items():
-                    position = track_info["position"]
-                    camera_movement = camera_movement_per_frame[frame_num]
-                    adjusted_position = [
-                        position[0] - camera_movement[0],
-                        position[1] - camera_movement[1],
-                    ]
-                    tracks[objects][frame_num][track_id][
-                        "adjusted_position"
-                    ] = adjusted_position
+        for frame_num in range(len(tracks["players"])):
+            self.adjust_positions_to_frame_tracks(
+                {objects: tracks[objects][frame_num] for objects in tracks},
+                camera_movement_per_frame[frame_num],
+            )
+
+    def adjust_positions_to_frame_tracks(self, frame_tracks, camera_movement):
+        for objects, track in frame_tracks.items():
+            for track_id, track_info in track.items():
+                position = track_info["position"]
+                adjusted_position = [
+                    position[0] - camera_movement[0],
+                    position[1] - camera_movement[1],
+                ]
+                track[track_id]["adjusted_position"] = adjusted_position
+
+    def adjust_positions_to_store(self, store, camera_movement_per_frame):
+        """
+        Vectorized `adjust_positions_to_tracks` for a `TrackStore`.
+        """
+        camera_movement = np.asarray(camera_movement_per_frame, dtype=np.float32)
+        store.set("adjusted_position", store.position - camera_movement[store.frame])
 
     def get_camera_movement(self, frames, read_from_stub=False, stub_path=None):
         # If we should read from a stub file and the stub path is provided and the file exists,
@@ -75,56 +99,10 @@ class CameraMovementEstimator:
                 camera_movement = pickle.load(f)
                 return camera_movement
 
-        # Initialize an empty list to hold the camera movement for each frame.
-        camera_movement = [[0, 0]] * len(frames)
-
-        # Convert the first frame to grayscale and find the features to track.
-        old_grey = cv2.cvtColor(frames[0], cv2.COLOR_BGR2GRAY)
-        old_features = cv2.goodFeaturesToTrack(image=old_grey, **self.features)
-
-        # Iterate over each frame after the first frame.
-        for frame_num in range(1, len(frames)):
-            # Convert the current frame to grayscale.
-            frame_gray = cv2.cvtColor(frames[frame_num], cv2.COLOR_BGR2GRAY)
-
-            # Use the Lucas-Kanade algorithm to track the features between the current and previous frames.
-            new_features, _, _ = cv2.calcOpticalFlowPyrLK(
-                prevImg=old_grey,
-                nextImg=frame_gray,
-                prevPts=old_features,
-                nextPts=None,
-                **self.lk_params,
-            )
-
-            # Initialize variables to hold the maximum distance and the camera movement for the frame.
-            max_distance = 0
-            camera_movement_x, camera_movement_y = 0, 0
-
-            # Iterate over each new feature and old feature pair.
-            for new, old in zip(new_features, old_features):
-                # Convert the new and old features to a single dimension array.
-                new_features_points = new.ravel()
-                old_features_points = old.ravel()
-
-                # Calculate the distance between the new and old features.
-                distance = measure_distance(new_features_points, old_features_points)
-
-                # If the distance is greater than the maximum distance, update the maximum distance and the camera movement for the frame.
-                if distance > max_distance:
-                    max_distance = distance
-                    camera_movement_x, camera_movement_y = measure_xy_distance(
-                        old_features_points, new_features_points
-                    )
-
-            # If the maximum distance is greater than the minimum distance, update the camera movement for the frame.
-            if max_distance > self.minimum_distance:
-                camera_movement[frame_num] = [camera_movement_x, camera_movement_y]
-
-                # Update the old features for the next frame.
-                old_features = cv2.goodFeaturesToTrack(frame_gray, **self.features)
-
-            # Update the old grayscale frame for the next frame.
-            old_grey = frame_gray.copy()
+        # Estimate the camera movement for each frame, the first frame has no movement.
+        camera_movement = [
+            movement for _, movement in self.get_camera_movement_stream(frames)
+        ]
 
         # If a stub path is provided, write the camera movement to the stub file.
         if stub_path is not None:
@@ -134,3 +112,107 @@ class CameraMovementEstimator:
 
         # Return the camera movement for each frame.
         return camera_movement
+
+    def get_camera_movement_stream(self, frames):
+        """
+        Streaming counterpart of `get_camera_movement`.
+
+        Consumes any iterable of frames and yields `(frame, camera_movement)` pairs.
+        Only the previous (downscaled) grey frame and its tracked features are kept
+        between frames, so each frame is converted only once.
+        """
+        old_grey = None
+        old_features = None
+        for frame in frames:
+            frame_grey = self.to_grey(frame)
+
+            if old_grey is None:
+                old_features = cv2.goodFeaturesToTrack(
+                    image=frame_grey, **self.features
+                )
+                movement = [0, 0]
+            else:
+                movement, old_features = self.estimate_frame_movement(
+                    old_grey, frame_grey, old_features
+                )
+
+            old_grey = frame_grey
+            yield frame, movement
+
+    def to_grey(self, frame):
+        frame_grey = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self.downscale != 1.0:
+            frame_grey = cv2.resize(
+                frame_grey,
+                None,
+                fx=self.downscale,
+                fy=self.downscale,
+                interpolation=cv2.INTER_AREA,
+            )
+        return frame_grey
+
+    def estimate_frame_movement(self, old_grey, frame_grey, old_features):
+        """
+        Estimate the camera movement between two consecutive greyscale frames.
+
+        Returns the `[x, y]` movement and the features to track against the next frame.
+        """
+        if old_features is None or len(old_features) == 0:
+            return [0, 0], cv2.goodFeaturesToTrack(frame_grey, **self.features)
+
+        # Use the Lucas-Kanade algorithm to track the features between the current and previous frames.
+        new_features, status, _ = cv2.calcOpticalFlowPyrLK(
+            prevImg=old_grey,
+            nextImg=frame_grey,
+            prevPts=old_features,
+            nextPts=None,
+            **self.lk_params,
+        )
+
+        # Only use the features that were actually found in the current frame
+        found = status.ravel() == 1
+        old_points = old_features.reshape(-1, 2)[found] / self.downscale
+        new_points = new_features.reshape(-1, 2)[found] / self.downscale
+        if len(old_points) == 0:
+            return [0, 0], cv2.goodFeaturesToTrack(frame_grey, **self.features)
+
+        camera_movement_x, camera_movement_y, distance = self.measure_movement(
+            old_points, new_points
+        )
+
+        # If the distance is greater than the minimum distance, update the camera movement for the frame.
+        if distance > self.minimum_distance:
+            # Update the old features for the next frame.
+            old_features = cv2.goodFeaturesToTrack(frame_grey, **self.features)
+            return [camera_movement_x, camera_movement_y], old_features
+
+        return [0, 0], old_features
+
+    def measure_movement(self, old_points, new_points):
+        """
+        Returns the x and y movement (old - new) and its magnitude for (N, 2) arrays
+        of matched feature positions.
+        """
+        displacement = old_points - new_points
+
+        if self.mode == "max":
+            distances = np.hypot(displacement[:, 0], displacement[:, 1])
+            index = int(distances.argmax())
+            movement = displacement[index]
+        elif self.mode == "median":
+            movement = np.median(displacement, axis=0)
+        else:
+            matrix, _ = cv2.estimateAffinePartial2D(
+                old_points, new_points, method=cv2.RANSAC, ransacReprojThreshold=3.0
+            )
+            if matrix is None:
+                movement = np.median(displacement, axis=0)
+            else:
+                centroid = old_points.mean(axis=0)
+                movement = centroid - (matrix[:, :2] @ centroid + matrix[:, 2])
+
+        return (
+            float(movement[0]),
+            float(movement[1]),
+            float(np.hypot(movement[0], movement[1])),
+        )
@@ -1,109 +1,571 @@
+import argparse
+import os
 import pickle
 
 import cv2
 import numpy as np
 
 from camera_movement_estimator import CameraMovementEstimator
+from pipeline import ChunkedPipeline, StreamingPipeline
 from player_ball_assigner import PlayerBallAssiginer
+from profiling import PipelineProfiler
+from renderer import OverlayRenderer
 from speed_and_distance_estimator import SpeedAndDistanceEstimator
-from team_assignier import TeamAssiginer
+from team_assignier import PlayerColorExtractor, TeamAssiginer
+from track_archive import TrackArchiveWriter, import_pyarrow
+from track_store import TrackStore
 from trackers import Tracker
-from utils import read_video, save_video
-from view_transformer import ViewTransformer
+from trackers.detector_backend import DetectorBackend
+from trackers.track_cache import TrackCache
+from utils import ENCODERS, VideoReader, save_video
+from view_transformer import HomographyTrack, ViewTransformer
 
+# Stages of `main` that --skip can leave out
+OPTIONAL_STAGES = ("camera_movement", "team_assignment", "ball_aquisition", "draw")
+
+
+def get_video_stub_dir(stub_dir, video_path):
+    """
+    Directory of the stubs of one video inside `stub_dir`, keyed by the hash of the
+    video file like the track cache, so stubs are never read back for another video.
+    """
+    video_name = os.path.splitext(os.path.basename(video_path))[0]
+    video_hash = TrackCache.file_hash(video_path)[:16]
+    return os.path.join(stub_dir, f"{video_name}-{video_hash}")
+
+
+def main(
+    video_path="input_videos/08fd33_4.mp4",
+    output_video_path="output_videos/output_video_final.mp4",
+    model_path="models/best.pt",
+    stub_dir="stubs",
+    cache_dir=None,
+    skip=(),
+    num_workers=1,
+    encoder="opencv",
+    tracker_options=None,
+    profiler=None,
+    homography=False,
+    export_path=None,
+    color_method="kmeans",
+):
+    profiler = profiler or PipelineProfiler(enabled=False)
+    if cache_dir is None:
+        cache_dir = os.path.join(stub_dir, "cache")
+    video_stub_dir = get_video_stub_dir(stub_dir, video_path)
+    os.makedirs(video_stub_dir, exist_ok=True)
 
-def main():
     # Read video
     print("reading Video")
-    video_frames = read_video("input_videos/08fd33_4.mp4")
+    video_reader = VideoReader(video_path)
+    with profiler.stage("read_video", len(video_reader)):
+        video_frames = list(video_reader)
+    n_frames = len(video_frames)
 
     # Initialize the tracker
     print("tracking players")
-    tracker = Tracker(model_path="models/best.pt")
-    tracks = tracker.get_object_tracks(
-        frames=video_frames, read_from_stub=True, stub_path="stubs/track_stubs.pkl"
-    )
+    tracker_options = tracker_options or {}
+    # The models are only loaded once a chunk of frames has to be detected
+    tracker = Tracker(model_path=model_path, **tracker_options)
+    cm_estimator = CameraMovementEstimator(frame=video_frames[0])
+    if num_workers > 1:
+        # Track and estimate camera movement for time chunks in parallel
+        chunked_pipeline = ChunkedPipeline(
+            model_path=model_path,
+            num_workers=num_workers,
+            tracker_options=tracker_options,
+        )
+        with profiler.stage("tracking_and_camera_movement", n_frames):
+            tracks, camara_movement_per_frame = chunked_pipeline.run(video_path)
+        if "camera_movement" in skip:
+            # Estimated alongside tracking in the chunks, but not used
+            camara_movement_per_frame = [[0, 0]] * n_frames
+    else:
+        with profiler.stage("tracking", n_frames):
+            # The content-keyed cache, not the legacy stub, is the source of tracks
+            tracks = tracker.get_object_tracks(
+                frames=video_frames,
+                cache_dir=cache_dir,
+                video_path=video_path,
+            )
 
-    # Get objects position
-    tracker.add_position_to_tracks(tracks)
+        if "camera_movement" in skip:
+            camara_movement_per_frame = [[0, 0]] * n_frames
+        else:
+            # camara movement estimator
+            print("estimating camera movement")
+            with profiler.stage("camera_movement", n_frames):
+                camara_movement_per_frame = cm_estimator.get_camera_movement(
+                    video_frames,
+                    True,
+                    os.path.join(video_stub_dir, "camera_movement.pkl"),
+                )
 
-    # camara movement estimator
-    print("estimating camera movement")
-    cm_estimator = CameraMovementEstimator(frame=video_frames[0])
-    camara_movement_per_frame = cm_estimator.get_camera_movement(
-        video_frames, True, "stubs/camera_movement.pkl"
-    )
+    if homography:
+        # Per-frame homographies following the camera movement
+        print("estimating homographies")
+        homography_track = HomographyTrack()
+        with profiler.stage("homography", n_frames):
+            homography_track.get_homographies(
+                video_frames, True, os.path.join(video_stub_dir, "homographies.npy")
+            )
 
-    cm_estimator.adjust_positions_to_tracks(tracks, camara_movement_per_frame)
+    with profiler.stage("positions", n_frames):
+        # Columnar store for the positional stages
+        track_store = TrackStore.from_tracks(tracks)
 
-    # View transformer
-    print("transforming view")
-    vt = ViewTransformer()
-    vt.add_transformed_position_to_tracks(tracks)
+        # Get objects position
+        tracker.add_position_to_store(track_store)
 
-    # Interpolate ball positions
-    tracks["ball"] = tracker.interpolate_ball_positions(tracks["ball"])
+        cm_estimator.adjust_positions_to_store(track_store, camara_movement_per_frame)
+
+        # View transformer
+        print("transforming view")
+        if homography:
+            homography_track.add_transformed_position_to_store(track_store)
+        else:
+            vt = ViewTransformer()
+            vt.add_transformed_position_to_store(track_store)
 
     # Speed and distance estimator
     print("estimating speed and distance")
 
-    speed_distance_estimator = SpeedAndDistanceEstimator()
-    speed_distance_estimator.add_speed_and_distance_to_tracks(tracks)
+    fps = video_reader.fps
+    with profiler.stage("speed_and_distance", n_frames):
+        speed_distance_estimator = SpeedAndDistanceEstimator(frame_rate=fps)
+        speed_distance_estimator.add_speed_and_distance_to_store(track_store)
 
-    # Initialize the team assignier
-    print("assigning teams")
-    team_assignier = TeamAssiginer()
-    team_assignier.assign_team_color(
-        frame=video_frames[0],
-        player_detections=tracks["players"][0],
-    )
+        tracks = track_store.to_tracks()
+
+    # Interpolate ball positions
+    with profiler.stage("ball_interpolation", n_frames):
+        tracks["ball"] = tracker.interpolate_ball_positions(tracks["ball"])
 
-    for frame_num, player_track in enumerate(tracks["players"]):
-        for player_id, player_bbox in player_track.items():
-            bbox = player_bbox["bbox"]
-            team_id = team_assignier.get_player_team(
-                video_frames[frame_num], bbox, player_id
+    if "team_assignment" not in skip:
+        # Initialize the team assignier
+        print("assigning teams")
+        with profiler.stage("team_assignment", n_frames):
+            team_assignier = TeamAssiginer(
+                color_method=color_method, team_overrides={98: 2}
             )
-            tracks["players"][frame_num][player_id]["team"] = team_id
-            tracks["players"][frame_num][player_id]["color"] = (
-                team_assignier.team_colors[team_id]
+            team_assignier.assign_team_color(
+                frame=video_frames[0],
+                player_detections=tracks["players"][0],
             )
 
-    # Assign ball Aquisition
-    print("assigning ball aquisition")
-    player_assigner = PlayerBallAssiginer()
-    team_ball_control = []
-    for frame_num, player_track in enumerate(tracks["players"]):
-        ball_box = tracks["ball"][frame_num][1]["bbox"]
-        assigned_player = player_assigner.assign_ball_to_player(player_track, ball_box)
-
-        if assigned_player != -1:
-            tracks["players"][frame_num][assigned_player]["has_ball"] = True
-            team_ball_control.append(
-                tracks["players"][frame_num][assigned_player]["team"]
+            for frame_num, player_track in enumerate(tracks["players"]):
+                player_teams = team_assignier.get_players_teams(
+                    video_frames[frame_num], player_track, frame_num
+                )
+                for player_id, team_id in player_teams.items():
+                    tracks["players"][frame_num][player_id]["team"] = team_id
+                    tracks["players"][frame_num][player_id]["color"] = (
+                        team_assignier.team_colors[team_id]
+                    )
+
+    if "ball_aquisition" in skip:
+        team_ball_control = np.zeros(n_frames, dtype=np.int64)
+    else:
+        # Assign ball Aquisition
+        print("assigning ball aquisition")
+        with profiler.stage("ball_aquisition", n_frames):
+            player_assigner = PlayerBallAssiginer()
+            assigned_players = player_assigner.assign_ball_to_tracks(tracks)
+            team_ball_control = player_assigner.get_team_ball_control(
+                tracks, assigned_players
             )
-        else:
-            team_ball_control.append(team_ball_control[-1])
-    team_ball_control = np.array(team_ball_control)
 
-    with open("stubs/complete_tracks.pkl", "wb") as f:
+    # Read back by --replay
+    with open(os.path.join(video_stub_dir, "complete_tracks.pkl"), "wb") as f:
         pickle.dump(tracks, f)
 
-    # Draw annotations
+    if export_path is not None:
+        export_tracks(
+            export_path,
+            fps,
+            tracks,
+            camara_movement_per_frame,
+            team_ball_control,
+            profiler,
+        )
+
+    if "draw" not in skip:
+        draw_and_save_video(
+            video_frames,
+            tracks,
+            team_ball_control,
+            camara_movement_per_frame,
+            output_video_path,
+            fps,
+            num_workers,
+            encoder,
+            profiler,
+        )
+
+
+def export_tracks(
+    export_path, fps, tracks, camara_movement_per_frame, team_ball_control, profiler
+):
+    # Columnar archive of the tracks, queryable by time range
+    with profiler.stage("export", len(team_ball_control)):
+        with TrackArchiveWriter(export_path, fps=fps) as writer:
+            writer.append(
+                TrackStore.from_tracks(tracks),
+                camara_movement_per_frame,
+                team_ball_control,
+            )
+    print(f"Tracks exported at path: {export_path}")
+
+
+def draw_and_save_video(
+    video_frames,
+    tracks,
+    team_ball_control,
+    camara_movement_per_frame,
+    output_video_path,
+    fps,
+    num_workers,
+    encoder,
+    profiler,
+):
+    n_frames = len(video_frames)
+
+    # Draw annotations, speed and distance in one pass
     print("drawing annotations")
-    output_video_frames = tracker.draw_annotations(
-        video_frames, team_ball_control, tracks, camara_movement_per_frame
+    with profiler.stage("draw", n_frames):
+        output_video_frames = OverlayRenderer().render_frames(
+            video_frames,
+            tracks,
+            team_ball_control,
+            camara_movement_per_frame,
+            num_workers=num_workers,
+        )
+
+    # Save video
+    with profiler.stage("save_video", n_frames):
+        save_video(output_video_frames, output_video_path, fps=fps, encoder=encoder)
+
+
+def main_replay(
+    video_path="input_videos/08fd33_4.mp4",
+    output_video_path="output_videos/output_video_final.mp4",
+    stub_dir="stubs",
+    num_workers=1,
+    encoder="opencv",
+    profiler=None,
+    export_path=None,
+):
+    """
+    Draw the video again from the complete tracks and camera movement saved in
+    `stub_dir` by an earlier run of `main` on the same video, without detecting or
+    tracking. Only the video is decoded, so no model or heavy dependency is loaded.
+    """
+    profiler = profiler or PipelineProfiler(enabled=False)
+    video_stub_dir = get_video_stub_dir(stub_dir, video_path)
+    tracks_path = os.path.join(video_stub_dir, "complete_tracks.pkl")
+    camera_movement_path = os.path.join(video_stub_dir, "camera_movement.pkl")
+    if not os.path.exists(tracks_path):
+        raise FileNotFoundError(
+            f"{tracks_path} not found, run once on {video_path} without --replay "
+            "to write it"
+        )
+
+    print("replaying tracks")
+    with open(tracks_path, "rb") as f:
+        tracks = pickle.load(f)
+    n_frames = len(tracks["players"])
+    camara_movement_per_frame = [[0, 0]] * n_frames
+    if os.path.exists(camera_movement_path):
+        with open(camera_movement_path, "rb") as f:
+            camara_movement_per_frame = pickle.load(f)
+    assigned_players = PlayerBallAssiginer.get_assigned_players(tracks)
+    team_ball_control = PlayerBallAssiginer.get_team_ball_control(
+        tracks, assigned_players
     )
 
-    # Draw speed and distance
-    print("drawing speed and distance")
-    output_video_frames = speed_distance_estimator.draw_speed_and_distance(
-        output_video_frames, tracks
+    video_reader = VideoReader(video_path)
+    with profiler.stage("read_video", len(video_reader)):
+        video_frames = list(video_reader)
+    fps = video_reader.fps
+
+    if export_path is not None:
+        export_tracks(
+            export_path,
+            fps,
+            tracks,
+            camara_movement_per_frame,
+            team_ball_control,
+            profiler,
+        )
+
+    draw_and_save_video(
+        video_frames,
+        tracks,
+        team_ball_control,
+        camara_movement_per_frame,
+        output_video_path,
+        fps,
+        num_workers,
+        encoder,
+        profiler,
     )
 
-    # Save video
-    save_video(output_video_frames, "output_videos/output_video_final.mp4")
+
+def main_streaming(
+    video_path="input_videos/08fd33_4.mp4",
+    output_video_path="output_videos/output_video_final.mp4",
+    model_path="models/best.pt",
+    start_seconds=0,
+    stop_seconds=None,
+    stride=1,
+    encoder="opencv",
+    tracker_options=None,
+    profiler=None,
+    camera_movement_process=False,
+    homography=False,
+    export_path=None,
+    color_method="kmeans",
+):
+    # Decode, process, draw and encode one frame at a time
+    print("processing video as a stream")
+    pipeline = StreamingPipeline(
+        model_path=model_path,
+        profiler=profiler,
+        camera_movement_process=camera_movement_process,
+        homography=homography,
+        color_method=color_method,
+        **(tracker_options or {}),
+    )
+    pipeline.run(
+        video_path,
+        output_video_path,
+        start_seconds=start_seconds,
+        stop_seconds=stop_seconds,
+        stride=stride,
+        encoder=encoder,
+        export_path=export_path,
+    )
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--input",
+        default="input_videos/08fd33_4.mp4",
+        help="path of the video to process",
+    )
+    parser.add_argument(
+        "--output",
+        default="output_videos/output_video_final.mp4",
+        help="path of the annotated video to write",
+    )
+    parser.add_argument(
+        "--model",
+        default="models/best.pt",
+        help="path of the YOLO weights",
+    )
+    parser.add_argument(
+        "--stub-dir",
+        default="stubs",
+        help="directory of the per-video stubs, keyed by the hash of the video",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="directory of the incremental track cache, by default STUB_DIR/cache",
+    )
+    parser.add_argument(
+        "--skip",
+        nargs="+",
+        choices=OPTIONAL_STAGES,
+        default=(),
+        help="without --stream, stages to leave out",
+    )
+    parser.add_argument(
+        "--replay",
+        action="store_true",
+        help="draw the video again from the complete tracks saved in STUB_DIR",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="process the video frame by frame with bounded memory",
+    )
+    parser.add_argument(
+        "--homography",
+        action="store_true",
+        help="map positions to the pitch with per-frame homographies",
+    )
+    parser.add_argument(
+        "--camera-movement-process",
+        action="store_true",
+        help="with --stream, estimate camera movement in a separate process",
+    )
+    parser.add_argument(
+        "--color-method",
+        choices=PlayerColorExtractor.METHODS,
+        default="kmeans",
+        help="jersey colour extraction of the team assignment",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes tracking time chunks of the video in parallel",
+    )
+    parser.add_argument(
+        "--encoder",
+        choices=sorted(ENCODERS),
+        default="opencv",
+        help="video encoder backend, ffmpeg encodes H.264 with libx264",
+    )
+    parser.add_argument(
+        "--start",
+        type=float,
+        default=0,
+        help="with --stream, second of the video to start processing at",
+    )
+    parser.add_argument(
+        "--stop",
+        type=float,
+        default=None,
+        help="with --stream, second of the video to stop processing at",
+    )
+    parser.add_argument(
+        "--stride",
+        type=int,
+        default=1,
+        help="with --stream, process every k-th frame only",
+    )
+    parser.add_argument(
+        "--detect-every",
+        type=int,
+        default=1,
+        help="run the detector on every N-th frame and propagate boxes in between",
+    )
+    parser.add_argument(
+        "--imgsz",
+        type=int,
+        default=None,
+        help="input size of the full-frame detector",
+    )
+    parser.add_argument(
+        "--ball-roi-size",
+        type=int,
+        default=None,
+        help="detect the ball again at full resolution on a crop of this size",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=("ultralytics", "onnx", "openvino"),
+        default="ultralytics",
+        help="inference backend, exported models are cached next to the weights",
+    )
+    parser.add_argument(
+        "--precision",
+        choices=("fp32", "fp16", "int8"),
+        default="fp32",
+        help="precision of the exported model (fp16 and int8 with openvino)",
+    )
+    parser.add_argument(
+        "--int8-data",
+        metavar="YAML",
+        default=None,
+        help="dataset YAML to calibrate --precision int8 with",
+    )
+    parser.add_argument(
+        "--export-tracks",
+        metavar="DIR",
+        default=None,
+        help="write the tracks as a Parquet archive to DIR (needs pyarrow)",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="REPORT_PATH",
+        default=None,
+        help="time every stage and write a JSON report to REPORT_PATH",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="profile and serve Prometheus metrics on localhost:PORT/metrics",
+    )
+    args = parser.parse_args()
+    if args.skip and (args.stream or args.replay):
+        parser.error("--skip only applies without --stream and --replay")
+    backend_precisions = DetectorBackend.BACKENDS[args.backend][2]
+    if args.precision not in backend_precisions:
+        parser.error(
+            f"--backend {args.backend} supports --precision "
+            f"{' or '.join(backend_precisions)}"
+        )
+    if args.precision == "int8" and args.int8_data is None:
+        parser.error("--precision int8 needs --int8-data")
+    if args.export_tracks is not None:
+        # Fail before any work rather than at the export step
+        try:
+            import_pyarrow()
+        except ImportError as error:
+            parser.error(str(error))
+    tracker_options = dict(
+        detect_every=args.detect_every,
+        imgsz=args.imgsz,
+        ball_roi_size=args.ball_roi_size,
+        backend=args.backend,
+        precision=args.precision,
+        int8_data=args.int8_data,
+    )
+
+    profiler = PipelineProfiler(
+        enabled=args.profile is not None or args.metrics_port is not None
+    )
+    if args.metrics_port is not None:
+        profiler.serve(args.metrics_port)
+
+    if args.replay:
+        main_replay(
+            video_path=args.input,
+            output_video_path=args.output,
+            stub_dir=args.stub_dir,
+            num_workers=args.workers,
+            encoder=args.encoder,
+            profiler=profiler,
+            export_path=args.export_tracks,
+        )
+    elif args.stream:
+        main_streaming(
+            video_path=args.input,
+            output_video_path=args.output,
+            model_path=args.model,
+            start_seconds=args.start,
+            stop_seconds=args.stop,
+            stride=args.stride,
+            encoder=args.encoder,
+            tracker_options=tracker_options,
+            profiler=profiler,
+            camera_movement_process=args.camera_movement_process,
+            homography=args.homography,
+            export_path=args.export_tracks,
+            color_method=args.color_method,
+        )
+    else:
+        main(
+            video_path=args.input,
+            output_video_path=args.output,
+            model_path=args.model,
+            stub_dir=args.stub_dir,
+            cache_dir=args.cache_dir,
+            skip=args.skip,
+            num_workers=args.workers,
+            encoder=args.encoder,
+            tracker_options=tracker_options,
+            profiler=profiler,
+            homography=args.homography,
+            export_path=args.export_tracks,
+            color_method=args.color_method,
+        )
+
+    if args.profile is not None:
+        profiler.write_report(args.profile)
+        print(f"Profile report saved at path: {args.profile}")
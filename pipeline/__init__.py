@@ -0,0 +1,4 @@
+from .camera_movement_worker import CameraMovementWorker
+from .chunked_pipeline import ChunkedPipeline
+from .frame_ring_buffer import FrameRingBuffer
+from .streaming_pipeline import StreamingPipeline
@@ -0,0 +1,102 @@
+import itertools
+import multiprocessing
+import traceback
+
+from camera_movement_estimator import CameraMovementEstimator
+
+from .frame_ring_buffer import FrameRingBuffer
+
+
+def get_camera_movement_stream(ring):
+    frames = (frame for _, frame in ring.frames())
+    first_frame = next(frames, None)
+    if first_frame is None:
+        return
+
+    cm_estimator = CameraMovementEstimator(frame=first_frame)
+    for _, movement in cm_estimator.get_camera_movement_stream(
+        itertools.chain([first_frame], frames)
+    ):
+        yield movement
+
+
+def estimate_camera_movement(ring, movements):
+    """
+    Estimate the camera movement of the frames of `ring` and put it in the
+    `movements` queue, followed by None. Runs in the worker process.
+    """
+    try:
+        for movement in get_camera_movement_stream(ring):
+            movements.put(movement)
+        movements.put(None)
+    except BaseException:
+        movements.put(traceback.format_exc())
+    finally:
+        # The views of the frames are gone with the generator
+        ring.close()
+
+
+class CameraMovementWorker:
+    """
+    Estimates the camera movement in a separate process, in parallel with the
+    detection and the other stages of the calling process.
+
+    `share` passes the frames through unchanged while copying each one into a
+    shared-memory `FrameRingBuffer`, where the worker reads it without pickling.
+    `movements` yields the camera movement of the shared frames in order.
+    """
+
+    def __init__(self, n_slots=32, timeout=60.0) -> None:
+        """
+        Args:
+            n_slots: Frames the worker may lag behind before `share` waits.
+            timeout: Seconds to wait for the worker before giving up.
+        """
+        self.n_slots = n_slots
+        self.timeout = timeout
+        self.context = multiprocessing.get_context("spawn")
+        self.ring = None
+        self.process = None
+        self.results = self.context.Queue()
+
+    def start(self, frame_shape):
+        self.ring = FrameRingBuffer(self.n_slots, frame_shape, context=self.context)
+        self.process = self.context.Process(
+            target=estimate_camera_movement,
+            args=(self.ring, self.results),
+            name="camera-movement",
+            daemon=True,
+        )
+        self.process.start()
+
+    def share(self, frames):
+        try:
+            for frame in frames:
+                if self.ring is None:
+                    self.start(frame.shape)
+                self.ring.put(frame, timeout=self.timeout)
+                yield frame
+        finally:
+            if self.ring is not None:
+                self.ring.finish()
+
+    def movements(self):
+        try:
+            while (movement := self.results.get(timeout=self.timeout)) is not None:
+                if isinstance(movement, str):
+                    raise RuntimeError(f"Camera movement worker failed:\n{movement}")
+                yield movement
+        finally:
+            self.close()
+
+    def close(self):
+        if self.process is not None:
+            self.ring.finish()
+            self.process.join(self.timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+            self.process = None
+        if self.ring is not None:
+            self.ring.close()
+            self.ring.unlink()
+            self.ring = None
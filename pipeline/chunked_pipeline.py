@@ -0,0 +1,214 @@
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from camera_movement_estimator import CameraMovementEstimator
+from utils import get_video_fps, iter_video
+
+
+def process_chunk(
+    video_path, model_path, frame_start, frame_stop, num_threads, tracker_options
+):
+    """
+    Track objects and estimate camera movement for frames `frame_start` to
+    `frame_stop` (exclusive) of the video. Runs in a worker process.
+    """
+    # Imported here so the parent process never loads the model
+    from trackers import Tracker
+
+    tracker = Tracker(model_path=model_path, num_threads=num_threads, **tracker_options)
+
+    frames = iter_video(video_path, frame_start, frame_stop)
+    first_frame = next(frames, None)
+    if first_frame is None:
+        return frame_start, [], []
+    cm_estimator = CameraMovementEstimator(frame=first_frame)
+
+    frames_tracks = []
+
+    def tracked_frames():
+        for frame, frame_tracks in tracker.get_object_tracks_stream(
+            itertools.chain([first_frame], frames)
+        ):
+            frames_tracks.append(frame_tracks)
+            yield frame
+
+    camera_movement = [
+        movement
+        for _, movement in cm_estimator.get_camera_movement_stream(tracked_frames())
+    ]
+    return frame_start, frames_tracks, camera_movement
+
+
+def box_iou(boxes_a, boxes_b):
+    boxes_a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float32).reshape(1, -1, 4)
+    width = np.minimum(boxes_a[..., 2], boxes_b[..., 2]) - np.maximum(
+        boxes_a[..., 0], boxes_b[..., 0]
+    )
+    height = np.minimum(boxes_a[..., 3], boxes_b[..., 3]) - np.maximum(
+        boxes_a[..., 1], boxes_b[..., 1]
+    )
+    intersection = np.clip(width, 0, None) * np.clip(height, 0, None)
+    area_a = (boxes_a[..., 2] - boxes_a[..., 0]) * (boxes_a[..., 3] - boxes_a[..., 1])
+    area_b = (boxes_b[..., 2] - boxes_b[..., 0]) * (boxes_b[..., 3] - boxes_b[..., 1])
+    return intersection / np.maximum(area_a + area_b - intersection, 1e-6)
+
+
+class ChunkedPipeline:
+    """
+    Splits a video into time chunks and tracks them in a process pool.
+
+    Every chunk after the first starts `overlap_frames` early. The overlap is used
+    to reconcile ByteTrack IDs across the seam (the chunk's IDs are mapped to the
+    IDs of the previous chunk by box overlap in the shared frames, and new IDs get
+    fresh numbers) and to warm up optical flow, so the camera movement of the first
+    frame of a chunk is measured against its real predecessor. The stitched tracks
+    have the same shape as `Tracker.get_object_tracks`, so ball interpolation is
+    applied across the seams afterwards like for a single-process run.
+    """
+
+    def __init__(
+        self,
+        model_path,
+        num_workers=None,
+        chunk_seconds=60,
+        overlap_frames=12,
+        threads_per_worker=1,
+        tracker_options=None,
+    ) -> None:
+        self.model_path = model_path
+        self.num_workers = num_workers or multiprocessing.cpu_count()
+        self.chunk_seconds = chunk_seconds
+        self.overlap_frames = overlap_frames
+        self.threads_per_worker = threads_per_worker
+        # Keyword arguments of the `Tracker` of each worker
+        self.tracker_options = tracker_options or {}
+
+        # Minimum box overlap for a detection to count as the same object
+        self.minimum_iou = 0.5
+
+    def get_chunks(self, video_path):
+        cap = cv2.VideoCapture(video_path)
+        n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        fps = get_video_fps(video_path)
+
+        chunk_size = max(int(self.chunk_seconds * fps), self.overlap_frames + 1)
+        return [
+            (
+                max(start - self.overlap_frames, 0),
+                start,
+                min(start + chunk_size, n_frames),
+            )
+            for start in range(0, n_frames, chunk_size)
+        ]
+
+    def run(self, video_path):
+        """
+        Returns the stitched tracks and the camera movement per frame.
+        """
+        chunks = self.get_chunks(video_path)
+
+        # Spawned workers avoid forking a process with OpenCV/torch threads running
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(self.num_workers, mp_context=context) as executor:
+            futures = [
+                executor.submit(
+                    process_chunk,
+                    video_path,
+                    self.model_path,
+                    read_start,
+                    stop,
+                    self.threads_per_worker,
+                    self.tracker_options,
+                )
+                for read_start, _, stop in chunks
+            ]
+
+            tracks = {"players": [], "referees": [], "ball": []}
+            camera_movement = []
+            next_track_id = {"players": 1, "referees": 1}
+            for (read_start, start, _), future in zip(chunks, futures):
+                _, frames_tracks, chunk_camera_movement = future.result()
+                self.stitch_chunk(
+                    tracks,
+                    frames_tracks[start - read_start :],
+                    frames_tracks[: start - read_start],
+                    next_track_id,
+                )
+                camera_movement += chunk_camera_movement[start - read_start :]
+
+        return tracks, camera_movement
+
+    def stitch_chunk(self, tracks, frames_tracks, overlap_tracks, next_track_id):
+        """
+        Append `frames_tracks` to `tracks`, renaming the chunk's track IDs using the
+        frames it shares with the already stitched tracks (`overlap_tracks`).
+        """
+        n_overlap = len(overlap_tracks)
+        for objects in next_track_id:
+            previous_tracks = tracks[objects][len(tracks[objects]) - n_overlap :]
+            id_map = self.match_track_ids(
+                previous_tracks,
+                [frame_tracks[objects] for frame_tracks in overlap_tracks],
+            )
+
+            for frame_tracks in frames_tracks:
+                renamed_track = {}
+                for track_id, track_info in frame_tracks[objects].items():
+                    if track_id not in id_map:
+                        id_map[track_id] = next_track_id[objects]
+                        next_track_id[objects] += 1
+                    renamed_track[id_map[track_id]] = track_info
+                tracks[objects].append(renamed_track)
+
+                if renamed_track:
+                    next_track_id[objects] = max(
+                        next_track_id[objects], max(renamed_track) + 1
+                    )
+
+        # The ball is not tracked, it always has ID 1
+        tracks["ball"] += [frame_tracks["ball"] for frame_tracks in frames_tracks]
+
+    def match_track_ids(self, previous_tracks, overlap_tracks):
+        """
+        Map chunk track IDs to previous IDs by voting over the overlapping frames.
+        """
+        votes = {}
+        for previous_track, overlap_track in zip(previous_tracks, overlap_tracks):
+            if not previous_track or not overlap_track:
+                continue
+
+            previous_ids = list(previous_track)
+            overlap_ids = list(overlap_track)
+            iou = box_iou(
+                [previous_track[track_id]["bbox"] for track_id in previous_ids],
+                [overlap_track[track_id]["bbox"] for track_id in overlap_ids],
+            )
+
+            # Only count mutual best matches
+            best_previous = iou.argmax(axis=0)
+            best_overlap = iou.argmax(axis=1)
+            for overlap_index, previous_index in enumerate(best_previous):
+                if (
+                    best_overlap[previous_index] == overlap_index
+                    and iou[previous_index, overlap_index] >= self.minimum_iou
+                ):
+                    key = (overlap_ids[overlap_index], previous_ids[previous_index])
+                    votes[key] = votes.get(key, 0) + 1
+
+        id_map = {}
+        used_previous_ids = set()
+        for (overlap_id, previous_id), _ in sorted(
+            votes.items(), key=lambda item: item[1], reverse=True
+        ):
+            if overlap_id in id_map or previous_id in used_previous_ids:
+                continue
+            id_map[overlap_id] = previous_id
+            used_previous_ids.add(previous_id)
+
+        return id_map
@@ -0,0 +1,195 @@
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+
+class FrameRingBuffer:
+    """
+    Fixed-size ring of frames in shared memory, written by one producer and read
+    zero-copy by any number of consumers in other processes.
+
+    Every frame gets the next sequence number and goes into slot
+    `sequence % n_slots`. `put` stores it with a reference count of `readers`;
+    each reader `get`s the frame as a read-only view of the shared memory and
+    `release`s it when done. A slot is only reused once all its readers released
+    it, so the producer waits for the slowest reader instead of overwriting a frame
+    in use. After `finish`, readers get None past the last frame.
+
+    The buffer is passed to worker processes as an argument of `Process` (or the
+    `initargs` of a pool); its lock cannot be pickled in any other way. The
+    process that created the buffer `unlink`s it at the end.
+
+    Usage:
+        ring = FrameRingBuffer(32, frame.shape)
+        worker = context.Process(target=consume, args=(ring,))
+        ...
+        sequence = ring.put(frame)                  # producer
+        for sequence, frame in ring.frames():       # consumer
+            ...
+    """
+
+    def __init__(self, n_slots, frame_shape, dtype=np.uint8, context=None) -> None:
+        """
+        Args:
+            n_slots: Number of frames held at once.
+            frame_shape: Shape of every frame, e.g. `(1080, 1920, 3)`.
+            dtype: Data type of the frames.
+            context: multiprocessing context of the worker processes, the "spawn"
+                context by default.
+        """
+        self.n_slots = n_slots
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+        self.frame_size = int(np.prod(self.frame_shape)) * self.dtype.itemsize
+
+        context = context or multiprocessing.get_context("spawn")
+        self.condition = context.Condition()
+
+        self.shm = SharedMemory(
+            create=True,
+            size=self.get_frames_offset(n_slots) + n_slots * self.frame_size,
+        )
+        self.owner = True
+        self.attach_arrays()
+        self.sequence[:] = -1
+        self.refcount[:] = 0
+        self.state[:] = 0
+
+    @staticmethod
+    def get_frames_offset(n_slots):
+        # The header is int64: sequence number of the frame in each slot, reference
+        # count of each slot, number of frames written and finished flag. The
+        # frames start on the next cache line.
+        header_size = (2 * n_slots + 2) * 8
+        return -(-header_size // 64) * 64
+
+    def attach_arrays(self):
+        header = np.ndarray((2 * self.n_slots + 2,), np.int64, self.shm.buf)
+        self.sequence = header[: self.n_slots]
+        self.refcount = header[self.n_slots : 2 * self.n_slots]
+        # [frames written, finished]
+        self.state = header[2 * self.n_slots :]
+        self.slots = np.ndarray(
+            (self.n_slots, *self.frame_shape),
+            self.dtype,
+            self.shm.buf,
+            offset=self.get_frames_offset(self.n_slots),
+        )
+
+    def __getstate__(self):
+        return {
+            "name": self.shm.name,
+            "n_slots": self.n_slots,
+            "frame_shape": self.frame_shape,
+            "dtype": self.dtype,
+            "condition": self.condition,
+        }
+
+    def __setstate__(self, state):
+        self.n_slots = state["n_slots"]
+        self.frame_shape = state["frame_shape"]
+        self.dtype = state["dtype"]
+        self.condition = state["condition"]
+        self.shm = SharedMemory(name=state["name"])
+        self.owner = False
+        self.attach_arrays()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+        if self.owner:
+            self.unlink()
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def wait_for(self, predicate, timeout):
+        # Called with the condition held
+        if not self.condition.wait_for(predicate, timeout):
+            raise TimeoutError("Timed out waiting for the frame ring buffer")
+
+    def put(self, frame, readers=1, timeout=None):
+        """
+        Copy `frame` into the next slot, once its previous frame is released by
+        all its readers, and return its sequence number.
+        """
+        sequence = int(self.state[0])
+        slot = sequence % self.n_slots
+        with self.condition:
+            self.wait_for(lambda: self.refcount[slot] == 0, timeout)
+
+        # No reader holds or waits for the old frame of the slot, so it is copied
+        # without blocking the readers of other slots
+        self.slots[slot] = frame
+        with self.condition:
+            self.sequence[slot] = sequence
+            self.refcount[slot] = readers
+            self.state[0] = sequence + 1
+            self.condition.notify_all()
+        return sequence
+
+    def get(self, sequence, timeout=None):
+        """
+        Read-only view of the frame `sequence`, waiting for it to be written.
+        Returns None when the producer finished before writing it.
+        """
+        slot = sequence % self.n_slots
+        with self.condition:
+            self.wait_for(
+                lambda: self.sequence[slot] >= sequence
+                or (self.state[1] and self.state[0] <= sequence),
+                timeout,
+            )
+            if self.sequence[slot] < sequence:
+                return None
+            if self.sequence[slot] > sequence:
+                raise ValueError(f"Frame {sequence} was released and overwritten")
+
+        frame = self.slots[slot]
+        frame.flags.writeable = False
+        return frame
+
+    def release(self, sequence):
+        slot = sequence % self.n_slots
+        with self.condition:
+            if self.sequence[slot] == sequence and self.refcount[slot] > 0:
+                self.refcount[slot] -= 1
+                self.condition.notify_all()
+
+    def frames(self, start=0, timeout=None):
+        """
+        Yields `(sequence, frame)` from `start` until the producer finishes. Each
+        frame is released when the next one is requested.
+        """
+        sequence = start
+        while (frame := self.get(sequence, timeout)) is not None:
+            try:
+                yield sequence, frame
+            finally:
+                # Also when the consumer stops early
+                self.release(sequence)
+            sequence += 1
+
+    def finish(self):
+        """
+        Mark the end of the frames, waking up the waiting readers.
+        """
+        with self.condition:
+            self.state[1] = 1
+            self.condition.notify_all()
+
+    def wait_until_released(self, timeout=None):
+        with self.condition:
+            self.wait_for(lambda: not self.refcount.any(), timeout)
+
+    def close(self):
+        # The arrays are views of the buffer, they must go before it is closed
+        self.sequence = self.refcount = self.state = self.slots = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
@@ -0,0 +1,322 @@
+import itertools
+
+from camera_movement_estimator import CameraMovementEstimator
+from player_ball_assigner import PlayerBallAssiginer, PossessionCounter
+from profiling import PipelineProfiler
+from renderer import OverlayRenderer
+from speed_and_distance_estimator import SpeedAndDistanceEstimator
+from team_assignier import TeamAssiginer
+from track_archive import TrackArchiveWriter
+from trackers import BallInterpolator, Tracker
+from utils import VideoReader, save_video
+from view_transformer import HomographyTrack, ViewTransformer
+
+from .camera_movement_worker import CameraMovementWorker
+
+
+class StreamingPipeline:
+    """
+    Frame-by-frame version of the pipeline in `main.py`.
+
+    Every stage is a generator that consumes and yields one item per frame, where an
+    item is a small dict holding the frame number, the frame itself, its tracks and
+    the per-frame results of the earlier stages. Frames are decoded, processed, drawn
+    and encoded one at a time, so memory stays bounded regardless of video length.
+    """
+
+    def __init__(
+        self,
+        model_path,
+        on_frame_stats=None,
+        profiler=None,
+        camera_movement_process=False,
+        homography=False,
+        color_method="kmeans",
+        **tracker_options,
+    ) -> None:
+        """
+        Args:
+            model_path: Path to the YOLO weights.
+            on_frame_stats: Optional callback receiving the live statistics of every
+                frame as it is processed, see `get_frame_stats`.
+            profiler: Optional `PipelineProfiler` timing every stage.
+            camera_movement_process: Estimate the camera movement in a separate
+                process reading the frames from shared memory, see
+                `CameraMovementWorker`.
+            homography: Map positions to the pitch with a per-frame
+                `HomographyTrack` instead of the static `ViewTransformer`.
+            color_method: Jersey colour extraction method of the `TeamAssiginer`.
+            **tracker_options: Keyword arguments of the `Tracker`, e.g. `detect_every`.
+        """
+        self.on_frame_stats = on_frame_stats
+        self.profiler = profiler or PipelineProfiler(enabled=False)
+        self.camera_movement_process = camera_movement_process
+        self.camera_movement_worker = None
+        self.homography = homography
+        self.track_writer = None
+        self.tracker = Tracker(model_path=model_path, **tracker_options)
+        self.view_transformer = ViewTransformer()
+        self.speed_distance_estimator = SpeedAndDistanceEstimator()
+        self.team_assignier = TeamAssiginer(
+            color_method=color_method, team_overrides={98: 2}
+        )
+        self.player_assigner = PlayerBallAssiginer()
+        self.renderer = OverlayRenderer()
+
+        # Number of frames decoded ahead of the pipeline
+        self.read_ahead = 16
+
+    def run(
+        self,
+        video_path,
+        output_video_path,
+        start_seconds=0,
+        stop_seconds=None,
+        stride=1,
+        encoder="opencv",
+        export_path=None,
+        **options,
+    ):
+        """
+        Process the video at `video_path`, or only the segment from `start_seconds`
+        to `stop_seconds` and every `stride`-th frame of it, and save the annotated
+        video at the matching frame rate. See `save_video` for the encoder options.
+
+        With `export_path`, the tracks are also written to a `TrackArchiveWriter`
+        archive there as they are processed.
+        """
+        reader = VideoReader(video_path, read_ahead=self.read_ahead)
+        fps = reader.fps / stride
+        self.speed_distance_estimator.frame_rate = fps
+        if export_path is not None:
+            self.track_writer = TrackArchiveWriter(export_path, fps=fps)
+        try:
+            save_video(
+                self.process(
+                    reader.frames_between(start_seconds, stop_seconds, stride)
+                ),
+                output_video_path,
+                fps=fps,
+                encoder=encoder,
+                **options,
+            )
+        finally:
+            if self.track_writer is not None:
+                self.track_writer.close()
+                self.track_writer = None
+
+    def process(self, frames):
+        stages = [
+            ("track", self.track_stage),
+            ("camera_movement", self.camera_movement_stage),
+            ("view_transform", self.view_transform_stage),
+            ("ball", self.ball_stage),
+            ("speed_and_distance", self.speed_and_distance_stage),
+            ("team_assignment", self.team_assignment_stage),
+            ("ball_aquisition", self.ball_aquisition_stage),
+            ("export", self.export_stage),
+            ("draw", self.draw_stage),
+        ]
+        self.profiler.add_queue(
+            "detection_frames", lambda: self.get_detection_queue_depth("frame_queue")
+        )
+        self.profiler.add_queue(
+            "detection_results",
+            lambda: self.get_detection_queue_depth("result_queue"),
+        )
+
+        stream = self.profiler.wrap_stream("decode", frames)
+        if self.camera_movement_process:
+            self.camera_movement_worker = CameraMovementWorker()
+            stream = self.profiler.wrap_stream(
+                "share_frames", self.camera_movement_worker.share(stream)
+            )
+        for name, stage in stages:
+            stream = self.profiler.wrap_stream(name, stage(stream))
+        return stream
+
+    def get_detection_queue_depth(self, queue_name):
+        detection_pipeline = self.tracker.detection_pipeline
+        if detection_pipeline is None or not hasattr(detection_pipeline, queue_name):
+            return None
+        return getattr(detection_pipeline, queue_name).qsize()
+
+    def track_stage(self, frames):
+        tracked_frames = self.tracker.get_object_tracks_stream(frames)
+        for frame_num, (frame, frame_tracks) in enumerate(tracked_frames):
+            self.tracker.add_position_to_frame_tracks(frame_tracks)
+            yield {"frame_num": frame_num, "frame": frame, "tracks": frame_tracks}
+
+    def camera_movement_stage(self, stream):
+        stream = iter(stream)
+        first_item = next(stream, None)
+        if first_item is None:
+            return
+
+        cm_estimator = CameraMovementEstimator(frame=first_item["frame"])
+        stream = itertools.chain([first_item], stream)
+
+        if self.camera_movement_worker is not None:
+            # The worker measured the movement of the same frames, in order
+            items = stream
+            movements = self.camera_movement_worker.movements()
+        else:
+            # Both branches are consumed in lockstep, so `tee` only buffers one item
+            items, frames = itertools.tee(stream)
+            movements = (
+                movement
+                for _, movement in cm_estimator.get_camera_movement_stream(
+                    item["frame"] for item in frames
+                )
+            )
+
+        try:
+            for item, camera_movement in zip(items, movements):
+                cm_estimator.adjust_positions_to_frame_tracks(
+                    item["tracks"], camera_movement
+                )
+                item["camera_movement"] = camera_movement
+                yield item
+        finally:
+            movements.close()
+
+    def view_transform_stage(self, stream):
+        if not self.homography:
+            for item in stream:
+                self.view_transformer.add_transformed_position_to_frame_tracks(
+                    item["tracks"]
+                )
+                yield item
+            return
+
+        homography_track = HomographyTrack()
+        items, frames = itertools.tee(stream)
+        homographies = homography_track.get_homography_stream(
+            item["frame"] for item in frames
+        )
+        for item, (_, homography) in zip(items, homographies):
+            homography_track.add_transformed_position_to_frame_tracks(
+                item["tracks"], homography
+            )
+            yield item
+
+    def ball_stage(self, stream):
+        # Frames are held back by at most the interpolator's lookahead
+        ball_interpolator = BallInterpolator()
+        ball_stream = (
+            (item, item["tracks"]["ball"].get(1, {}).get("bbox")) for item in stream
+        )
+        for item, bbox, interpolated in ball_interpolator.interpolate_stream(
+            ball_stream
+        ):
+            if bbox is None:
+                item["tracks"]["ball"] = {}
+            elif interpolated:
+                item["tracks"]["ball"] = {
+                    1: {"bbox": bbox.tolist(), "interpolated": True}
+                }
+            else:
+                item["tracks"]["ball"][1]["interpolated"] = False
+            yield item
+
+    def speed_and_distance_stage(self, stream):
+        for item in stream:
+            item["speed_and_distance"] = (
+                self.speed_distance_estimator.add_speed_and_distance_to_frame_tracks(
+                    item["frame_num"], item["tracks"]
+                )
+            )
+            yield item
+
+    def team_assignment_stage(self, stream):
+        for item in stream:
+            player_track = item["tracks"]["players"]
+
+            if not self.team_assignier.team_colors and player_track:
+                self.team_assignier.assign_team_color(
+                    frame=item["frame"], player_detections=player_track
+                )
+
+            if self.team_assignier.team_colors:
+                player_teams = self.team_assignier.get_players_teams(
+                    item["frame"], player_track, item["frame_num"]
+                )
+                for player_id, team_id in player_teams.items():
+                    player_track[player_id]["team"] = team_id
+                    player_track[player_id]["color"] = self.team_assignier.team_colors[
+                        team_id
+                    ]
+            yield item
+
+    def assign_ball_stream(self, stream):
+        for item in stream:
+            player_track = item["tracks"]["players"]
+            ball_track = item["tracks"]["ball"]
+
+            assigned_player = -1
+            if 1 in ball_track:
+                assigned_player = self.player_assigner.assign_ball_to_player(
+                    player_track, ball_track[1]["bbox"]
+                )
+            yield item, assigned_player
+
+    def ball_aquisition_stage(self, stream):
+        possession = PossessionCounter()
+        # Same hysteresis as the whole-match assignment, frames are held back until
+        # a possession change lasted `min_frames_to_switch` frames
+        for item, assigned_player in self.player_assigner.apply_hysteresis_stream(
+            self.assign_ball_stream(stream)
+        ):
+            player_track = item["tracks"]["players"]
+
+            team_id = 0
+            # The hysteresis can carry possession over frames the player is absent from
+            if (
+                assigned_player in player_track
+                and "team" in player_track[assigned_player]
+            ):
+                player_track[assigned_player]["has_ball"] = True
+                team_id = player_track[assigned_player]["team"]
+
+            possession.update(team_id)
+            item["team_ball_control"] = team_id
+            item["possession"] = possession
+            yield item
+
+    def export_stage(self, stream):
+        for item in stream:
+            if self.track_writer is not None:
+                self.track_writer.append_frame_tracks(
+                    item["tracks"], item["camera_movement"], item["team_ball_control"]
+                )
+            yield item
+
+    def draw_stage(self, stream):
+        for item in stream:
+            if self.on_frame_stats is not None:
+                self.on_frame_stats(self.get_frame_stats(item))
+
+            yield self.renderer.render_frame(
+                item["frame"],
+                item["tracks"],
+                item["possession"].percentages(),
+                item["camera_movement"],
+            )
+
+    def get_frame_stats(self, item):
+        """
+        Live statistics of one processed frame: the camera movement, the running
+        ball control of each team and the speed (km/h) and distance (m) of the
+        players visible in the frame.
+        """
+        return {
+            "frame_num": item["frame_num"],
+            "camera_movement": list(item["camera_movement"]),
+            "ball_control": item["possession"].percentages(),
+            "players": {
+                int(track_id): {"speed": speed, "distance": distance}
+                for (_, track_id), (speed, distance) in item[
+                    "speed_and_distance"
+                ].items()
+            },
+        }
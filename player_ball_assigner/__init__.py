@@ -1 +1,2 @@
 from .player_ball_assigner import PlayerBallAssiginer
+from .possession_counter import PossessionCounter
@@ -1,9 +1,21 @@
-from utils import get_center_of_bbox, measure_distance
+from collections import deque
+
+import numpy as np
+
+from track_store import OBJECT_CLASSES
+from utils import get_center_of_bbox, get_centers_of_bboxes, measure_distance
 
 
 class PlayerBallAssiginer:
-    def __init__(self) -> None:
+    def __init__(self, min_frames_to_switch=3) -> None:
+        """
+        Args:
+            min_frames_to_switch: Number of consecutive frames a new player (or
+                nobody) must be the closest to the ball before possession changes in
+                the whole-match and stream methods. 1 disables the hysteresis.
+        """
         self.max_player_ball_distance = 70  # Pixels
+        self.min_frames_to_switch = min_frames_to_switch
 
     def assign_ball_to_player(self, player, ball_position):
         ball_position = get_center_of_bbox(ball_position)
@@ -27,3 +39,216 @@ class PlayerBallAssiginer:
                     assigned_player = player_id
 
         return assigned_player
+
+    def assign_ball_for_match(self, player_bboxes, player_ids, ball_bboxes):
+        """
+        Vectorized `assign_ball_to_player` over a whole match.
+
+        Args:
+            player_bboxes: (n_frames, max_players, 4) player bboxes, NaN padded.
+            player_ids: (n_frames, max_players) player track IDs, -1 padded.
+            ball_bboxes: (n_frames, 4) ball bboxes, NaN when there is no ball.
+
+        Returns:
+            (n_frames,) array of the player with the ball in each frame, -1 for none.
+        """
+        player_bboxes = np.asarray(player_bboxes, dtype=np.float32)
+        player_ids = np.asarray(player_ids)
+        n_frames = len(ball_bboxes)
+        if player_bboxes.size == 0:
+            return np.full(n_frames, -1, dtype=np.int64)
+
+        ball_positions = get_centers_of_bboxes(ball_bboxes)[:, None, :]
+
+        # Distance from the ball to the left and right foot corners of every player
+        foot_y = player_bboxes[..., 3]
+        distance_left = np.hypot(
+            player_bboxes[..., 0] - ball_positions[..., 0],
+            foot_y - ball_positions[..., 1],
+        )
+        distance_right = np.hypot(
+            player_bboxes[..., 2] - ball_positions[..., 0],
+            foot_y - ball_positions[..., 1],
+        )
+        distance = np.fmin(distance_left, distance_right)
+        distance[~(distance < self.max_player_ball_distance)] = np.inf
+
+        closest = distance.argmin(axis=1)
+        frames = np.arange(n_frames)
+        assigned_players = np.where(
+            np.isfinite(distance[frames, closest]), player_ids[frames, closest], -1
+        )
+
+        return self.apply_hysteresis(assigned_players)
+
+    def apply_hysteresis(self, assigned_players):
+        """
+        Drop possession changes lasting fewer than `min_frames_to_switch` frames by
+        carrying the previous possession over them.
+        """
+        if self.min_frames_to_switch <= 1 or len(assigned_players) == 0:
+            return assigned_players
+
+        # Runs of consecutive frames with the same assignment
+        run_starts = np.flatnonzero(
+            np.concatenate(([True], assigned_players[1:] != assigned_players[:-1]))
+        )
+        run_lengths = np.diff(np.append(run_starts, len(assigned_players)))
+
+        # The first run is always kept, short runs take the value of the last kept run
+        keep_run = run_lengths >= self.min_frames_to_switch
+        keep_run[0] = True
+        last_kept_run = np.maximum.accumulate(
+            np.where(keep_run, np.arange(len(run_starts)), 0)
+        )
+        run_values = assigned_players[run_starts][last_kept_run]
+
+        return np.repeat(run_values, run_lengths)
+
+    def apply_hysteresis_stream(self, items):
+        """
+        Online `apply_hysteresis`. Consumes `(payload, assigned_player)` pairs and
+        yields them in the same order with the same assignments as the whole-match
+        method, holding frames back by at most `min_frames_to_switch - 1` frames
+        until their run is long enough to be kept.
+        """
+        # [payload, assigned_player] of the current run, not emitted yet
+        pending = deque()
+        kept_player, run_player, run_length = None, None, 0
+
+        for payload, assigned_player in items:
+            if assigned_player != run_player:
+                # The previous run ended too short, it takes the last kept run
+                while pending:
+                    yield pending.popleft()[0], kept_player
+                run_player, run_length = assigned_player, 0
+                if kept_player is None:
+                    # The first run is always kept
+                    kept_player = assigned_player
+
+            pending.append([payload, assigned_player])
+            run_length += 1
+            if run_player == kept_player or run_length >= self.min_frames_to_switch:
+                kept_player = run_player
+                while pending:
+                    yield pending.popleft()[0], kept_player
+
+        for payload, _ in pending:
+            yield payload, kept_player
+
+    def assign_ball_to_tracks(self, tracks):
+        """
+        Assign the ball for every frame of the nested `tracks` dicts, marking the
+        player with `has_ball`. Returns the assigned player per frame (-1 for none).
+        """
+        n_frames = len(tracks["players"])
+        max_players = max((len(track) for track in tracks["players"]), default=0)
+
+        player_bboxes = np.full((n_frames, max_players, 4), np.nan, dtype=np.float32)
+        player_ids = np.full((n_frames, max_players), -1, dtype=np.int64)
+        ball_bboxes = np.full((n_frames, 4), np.nan, dtype=np.float32)
+        for frame_num, player_track in enumerate(tracks["players"]):
+            for slot, (player_id, player_info) in enumerate(player_track.items()):
+                player_bboxes[frame_num, slot] = player_info["bbox"]
+                player_ids[frame_num, slot] = player_id
+            ball_bbox = tracks["ball"][frame_num].get(1, {}).get("bbox")
+            if ball_bbox is not None and len(ball_bbox) == 4:
+                ball_bboxes[frame_num] = ball_bbox
+
+        assigned_players = self.assign_ball_for_match(
+            player_bboxes, player_ids, ball_bboxes
+        )
+        for frame_num, assigned_player in enumerate(assigned_players):
+            if assigned_player in tracks["players"][frame_num]:
+                tracks["players"][frame_num][assigned_player]["has_ball"] = True
+
+        return assigned_players
+
+    def assign_ball_to_store(self, store):
+        """
+        `assign_ball_to_tracks` for a `TrackStore`, filling its `has_ball` column.
+        """
+        player_rows = np.flatnonzero(
+            store.object_class == OBJECT_CLASSES.index("players")
+        )
+        ball_rows = np.flatnonzero(store.object_class == OBJECT_CLASSES.index("ball"))
+
+        # Slot of each player row within its frame
+        player_frames = store.frame[player_rows]
+        frame_first_row = np.searchsorted(player_frames, np.arange(store.n_frames))
+        slots = np.arange(len(player_rows)) - frame_first_row[player_frames]
+        max_players = int(slots.max()) + 1 if len(slots) else 0
+
+        player_bboxes = np.full(
+            (store.n_frames, max_players, 4), np.nan, dtype=np.float32
+        )
+        player_ids = np.full((store.n_frames, max_players), -1, dtype=np.int64)
+        player_bboxes[player_frames, slots] = store.bbox[player_rows]
+        player_ids[player_frames, slots] = store.track_id[player_rows]
+
+        ball_bboxes = np.full((store.n_frames, 4), np.nan, dtype=np.float32)
+        ball_bboxes[store.frame[ball_rows]] = store.bbox[ball_rows]
+
+        assigned_players = self.assign_ball_for_match(
+            player_bboxes, player_ids, ball_bboxes
+        )
+
+        row_lookup = np.full((store.n_frames, max(max_players, 1)), -1)
+        row_lookup[player_frames, slots] = player_rows
+        frames = np.arange(store.n_frames)
+        is_assigned = player_ids == assigned_players[:, None]
+        # The hysteresis can carry possession over frames the player is absent from
+        is_present = (assigned_players != -1) & is_assigned.any(axis=1)
+        assigned_slots = is_assigned.argmax(axis=1)
+        has_ball_rows = row_lookup[frames, assigned_slots][is_present]
+
+        has_ball = np.zeros(len(store), dtype=bool)
+        has_ball[has_ball_rows] = True
+        store.set("has_ball", has_ball)
+
+        return assigned_players
+
+    @staticmethod
+    def get_assigned_players(tracks):
+        """
+        Player marked with `has_ball` in every frame of the nested `tracks` dicts,
+        -1 for none, as returned by `assign_ball_to_tracks`.
+        """
+        return np.array(
+            [
+                next(
+                    (
+                        player_id
+                        for player_id, player_info in player_track.items()
+                        if player_info.get("has_ball")
+                    ),
+                    -1,
+                )
+                for player_track in tracks["players"]
+            ],
+            dtype=np.int64,
+        )
+
+    @staticmethod
+    def get_team_ball_control(tracks, assigned_players):
+        """
+        Team in control of the ball per frame: the team of the assigned player, or
+        the last team in control when nobody has the ball. Frames before the first
+        possession are 0.
+        """
+        team_ball_control = np.zeros(len(assigned_players), dtype=np.int64)
+        for frame_num, assigned_player in enumerate(assigned_players):
+            player_info = tracks["players"][frame_num].get(assigned_player)
+            if player_info is not None:
+                team_ball_control[frame_num] = player_info.get("team", 0)
+
+        # Carry the last team forward over frames without possession
+        has_team = team_ball_control > 0
+        last_team_frame = np.maximum.accumulate(
+            np.where(has_team, np.arange(len(team_ball_control)), 0)
+        )
+        return np.where(
+            has_team | has_team[last_team_frame],
+            team_ball_control[last_team_frame],
+            0,
+        )
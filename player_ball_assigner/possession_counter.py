@@ -0,0 +1,30 @@
+class PossessionCounter:
+    """
+    Running count of the frames each team has been in control of the ball.
+
+    `update` is O(1) per frame, so possession percentages can be drawn or emitted
+    live instead of re-scanning every previous frame.
+    """
+
+    def __init__(self) -> None:
+        self.team_frames = {1: 0, 2: 0}
+        self.current_team = 0
+
+    def update(self, team_id):
+        """
+        Count one frame for `team_id`, or for the last team in control when
+        `team_id` is not a team (nobody has the ball). Returns the team counted,
+        0 before anyone had the ball.
+        """
+        if team_id in self.team_frames:
+            self.current_team = team_id
+        if self.current_team:
+            self.team_frames[self.current_team] += 1
+        return self.current_team
+
+    def percentages(self):
+        total_frames = max(sum(self.team_frames.values()), 1)
+        return {
+            team_id: num_frames / total_frames
+            for team_id, num_frames in self.team_frames.items()
+        }
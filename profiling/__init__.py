@@ -0,0 +1 @@
+from .pipeline_profiler import PipelineProfiler, get_peak_rss
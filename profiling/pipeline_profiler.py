@@ -0,0 +1,274 @@
+import bisect
+import json
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def get_peak_rss():
+    """
+    Peak resident set size of the process in bytes.
+    """
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in kilobytes on Linux and in bytes on macOS
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+class StageStats:
+    # Upper bounds in seconds of the latency histogram buckets
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+    def __init__(self) -> None:
+        self.seconds = 0.0
+        self.frames = 0
+        self.calls = 0
+        self.peak_rss = 0
+        self.bucket_counts = [0] * (len(self.BUCKETS) + 1)
+
+    def observe(self, seconds, frames=1):
+        self.seconds += seconds
+        self.frames += frames
+        self.calls += 1
+        self.bucket_counts[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+
+    def to_dict(self):
+        return {
+            "seconds": self.seconds,
+            "frames": self.frames,
+            "frames_per_second": self.frames / self.seconds if self.seconds else None,
+            "peak_rss_bytes": self.peak_rss,
+            "latency_histogram": {
+                "buckets": list(self.BUCKETS) + ["+Inf"],
+                "counts": self.bucket_counts,
+            },
+        }
+
+
+class QueueStats:
+    def __init__(self, read_depth) -> None:
+        self.read_depth = read_depth
+        self.current = 0
+        self.max = 0
+        self.total = 0
+        self.samples = 0
+
+    def sample(self):
+        depth = self.read_depth()
+        if depth is None:
+            return
+        self.current = depth
+        self.max = max(self.max, depth)
+        self.total += depth
+        self.samples += 1
+
+    def to_dict(self):
+        return {
+            "current": self.current,
+            "max": self.max,
+            "mean": self.total / self.samples if self.samples else None,
+        }
+
+
+class PipelineProfiler:
+    """
+    Per-stage wall time, frames per second, peak RSS, queue depths and latency
+    histograms of the pipeline.
+
+    Batch stages are timed with `stage`. Streaming stages are wrapped with
+    `wrap_stream`, which times every item: a stage is only charged for its own
+    time, not for the time spent pulling items from the wrapped stages upstream
+    on the same thread. Queues registered with `add_queue` are sampled every time
+    an item is produced.
+
+    The results are available with `get_report` (JSON) or `get_prometheus_text`,
+    also served over HTTP by `serve`. A disabled profiler hands back the streams
+    unchanged and no-op contexts, so leaving the calls in costs nothing.
+    """
+
+    def __init__(self, enabled=True) -> None:
+        self.enabled = enabled
+        self.stages = {}
+        self.queues = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.start_time = time.perf_counter()
+        self.server = None
+
+    def get_stage(self, name):
+        with self.lock:
+            if name not in self.stages:
+                self.stages[name] = StageStats()
+            return self.stages[name]
+
+    def record(self, name, seconds, frames=1):
+        stage = self.get_stage(name)
+        with self.lock:
+            stage.observe(seconds, frames)
+            stage.peak_rss = get_peak_rss()
+
+    def stage(self, name, frames=1):
+        """
+        Context manager timing one batch stage that processes `frames` frames.
+        """
+        if not self.enabled:
+            return nullcontext()
+        return self._time_stage(name, frames)
+
+    @contextmanager
+    def _time_stage(self, name, frames):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, frames)
+
+    def wrap_stream(self, name, stream):
+        """
+        Time each item of the generator stage `stream` under `name`.
+        """
+        if not self.enabled:
+            return stream
+        return self._time_stream(name, stream)
+
+    def _time_stream(self, name, stream):
+        # Time of the wrapped stages nested in the current item, per thread
+        if not hasattr(self.local, "nested"):
+            self.local.nested = []
+
+        stream = iter(stream)
+        while True:
+            self.local.nested.append(0.0)
+            start = time.perf_counter()
+            try:
+                item = next(stream)
+            except StopIteration:
+                return
+            finally:
+                elapsed = time.perf_counter() - start
+                nested = self.local.nested.pop()
+                if self.local.nested:
+                    self.local.nested[-1] += elapsed
+
+            self.record(name, elapsed - nested)
+            for queue_stats in self.queues.values():
+                queue_stats.sample()
+            yield item
+
+    def add_queue(self, name, read_depth):
+        """
+        Sample the depth of a queue, `read_depth` returns it or None when the queue
+        does not exist at the moment.
+        """
+        if self.enabled:
+            self.queues[name] = QueueStats(read_depth)
+
+    def get_report(self):
+        with self.lock:
+            return {
+                "wall_seconds": time.perf_counter() - self.start_time,
+                "peak_rss_bytes": get_peak_rss(),
+                "stages": {
+                    name: stage.to_dict() for name, stage in self.stages.items()
+                },
+                "queues": {
+                    name: queue_stats.to_dict()
+                    for name, queue_stats in self.queues.items()
+                },
+            }
+
+    def write_report(self, path):
+        with open(path, "w") as f:
+            json.dump(self.get_report(), f, indent=2)
+
+    def get_prometheus_text(self):
+        report = self.get_report()
+        stages = report["stages"]
+        queues = report["queues"]
+        lines = [
+            "# TYPE pipeline_peak_rss_bytes gauge",
+            f"pipeline_peak_rss_bytes {report['peak_rss_bytes']}",
+        ]
+
+        # Every metric family is written as one group
+        lines.append("# TYPE pipeline_stage_seconds_total counter")
+        for name, stage in stages.items():
+            lines.append(
+                f'pipeline_stage_seconds_total{{stage="{name}"}} {stage["seconds"]}'
+            )
+        lines.append("# TYPE pipeline_stage_frames_total counter")
+        for name, stage in stages.items():
+            lines.append(
+                f'pipeline_stage_frames_total{{stage="{name}"}} {stage["frames"]}'
+            )
+
+        lines.append("# TYPE pipeline_stage_latency_seconds histogram")
+        for name, stage in stages.items():
+            histogram = stage["latency_histogram"]
+            cumulative = 0
+            for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                cumulative += count
+                lines.append(
+                    f'pipeline_stage_latency_seconds_bucket{{stage="{name}",le="{bound}"}} '
+                    f"{cumulative}"
+                )
+            lines.append(
+                f'pipeline_stage_latency_seconds_sum{{stage="{name}"}} {stage["seconds"]}'
+            )
+            lines.append(
+                f'pipeline_stage_latency_seconds_count{{stage="{name}"}} {cumulative}'
+            )
+
+        lines.append("# TYPE pipeline_queue_depth gauge")
+        for name, queue_stats in queues.items():
+            lines.append(
+                f'pipeline_queue_depth{{queue="{name}"}} {queue_stats["current"]}'
+            )
+        lines.append("# TYPE pipeline_queue_depth_max gauge")
+        for name, queue_stats in queues.items():
+            lines.append(
+                f'pipeline_queue_depth_max{{queue="{name}"}} {queue_stats["max"]}'
+            )
+
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        """
+        Serve `/metrics` (Prometheus text) and `/report` (JSON) on a background
+        thread until `shutdown`.
+        """
+        profiler = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = profiler.get_prometheus_text().encode()
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path == "/report":
+                    body = json.dumps(profiler.get_report()).encode()
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(
+            target=self.server.serve_forever, name="metrics-server", daemon=True
+        ).start()
+        return self.server.server_address[1]
+
+    def shutdown(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
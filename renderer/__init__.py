@@ -0,0 +1 @@
+from .overlay_renderer import OverlayRenderer, Sprite
@@ -1 +1,2 @@
+from .online_speed_and_distance import OnlineSpeedAndDistance
 from .speed_distance_estimator import SpeedAndDistanceEstimator
@@ -0,0 +1,101 @@
+from collections import OrderedDict, deque
+
+from utils import measure_distance
+
+
+class OnlineSpeedAndDistance:
+    """
+    Per-track rolling speed and cumulative distance, updated frame by frame.
+
+    Each visible track keeps the transformed positions of its last `frame_window`
+    frames; speed is measured between the ends of that window and distance is
+    accumulated every `frame_window` frames, like the windowed batch method. Windows
+    are kept in least-recently-seen order, so stale tracks are evicted from the
+    front and every update is O(1) per object.
+
+    The cumulative distance outlives the window, so a track that ByteTrack finds
+    again after an occlusion carries on from its distance so far. It is forgotten
+    once the track has not been seen for `evict_after` frames.
+    """
+
+    def __init__(self, frame_rate=24, frame_window=5, evict_after=240) -> None:
+        self.frame_rate = frame_rate
+        self.frame_window = frame_window
+        self.evict_after = evict_after
+
+        # Keyed by (objects, track_id)
+        self.track_windows = OrderedDict()
+        self.distance_anchors = {}
+        self.total_distance = {}
+        # Frame each track was last seen at, in least-recently-seen order
+        self.last_seen = OrderedDict()
+
+    def update(self, frame_num, frame_tracks):
+        """
+        Add `speed` and `distance` to the players of one frame and return
+        `{(objects, track_id): (speed, distance)}` for the players updated.
+        """
+        stats = {}
+        for objects, track in frame_tracks.items():
+            if objects == "ball" or objects == "referees":
+                continue
+
+            for track_id, track_info in track.items():
+                # Also seen while outside the calibrated area of the pitch
+                key = (objects, track_id)
+                self.last_seen[key] = frame_num
+                self.last_seen.move_to_end(key)
+
+                position = track_info.get("transformed_position")
+                if position is None:
+                    continue
+
+                window = self.track_windows.get(key)
+                if window is None:
+                    window = deque(maxlen=self.frame_window + 1)
+                    self.track_windows[key] = window
+                else:
+                    self.track_windows.move_to_end(key)
+                window.append((frame_num, position))
+
+                # Accumulate distance once per window, like the batch method
+                anchor_frame, anchor_position = self.distance_anchors.setdefault(
+                    key, (frame_num, position)
+                )
+                if frame_num - anchor_frame >= self.frame_window:
+                    self.total_distance[key] = self.total_distance.get(
+                        key, 0
+                    ) + measure_distance(anchor_position, position)
+                    self.distance_anchors[key] = (frame_num, position)
+
+                start_frame, start_position = window[0]
+                if start_frame == frame_num:
+                    continue
+
+                distance_covered = measure_distance(start_position, position)
+                time_elapsed = (frame_num - start_frame) / self.frame_rate
+
+                speed_meter_per_second = distance_covered / time_elapsed
+                speed_km_per_hr = speed_meter_per_second * 3.16
+
+                track_info["speed"] = speed_km_per_hr
+                track_info["distance"] = self.total_distance.get(key, 0)
+                stats[key] = (track_info["speed"], track_info["distance"])
+
+        # Forget the windows of tracks that have not been seen for a whole window
+        while self.track_windows:
+            key, window = next(iter(self.track_windows.items()))
+            if frame_num - window[-1][0] <= self.frame_window:
+                break
+            del self.track_windows[key]
+            del self.distance_anchors[key]
+
+        # Forget the distance of tracks gone for longer than ByteTrack keeps them
+        while self.last_seen:
+            key, last_frame = next(iter(self.last_seen.items()))
+            if frame_num - last_frame <= self.evict_after:
+                break
+            del self.last_seen[key]
+            self.total_distance.pop(key, None)
+
+        return stats
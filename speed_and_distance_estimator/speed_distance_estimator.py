@@ -1,12 +1,99 @@
 import cv2
+import numpy as np
 
+from track_store import OBJECT_CLASSES
 from utils import get_foot_position, measure_distance
 
+from .online_speed_and_distance import OnlineSpeedAndDistance
+
+
+def grouped_exponential_moving_average(values, segment_starts, alpha):
+    """
+    Exponential moving average of `values` (along the first axis) that restarts at
+    every row where `segment_starts` is True, computed without a Python loop over
+    rows.
+
+    Each segment is cut into short blocks. Inside a block the EMA is a weighted
+    cumulative sum, and the blocks of a segment are chained with one vectorized step
+    per block rank. Blocks are kept short enough for the weights to stay well within
+    float precision.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n_rows = len(values)
+    if n_rows == 0 or alpha >= 1:
+        return values.copy()
+
+    decay = 1 - alpha
+    block_size = int(np.clip(6 / -np.log10(decay), 1, 256))
+
+    rows = np.arange(n_rows)
+    segment_start = np.maximum.accumulate(np.where(segment_starts, rows, 0))
+    position = rows - segment_start
+    block_rank = position // block_size
+    block_position = position % block_size
+
+    # y_i = decay * y_(i-1) + c_i, where the first row of a segment is taken as is
+    increments = np.where(
+        np.reshape(segment_starts, (-1,) + (1,) * (values.ndim - 1)),
+        values,
+        alpha * values,
+    )
+
+    # EMA inside each block, as if the block started from zero, with the blocks laid
+    # out as rows of a padded matrix so the cumulative sums stay per block
+    is_block_start = block_position == 0
+    block_index = np.cumsum(is_block_start) - 1
+    n_blocks = int(block_index[-1]) + 1
+    weights = decay ** -block_position.astype(np.float64)
+    weights = weights.reshape((-1,) + (1,) * (values.ndim - 1))
+    padded = np.zeros((n_blocks, block_size) + values.shape[1:])
+    padded[block_index, block_position] = increments * weights
+    local = np.cumsum(padded, axis=1)[block_index, block_position] / weights
+
+    # Chain the blocks of each segment by carrying the last value of the previous block
+    block_ends = np.flatnonzero(np.append(is_block_start[1:], True))
+    block_end_values = local[block_ends].copy()
+    block_end_decay = decay ** (block_position[block_ends] + 1)
+    block_end_decay = block_end_decay.reshape((-1,) + (1,) * (values.ndim - 1))
+    block_end_ranks = block_rank[block_ends]
+    for rank in range(1, int(block_rank.max()) + 1):
+        current = np.flatnonzero(block_end_ranks == rank)
+        block_end_values[current] += (
+            block_end_decay[current] * block_end_values[current - 1]
+        )
+
+    carry = np.zeros_like(values)
+    has_previous_block = block_rank > 0
+    carry[has_previous_block] = block_end_values[block_index[has_previous_block] - 1]
+    carry_decay = (decay ** (block_position + 1)).reshape(
+        (-1,) + (1,) * (values.ndim - 1)
+    )
+    return local + carry_decay * carry
+
 
 class SpeedAndDistanceEstimator:
-    def __init__(self) -> None:
-        self.frame_window = 5
-        self.frame_rate = 24
+    SMOOTHING_METHODS = ("rolling", "ema")
+
+    def __init__(self, frame_rate=24, frame_window=5, smoothing="rolling") -> None:
+        """
+        Args:
+            frame_rate: Frames per second of the video, see `utils.get_video_fps`.
+            frame_window: Number of frames speed is smoothed over, and the stride at
+                which distance is accumulated.
+            smoothing: How `add_speed_and_distance_to_store` smooths the speed:
+                "rolling" averages over the last `frame_window` frames, "ema" uses an
+                exponential moving average with a span of `frame_window` frames.
+        """
+        if smoothing not in self.SMOOTHING_METHODS:
+            raise ValueError(
+                f"Unknown smoothing {smoothing!r}, use one of {self.SMOOTHING_METHODS}"
+            )
+        self.frame_window = frame_window
+        self.frame_rate = frame_rate
+        self.smoothing = smoothing
+
+        # Accumulator used by the streaming method
+        self.online = None
 
     def add_speed_and_distance_to_tracks(self, tracks):
         total_distance = {}
@@ -55,45 +142,140 @@ class SpeedAndDistanceEstimator:
                             total_distance[objects][track_id]
                         )
 
+    def add_speed_and_distance_to_store(self, store):
+        """
+        Array-based speed and distance for all player tracks of a `TrackStore`.
+
+        Rows of a track are taken in frame order, skipping rows without a transformed
+        position, and time between rows comes from their frame numbers, so gaps in a
+        track are handled instead of being dropped. Speed is smoothed per
+        `smoothing`. Distance is accumulated between positions `frame_window` rows
+        apart, like the windowed method, so detection jitter does not add up, and
+        never decreases along a track.
+        """
+        is_player = store.object_class == OBJECT_CLASSES.index("players")
+        has_position = ~np.isnan(store.transformed_position).any(axis=1)
+        candidate_rows = np.flatnonzero(is_player & has_position)
+
+        # Group rows by track, in frame order
+        order = np.lexsort(
+            (store.frame[candidate_rows], store.track_id[candidate_rows])
+        )
+        rows = candidate_rows[order]
+        track_id = store.track_id[rows]
+        frame = store.frame[rows].astype(np.float64)
+        position = store.transformed_position[rows].astype(np.float64)
+
+        speed = np.full(len(store), np.nan, dtype=np.float32)
+        distance = np.full(len(store), np.nan, dtype=np.float32)
+        if len(rows) == 0:
+            store.set("speed", speed)
+            store.set("distance", distance)
+            return
+
+        track_starts = np.concatenate(([True], track_id[1:] != track_id[:-1]))
+        row_numbers = np.arange(len(rows))
+        track_first_row = np.maximum.accumulate(np.where(track_starts, row_numbers, 0))
+        track_position = row_numbers - track_first_row
+
+        if self.smoothing == "rolling":
+            # Displacement between the ends of the last `frame_window` rows, so
+            # frame-to-frame jitter cancels out like in the windowed method
+            window_start = row_numbers - np.minimum(self.frame_window, track_position)
+            window_distance = np.hypot(*(position - position[window_start]).T)
+            window_time = (frame - frame[window_start]) / self.frame_rate
+        else:
+            # Speed of the exponentially smoothed trajectory
+            smoothed_position = grouped_exponential_moving_average(
+                position, track_starts, alpha=2 / (self.frame_window + 1)
+            )
+            previous_row = np.where(track_starts, row_numbers, row_numbers - 1)
+            window_distance = np.hypot(
+                *(smoothed_position - smoothed_position[previous_row]).T
+            )
+            window_time = (frame - frame[previous_row]) / self.frame_rate
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            speed_meter_per_second = np.where(
+                window_time > 0, window_distance / window_time, np.nan
+            )
+
+        # Distance between anchor rows `frame_window` apart, held from one anchor to
+        # the next so it never goes down when a player turns back in between
+        is_anchor = track_position % self.frame_window == 0
+        last_anchor = np.maximum.accumulate(np.where(is_anchor, row_numbers, 0))
+        previous_anchor = np.where(
+            track_position >= self.frame_window,
+            row_numbers - self.frame_window,
+            row_numbers,
+        )
+        anchor_step = np.where(
+            is_anchor, np.hypot(*(position - position[previous_anchor]).T), 0
+        )
+        anchor_distance = np.cumsum(anchor_step)
+        anchor_distance -= anchor_distance[track_first_row]
+        total_distance = anchor_distance[last_anchor]
+
+        speed[rows] = speed_meter_per_second * 3.16
+        distance[rows] = total_distance
+        store.set("speed", speed)
+        store.set("distance", distance)
+
+    def add_speed_and_distance_to_frame_tracks(self, frame_num, frame_tracks):
+        """
+        Streaming counterpart of `add_speed_and_distance_to_tracks`, see
+        `OnlineSpeedAndDistance`. Returns the stats of the players updated.
+        """
+        if self.online is None:
+            self.online = OnlineSpeedAndDistance(self.frame_rate, self.frame_window)
+        return self.online.update(frame_num, frame_tracks)
+
     def draw_speed_and_distance(self, frames, tracks):
         output_frames = []
         for frame_num, frame in enumerate(frames):
-            for objects, object_track in tracks.items():
-                if objects == "ball" or objects == "referees":
-                    continue
-                for _, player_info in object_track[frame_num].items():
-                    if "speed" in player_info:
-                        speed = player_info.get("speed", None)
-                        distance = player_info.get("distance", None)
-                        if speed is None or distance is None:
-                            continue
+            frame_tracks = {objects: tracks[objects][frame_num] for objects in tracks}
+            output_frames.append(
+                self.draw_frame_speed_and_distance(frame, frame_tracks)
+            )
 
-                        bbox = player_info["bbox"]
-                        position = get_foot_position(bbox)
-                        position = list(position)
-                        position[1] += 40
-
-                        position = tuple(map(int, position))
-
-                        cv2.putText(
-                            frame,
-                            f"{speed:.2f} km/h",
-                            position,
-                            cv2.FONT_HERSHEY_SIMPLEX,
-                            0.5,
-                            (0, 0, 0),
-                            2,  # thickness
-                        )
+        return output_frames
 
-                        cv2.putText(
-                            frame,
-                            f"{distance:.2f} m",
-                            (position[0], position[1] + 20),
-                            cv2.FONT_HERSHEY_SIMPLEX,
-                            0.5,
-                            (0, 0, 0),
-                            2,  # thickness
-                        )
-            output_frames.append(frame)
+    def draw_frame_speed_and_distance(self, frame, frame_tracks):
+        for objects, track in frame_tracks.items():
+            if objects == "ball" or objects == "referees":
+                continue
+            for _, player_info in track.items():
+                if "speed" in player_info:
+                    speed = player_info.get("speed", None)
+                    distance = player_info.get("distance", None)
+                    if speed is None or distance is None:
+                        continue
 
-        return output_frames
+                    bbox = player_info["bbox"]
+                    position = get_foot_position(bbox)
+                    position = list(position)
+                    position[1] += 40
+
+                    position = tuple(map(int, position))
+
+                    cv2.putText(
+                        frame,
+                        f"{speed:.2f} km/h",
+                        position,
+                        cv2.FONT_HERSHEY_SIMPLEX,
+                        0.5,
+                        (0, 0, 0),
+                        2,  # thickness
+                    )
+
+                    cv2.putText(
+                        frame,
+                        f"{distance:.2f} m",
+                        (position[0], position[1] + 20),
+                        cv2.FONT_HERSHEY_SIMPLEX,
+                        0.5,
+                        (0, 0, 0),
+                        2,  # thickness
+                    )
+
+        return frame
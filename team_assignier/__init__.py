@@ -1 +1,2 @@
+from .color_extractor import PlayerColorExtractor
 from .team_assign import TeamAssiginer
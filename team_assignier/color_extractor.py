@@ -0,0 +1,157 @@
+import cv2
+import numpy as np
+
+
+class PlayerColorExtractor:
+    """
+    Extracts the jersey colour of players from the top half of their bbox.
+
+    Methods:
+        "kmeans": a scikit-learn KMeans per player crop (the original behaviour).
+        "batched": every crop is resized to `crop_size` and a 2-cluster k-means is
+            solved for all crops of a frame at once with NumPy.
+        "histogram": the dominant hue bin of each resized crop, ignoring the bin
+            of the background (the corners), in HSV space.
+
+    All methods return BGR colours, one row per bbox.
+    """
+
+    METHODS = ("kmeans", "batched", "histogram")
+
+    def __init__(self, method="kmeans", crop_size=(16, 16), iterations=10) -> None:
+        if method not in self.METHODS:
+            raise ValueError(
+                f"Unknown colour method {method!r}, use one of {self.METHODS}"
+            )
+        self.method = method
+        self.crop_size = crop_size
+        self.iterations = iterations
+        self.hue_bins = 18
+
+    def get_player_colors(self, frame, bboxes):
+        if len(bboxes) == 0:
+            return np.empty((0, 3))
+        if self.method == "kmeans":
+            return np.array([self.get_kmeans_color(frame, bbox) for bbox in bboxes])
+
+        crops = self.get_top_half_crops(frame, bboxes)
+        if self.method == "batched":
+            return self.get_batched_colors(crops)
+        return self.get_histogram_colors(crops)
+
+    def get_top_half(self, frame, bbox):
+        image = frame[int(bbox[1]) : int(bbox[3]), int(bbox[0]) : int(bbox[2])]
+        return image[: int(image.shape[0] / 2), :]
+
+    def get_top_half_crops(self, frame, bboxes):
+        """
+        Returns the top halves of the bboxes resized to `crop_size`, as an
+        (N, height, width, 3) uint8 array.
+        """
+        width, height = self.crop_size
+        crops = np.zeros((len(bboxes), height, width, 3), dtype=np.uint8)
+        for index, bbox in enumerate(bboxes):
+            top_half_image = self.get_top_half(frame, bbox)
+            if top_half_image.size:
+                crops[index] = cv2.resize(
+                    top_half_image, (width, height), interpolation=cv2.INTER_AREA
+                )
+        return crops
+
+    def get_kmeans_color(self, frame, bbox):
+        from sklearn.cluster import KMeans
+
+        top_half_image = self.get_top_half(frame, bbox)
+
+        # Get cluster model
+        image_2d = top_half_image.reshape(-1, 3)
+        kmeans = KMeans(n_clusters=2, random_state=0, init="k-means++", n_init=10).fit(
+            image_2d
+        )
+
+        # Get cluster labels
+        cluster_labels = kmeans.labels_
+
+        # reshape labels into original images
+        clustered_image = cluster_labels.reshape(top_half_image.shape[:2])
+
+        corner_cluster = (
+            clustered_image[0, -1],
+            clustered_image[0, 0],
+            clustered_image[-1, -1],
+            clustered_image[-1, 0],
+        )
+
+        non_player_cluster = max(corner_cluster, key=corner_cluster.count)
+        player_cluster = 1 - non_player_cluster
+
+        return kmeans.cluster_centers_[player_cluster]
+
+    def get_batched_colors(self, crops):
+        n_crops, height, width, _ = crops.shape
+        pixels = crops.reshape(n_crops, -1, 3).astype(np.float32)
+        corner_indices = [0, width - 1, (height - 1) * width, height * width - 1]
+
+        # Start with the corners as background and the centre of the crop as player
+        centers = np.stack(
+            [
+                pixels[:, corner_indices].mean(axis=1),
+                crops[:, height // 4 : 3 * height // 4, width // 4 : 3 * width // 4]
+                .reshape(n_crops, -1, 3)
+                .mean(axis=1),
+            ],
+            axis=1,
+        )
+
+        for _ in range(self.iterations):
+            distances = ((pixels[:, :, None, :] - centers[:, None, :, :]) ** 2).sum(-1)
+            labels = distances.argmin(axis=2)
+            for cluster in (0, 1):
+                members = (labels == cluster)[..., None]
+                counts = members.sum(axis=1)
+                sums = (pixels * members).sum(axis=1)
+                centers[:, cluster] = np.where(
+                    counts > 0, sums / np.maximum(counts, 1), centers[:, cluster]
+                )
+
+        # Like the KMeans method, the player is the cluster not owning most corners
+        non_player_cluster = (labels[:, corner_indices].sum(axis=1) >= 2).astype(int)
+        player_cluster = 1 - non_player_cluster
+        return centers[np.arange(n_crops), player_cluster]
+
+    def get_histogram_colors(self, crops):
+        n_crops, height, width, _ = crops.shape
+        hsv = cv2.cvtColor(crops.reshape(-1, width, 3), cv2.COLOR_BGR2HSV).reshape(
+            n_crops, -1, 3
+        )
+        pixels = crops.reshape(n_crops, -1, 3).astype(np.float32)
+        corner_indices = [0, width - 1, (height - 1) * width, height * width - 1]
+
+        # Low saturation pixels (white, grey, black) get their own bins by brightness
+        hue_bin = hsv[..., 0].astype(int) * self.hue_bins // 180
+        is_grey = hsv[..., 1] < 50
+        bins = np.where(
+            is_grey, self.hue_bins + hsv[..., 2].astype(int) * 3 // 256, hue_bin
+        )
+        n_bins = self.hue_bins + 3
+
+        histograms = np.zeros((n_crops, n_bins), dtype=int)
+        np.add.at(
+            histograms, (np.repeat(np.arange(n_crops), bins.shape[1]), bins.ravel()), 1
+        )
+
+        # The most common corner bin is the background
+        corner_histograms = np.zeros((n_crops, n_bins), dtype=int)
+        corner_bins = bins[:, corner_indices]
+        np.add.at(
+            corner_histograms,
+            (np.repeat(np.arange(n_crops), len(corner_indices)), corner_bins.ravel()),
+            1,
+        )
+        background_bin = corner_histograms.argmax(axis=1)
+        histograms[np.arange(n_crops), background_bin] = 0
+
+        player_bin = histograms.argmax(axis=1)
+        in_player_bin = (bins == player_bin[:, None])[..., None]
+        counts = np.maximum(in_player_bin.sum(axis=1), 1)
+        return (pixels * in_player_bin).sum(axis=1) / counts
@@ -1,51 +1,60 @@
-import cv2
-from sklearn.cluster import KMeans
+from collections import Counter, deque
+
+from .color_extractor import PlayerColorExtractor
 
 
 class TeamAssiginer:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        color_method="kmeans",
+        samples_per_track=5,
+        sample_interval=24,
+        reevaluate_interval=240,
+        evict_after=120,
+        team_overrides=None,
+    ) -> None:
+        """
+        Args:
+            color_method: Jersey colour extraction method of `PlayerColorExtractor`,
+                "kmeans", "batched" or "histogram".
+            samples_per_track: Number of team votes kept per player; the team is the
+                majority of these votes.
+            sample_interval: Frames between two crops sampled while a player has
+                fewer than `samples_per_track` votes.
+            reevaluate_interval: Frames between two crops once a player has all its
+                votes; the new vote replaces the oldest one.
+            evict_after: Players not seen for this many frames are forgotten.
+            team_overrides: Optional `{player_id: team_id}` forced assignments.
+        """
         self.team_colors = {}
         self.player_team_dict = {}
+        self.color_extractor = PlayerColorExtractor(method=color_method)
 
-    def get_clustering_model(self, image):
-        image_2d = image.reshape(-1, 3)
-        return KMeans(n_clusters=2, random_state=0, init="k-means++", n_init=10).fit(
-            image_2d
-        )
-
-    def get_player_color(self, frame, bbox):
-        image = frame[int(bbox[1]) : int(bbox[3]), int(bbox[0]) : int(bbox[2])]
-        top_half_image = image[: int(image.shape[0] / 2), :]
-
-        # Get cluster model
-        kmeans = self.get_clustering_model(top_half_image)
-
-        # Get cluster labels
-        cluster_labels = kmeans.labels_
-
-        # reshape labels into original images
-        clustered_image = cluster_labels.reshape(top_half_image.shape[:2])
-
-        corner_cluster = (
-            clustered_image[0, -1],
-            clustered_image[0, 0],
-            clustered_image[-1, -1],
-            clustered_image[-1, 0],
-        )
+        self.samples_per_track = samples_per_track
+        self.sample_interval = sample_interval
+        self.reevaluate_interval = reevaluate_interval
+        self.evict_after = evict_after
+        self.team_overrides = team_overrides or {}
 
-        non_player_cluster = max(corner_cluster, key=corner_cluster.count)
-        player_cluster = 1 - non_player_cluster
+        # Per player: recent team votes, frame of the last vote and last sighting
+        self.player_votes = {}
+        self.player_last_sample = {}
+        self.player_last_seen = {}
+        self.frame_num = -1
 
-        return kmeans.cluster_centers_[player_cluster]
+    def get_player_color(self, frame, bbox):
+        return self.color_extractor.get_player_colors(frame, [bbox])[0]
 
     def assign_team_color(self, frame, player_detections):
-
-        players_color = []
-
-        for _, player_detection in player_detections.items():
-            bbox = player_detection["bbox"]
-            player_color = self.get_player_color(frame, bbox=bbox)
-            players_color.append(player_color)
+        from sklearn.cluster import KMeans
+
+        players_color = self.color_extractor.get_player_colors(
+            frame,
+            [
+                player_detection["bbox"]
+                for player_detection in player_detections.values()
+            ],
+        )
 
         kmeans = KMeans(n_clusters=2, init="k-means++", n_init=1)
         kmeans.fit(players_color)
@@ -56,18 +65,79 @@ class TeamAssiginer:
         self.team_colors[1] = kmeans.cluster_centers_[0]
         self.team_colors[2] = kmeans.cluster_centers_[1]
 
-    def get_player_team(self, frame, player_bbox, player_id):
-
-        if player_id in self.player_team_dict:
-            return self.player_team_dict[player_id]
-
-        player_color = self.get_player_color(frame, player_bbox)
-        team_id = self.kmeans.predict(player_color.reshape(1, -1))[0]
-        team_id += 1  # Try removing it
-
-        if player_id == 98:
-            team_id = 2
-
-        self.player_team_dict[player_id] = team_id
-
-        return team_id
+    def get_player_team(self, frame, player_bbox, player_id, frame_num):
+        # `frame_num` is required, calls for the players of one frame must not count
+        # as consecutive frames
+        return self.get_players_teams(
+            frame, {player_id: {"bbox": player_bbox}}, frame_num
+        )[player_id]
+
+    def get_players_teams(self, frame, player_track, frame_num=None):
+        """
+        Returns `{player_id: team_id}` for the players of one frame.
+
+        Only players that are due a new vote are classified, all of them in one
+        batch: new players, players with fewer than `samples_per_track` votes every
+        `sample_interval` frames, and all players every `reevaluate_interval` frames.
+        Without `frame_num`, consecutive calls are assumed to be consecutive frames.
+        """
+        self.frame_num = self.frame_num + 1 if frame_num is None else frame_num
+
+        sampled_player_ids = [
+            player_id for player_id in player_track if self.needs_sample(player_id)
+        ]
+
+        if sampled_player_ids:
+            players_color = self.color_extractor.get_player_colors(
+                frame,
+                [player_track[player_id]["bbox"] for player_id in sampled_player_ids],
+            )
+            team_ids = self.kmeans.predict(players_color) + 1  # Try removing it
+
+            for player_id, team_id in zip(sampled_player_ids, team_ids):
+                votes = self.player_votes.setdefault(
+                    player_id, deque(maxlen=self.samples_per_track)
+                )
+                votes.append(team_id)
+                self.player_last_sample[player_id] = self.frame_num
+                self.player_team_dict[player_id] = self.vote(player_id)
+
+        for player_id in player_track:
+            self.player_last_seen[player_id] = self.frame_num
+        self.evict()
+
+        return {
+            player_id: self.player_team_dict[player_id] for player_id in player_track
+        }
+
+    def needs_sample(self, player_id):
+        if player_id not in self.player_votes:
+            return True
+
+        frames_since_sample = self.frame_num - self.player_last_sample[player_id]
+        if len(self.player_votes[player_id]) < self.samples_per_track:
+            return frames_since_sample >= self.sample_interval
+        return frames_since_sample >= self.reevaluate_interval
+
+    def vote(self, player_id):
+        if player_id in self.team_overrides:
+            return self.team_overrides[player_id]
+
+        votes = self.player_votes[player_id]
+        counts = Counter(votes).most_common()
+        # On a tie, the most recent vote wins
+        if len(counts) > 1 and counts[0][1] == counts[1][1]:
+            return votes[-1]
+        return counts[0][0]
+
+    def evict(self):
+        evicted_player_ids = [
+            player_id
+            for player_id, last_seen in self.player_last_seen.items()
+            if self.frame_num - last_seen > self.evict_after
+        ]
+        for player_id in evicted_player_ids:
+            del self.player_last_seen[player_id]
+            del self.player_votes[player_id]
+            del self.player_last_sample[player_id]
+            del self.player_team_dict[player_id]
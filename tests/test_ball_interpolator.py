@@ -0,0 +1,14 @@
+import numpy as np
+import pytest
+
+from trackers import BallInterpolator
+
+BOX = [100, 100, 110, 110]
+
+
+@pytest.mark.parametrize("lookahead, max_gap", [(24, 1), (1, 24), (1, 1)])
+def test_fills_a_gap_of_max_gap_frames(lookahead, max_gap):
+    interpolator = BallInterpolator(lookahead=lookahead, max_gap=max_gap)
+    bboxes, interpolated = interpolator.interpolate([BOX, None, BOX])
+    assert interpolated.tolist() == [False, True, False]
+    assert bboxes[1].tolist() == BOX
@@ -0,0 +1,49 @@
+import numpy as np
+
+from player_ball_assigner import PlayerBallAssiginer
+from track_store import OBJECT_CLASSES, TrackStore
+
+PLAYERS = OBJECT_CLASSES.index("players")
+BALL = OBJECT_CLASSES.index("ball")
+
+
+def make_store():
+    # Player 7 has the ball, leaves the frame for one frame (player 9 is far from
+    # the ball) and comes back; the last frame has no players at all
+    rows = []
+    for frame_num in range(7):
+        rows.append((frame_num, BALL, 1, [100, 195, 110, 205]))
+        if frame_num != 4 and frame_num != 6:
+            rows.append((frame_num, PLAYERS, 7, [80, 100, 120, 200]))
+        if frame_num >= 3 and frame_num != 6:
+            rows.append((frame_num, PLAYERS, 9, [800, 100, 840, 200]))
+    frame, object_class, track_id, bbox = zip(*rows)
+    return TrackStore(frame, object_class, track_id, bbox)
+
+
+def test_carried_over_possession_of_absent_player():
+    store = make_store()
+    assigned_players = PlayerBallAssiginer(min_frames_to_switch=3).assign_ball_to_store(
+        store
+    )
+    # The hysteresis carries player 7 over the frame it is absent from
+    assert assigned_players[4] == 7
+
+    has_ball = store.has_ball
+    assert not has_ball[store.track_id == 9].any()
+    assert not has_ball[store.object_class == BALL].any()
+    has_ball_frames = store.frame[has_ball]
+    np.testing.assert_array_equal(has_ball_frames, [0, 1, 2, 3, 5])
+    assert (store.track_id[has_ball] == 7).all()
+
+
+def test_hysteresis_stream_matches_whole_match():
+    assigned_players = np.array([7, 7, 9, 7, 7, -1, -1, -1, 9, 9, 9, 7], dtype=np.int64)
+    assigner = PlayerBallAssiginer(min_frames_to_switch=3)
+    streamed = [
+        assigned_player
+        for _, assigned_player in assigner.apply_hysteresis_stream(
+            enumerate(assigned_players)
+        )
+    ]
+    assert streamed == assigner.apply_hysteresis(assigned_players).tolist()
@@ -0,0 +1 @@
+from .track_archive import TrackArchive, TrackArchiveWriter, import_pyarrow
@@ -0,0 +1,379 @@
+import json
+import os
+
+import numpy as np
+
+from player_ball_assigner import PossessionCounter
+from track_store import OBJECT_CLASSES, TrackStore
+
+
+def import_pyarrow():
+    # pyarrow is only needed to export or query tracks
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.fs
+        import pyarrow.parquet
+    except ImportError as error:
+        raise ImportError(
+            "Track archives need pyarrow, install it with `pip install pyarrow`"
+        ) from error
+    return pyarrow
+
+
+# Columns of the tracks tables, one row per object per frame, with the name of the
+# `TrackStore` attribute and the index into it for the 2D columns
+TRACK_COLUMNS = {
+    "frame": ("frame", None),
+    "object_class": ("object_class", None),
+    "track_id": ("track_id", None),
+    "bbox_x1": ("bbox", 0),
+    "bbox_y1": ("bbox", 1),
+    "bbox_x2": ("bbox", 2),
+    "bbox_y2": ("bbox", 3),
+    **{
+        f"{column}_{axis}": (column, index)
+        for column in TrackStore.POINT_COLUMNS
+        for index, axis in enumerate("xy")
+    },
+    **{column: (column, None) for column in TrackStore.SCALAR_COLUMNS},
+    "team": ("team", None),
+    "has_ball": ("has_ball", None),
+}
+# Columns of the frames tables, one row per frame, with their dtypes
+FRAME_COLUMNS = {
+    "frame": np.int32,
+    "camera_movement_x": np.float32,
+    "camera_movement_y": np.float32,
+    "team_ball_control": np.int8,
+    "ball_control_team_1": np.float32,
+    "ball_control_team_2": np.float32,
+}
+
+
+def get_empty_columns(table_name):
+    """
+    Empty arrays with the dtypes of every column of the "tracks" or "frames" tables.
+    """
+    if table_name == "frames":
+        return {column: np.empty(0, dtype) for column, dtype in FRAME_COLUMNS.items()}
+    store = TrackStore([], [], [], [], n_frames=0)
+    return {
+        column: (
+            getattr(store, attribute)[:, index]
+            if index is not None
+            else getattr(store, attribute)
+        )
+        for column, (attribute, index) in TRACK_COLUMNS.items()
+    }
+
+
+class TrackArchiveWriter:
+    """
+    Writes the tracks of a match, with the camera movement and ball possession of
+    every frame, as columnar files partitioned by time.
+
+    Each partition covers `partition_seconds` of video and is one Parquet (or Arrow
+    IPC) file in `tracks/` and one in `frames/`, sorted by frame. `metadata.json`
+    lists the frame range of every partition, so `TrackArchive` only opens the
+    files a query needs. Frames can be appended a whole `TrackStore` at a time or
+    frame by frame while streaming; only the current partition is kept in memory.
+
+    Usage:
+        with TrackArchiveWriter("output_videos/tracks", fps=25.0) as writer:
+            writer.append(store, camera_movement, team_ball_control)
+    """
+
+    FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+    def __init__(
+        self,
+        path,
+        fps,
+        partition_seconds=60,
+        file_format="parquet",
+        row_group_size=16384,
+    ) -> None:
+        """
+        Args:
+            path: Directory of the archive, created if needed.
+            fps: Frame rate of the tracks, used to answer queries in seconds.
+            partition_seconds: Length of video in each file.
+            file_format: "parquet" (compressed, with row group statistics for
+                predicate pushdown) or "arrow" (uncompressed IPC files that are
+                memory mapped without decoding).
+            row_group_size: Rows per Parquet row group (or Arrow record batch).
+        """
+        if file_format not in self.FORMATS:
+            raise ValueError(
+                f"Unknown file format {file_format!r}, use one of {tuple(self.FORMATS)}"
+            )
+        self.pa = import_pyarrow()
+        self.path = path
+        self.fps = fps
+        self.partition_frames = max(int(round(partition_seconds * fps)), 1)
+        self.file_format = file_format
+        self.row_group_size = row_group_size
+
+        self.n_frames = 0
+        self.populated = set()
+        self.partitions = []
+        self.possession = PossessionCounter()
+        # Columns of the frames not written yet, as lists of arrays
+        self.pending_tracks = {column: [] for column in TRACK_COLUMNS}
+        self.pending_frames = {column: [] for column in FRAME_COLUMNS}
+
+        for table in ("tracks", "frames"):
+            os.makedirs(os.path.join(path, table), exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def append(self, store, camera_movement=None, team_ball_control=None):
+        """
+        Append the frames of `store` after the frames already written, with the
+        `[x, y]` camera movement and the team in control of the ball (0 for nobody)
+        of each of them.
+        """
+        n_frames = store.n_frames
+        for column, (attribute, index) in TRACK_COLUMNS.items():
+            values = getattr(store, attribute)
+            if index is not None:
+                values = values[:, index]
+            if column == "frame":
+                values = values + self.n_frames
+            self.pending_tracks[column].append(values)
+        self.populated |= store.populated
+
+        camera_movement = np.asarray(
+            camera_movement if camera_movement is not None else np.zeros((n_frames, 2)),
+            dtype=np.float32,
+        ).reshape(n_frames, 2)
+        if team_ball_control is None:
+            team_ball_control = np.zeros(n_frames, dtype=np.int8)
+        ball_control = np.empty((n_frames, 2), dtype=np.float32)
+        counted_teams = np.empty(n_frames, dtype=np.int8)
+        for frame_num, team_id in enumerate(team_ball_control):
+            counted_teams[frame_num] = self.possession.update(int(team_id))
+            percentages = self.possession.percentages()
+            ball_control[frame_num] = percentages[1], percentages[2]
+
+        frame_columns = (
+            np.arange(self.n_frames, self.n_frames + n_frames, dtype=np.int32),
+            camera_movement[:, 0],
+            camera_movement[:, 1],
+            counted_teams,
+            ball_control[:, 0],
+            ball_control[:, 1],
+        )
+        for column, values in zip(FRAME_COLUMNS, frame_columns):
+            self.pending_frames[column].append(values)
+
+        self.n_frames += n_frames
+        while self.n_frames - self.get_partition_start() >= self.partition_frames:
+            self.write_partition(self.get_partition_start() + self.partition_frames)
+
+    def append_frame_tracks(self, frame_tracks, camera_movement=None, team_id=0):
+        """
+        Append one frame in the nested `{objects: {track_id: track_info}}` shape.
+        """
+        store = TrackStore.from_tracks(
+            {objects: [frame_tracks.get(objects, {})] for objects in OBJECT_CLASSES}
+        )
+        self.append(
+            store,
+            None if camera_movement is None else [camera_movement],
+            [team_id],
+        )
+
+    def get_partition_start(self):
+        return self.partitions[-1]["stop_frame"] if self.partitions else 0
+
+    def write_partition(self, stop_frame):
+        start_frame = self.get_partition_start()
+        index = len(self.partitions)
+        name = f"part-{index:05d}{self.FORMATS[self.file_format]}"
+
+        for table_name, pending in (
+            ("tracks", self.pending_tracks),
+            ("frames", self.pending_frames),
+        ):
+            columns = {
+                column: np.concatenate(chunks) if chunks else np.empty(0)
+                for column, chunks in pending.items()
+            }
+            # Rows are in frame order, the rest is kept for the next partition
+            split = int(np.searchsorted(columns["frame"], stop_frame))
+            for column, values in columns.items():
+                pending[column] = [values[split:]]
+            table = self.pa.table(
+                {column: values[:split] for column, values in columns.items()}
+            )
+            self.write_table(table, os.path.join(self.path, table_name, name))
+
+        self.partitions.append(
+            {"file": name, "start_frame": start_frame, "stop_frame": stop_frame}
+        )
+
+    def write_table(self, table, path):
+        if self.file_format == "parquet":
+            self.pa.parquet.write_table(
+                table, path, row_group_size=self.row_group_size, compression="zstd"
+            )
+            return
+        with self.pa.OSFile(path, "wb") as sink:
+            with self.pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table, max_chunksize=self.row_group_size)
+
+    def close(self):
+        if self.n_frames > self.get_partition_start():
+            self.write_partition(self.n_frames)
+
+        metadata = {
+            "fps": self.fps,
+            "n_frames": self.n_frames,
+            "file_format": self.file_format,
+            "object_classes": list(OBJECT_CLASSES),
+            "populated": sorted(self.populated),
+            "partitions": self.partitions,
+        }
+        with open(os.path.join(self.path, TrackArchive.METADATA_FILE), "w") as f:
+            json.dump(metadata, f, indent=2)
+
+
+class TrackArchive:
+    """
+    Range queries on an archive written by `TrackArchiveWriter`.
+
+    Only the partitions overlapping the requested frames are opened, memory
+    mapped, and the filters on frame, object class and track id are pushed down to
+    the Parquet row groups. Results are dicts of NumPy arrays, one per column.
+
+    Usage:
+        archive = TrackArchive("output_videos/tracks")
+        track = archive.read_track("players", 12, start_seconds=600, stop_seconds=1200)
+        players = archive.read_tracks(1000, 1250, objects="players")
+    """
+
+    METADATA_FILE = "metadata.json"
+
+    def __init__(self, path) -> None:
+        self.pa = import_pyarrow()
+        self.path = path
+        with open(os.path.join(path, self.METADATA_FILE)) as f:
+            self.metadata = json.load(f)
+        self.fps = self.metadata["fps"]
+        self.n_frames = self.metadata["n_frames"]
+        self.filesystem = self.pa.fs.LocalFileSystem(use_mmap=True)
+
+    def __len__(self):
+        return self.n_frames
+
+    def time_to_frame(self, seconds):
+        return min(max(int(seconds * self.fps), 0), self.n_frames)
+
+    def get_dataset(self, table_name, start_frame, stop_frame):
+        files = [
+            os.path.join(self.path, table_name, partition["file"])
+            for partition in self.metadata["partitions"]
+            if partition["start_frame"] < stop_frame
+            and partition["stop_frame"] > start_frame
+        ]
+        if not files:
+            return None
+        file_format = "ipc" if self.metadata["file_format"] == "arrow" else "parquet"
+        return self.pa.dataset.dataset(
+            files, format=file_format, filesystem=self.filesystem
+        )
+
+    def read(self, table_name, start_frame, stop_frame, columns=None, filters=()):
+        stop_frame = self.n_frames if stop_frame is None else stop_frame
+        field = self.pa.dataset.field
+        expression = (field("frame") >= start_frame) & (field("frame") < stop_frame)
+        for condition in filters:
+            expression &= condition
+
+        dataset = self.get_dataset(table_name, start_frame, stop_frame)
+        if dataset is None:
+            # No partition overlaps the frames
+            empty_columns = get_empty_columns(table_name)
+            return {
+                column: empty_columns[column]
+                for column in (columns if columns is not None else empty_columns)
+            }
+
+        table = dataset.to_table(
+            columns=list(columns) if columns is not None else None,
+            filter=expression,
+        )
+        return {
+            column: table.column(column).to_numpy() for column in table.column_names
+        }
+
+    def read_tracks(
+        self, start_frame=0, stop_frame=None, objects=None, track_ids=None, columns=None
+    ):
+        """
+        Rows of the frames `start_frame` to `stop_frame` (exclusive), optionally of
+        one object class and of some track ids only.
+        """
+        field = self.pa.dataset.field
+        filters = []
+        if objects is not None:
+            filters.append(field("object_class") == OBJECT_CLASSES.index(objects))
+        if track_ids is not None:
+            filters.append(field("track_id").isin([int(i) for i in track_ids]))
+        return self.read("tracks", start_frame, stop_frame, columns, filters)
+
+    def read_track(
+        self,
+        objects,
+        track_id,
+        start_seconds=0,
+        stop_seconds=None,
+        columns=("frame", "position_x", "position_y"),
+    ):
+        """
+        One track between two times in the video, in frame order.
+        """
+        stop_frame = None if stop_seconds is None else self.time_to_frame(stop_seconds)
+        return self.read_tracks(
+            self.time_to_frame(start_seconds),
+            stop_frame,
+            objects=objects,
+            track_ids=[track_id],
+            columns=columns,
+        )
+
+    def read_frames(self, start_frame=0, stop_frame=None, columns=None):
+        """
+        Camera movement and ball possession of the frames `start_frame` to
+        `stop_frame` (exclusive).
+        """
+        return self.read("frames", start_frame, stop_frame, columns)
+
+    def to_store(self, start_frame=0, stop_frame=None):
+        """
+        The frames `start_frame` to `stop_frame` as a `TrackStore`, numbered from 0.
+        """
+        stop_frame = self.n_frames if stop_frame is None else stop_frame
+        rows = self.read_tracks(start_frame, stop_frame)
+        store = TrackStore(
+            rows["frame"] - start_frame,
+            rows["object_class"],
+            rows["track_id"],
+            np.stack([rows[f"bbox_{name}"] for name in ("x1", "y1", "x2", "y2")], 1),
+            n_frames=stop_frame - start_frame,
+        )
+        # The constructor sorts by (frame, object_class, track_id) like the writer
+        order = np.lexsort((rows["track_id"], rows["object_class"], rows["frame"]))
+        for column in self.metadata["populated"]:
+            if column in TrackStore.POINT_COLUMNS:
+                values = np.stack([rows[f"{column}_x"], rows[f"{column}_y"]], 1)
+            else:
+                values = rows[column]
+            store.set(column, values[order])
+        return store
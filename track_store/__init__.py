@@ -0,0 +1 @@
+from .track_store import OBJECT_CLASSES, TrackStore
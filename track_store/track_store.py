@@ -0,0 +1,233 @@
+import numpy as np
+
+# Object classes in the order they are encoded in the `object_class` column
+OBJECT_CLASSES = ("players", "referees", "ball")
+
+
+class TrackStore:
+    """
+    Columnar, array-backed table of tracked objects.
+
+    Each row is one object in one frame. Rows are kept sorted by
+    (frame, object_class, track_id) so all rows of a frame are a contiguous slice,
+    and a lazily built index gives the rows of one track in frame order.
+
+    Columns:
+        frame (int32), object_class (int8, index into OBJECT_CLASSES), track_id (int32),
+        bbox (float32, N x 4), position / adjusted_position / transformed_position
+        (float32, N x 2, NaN when unknown), speed / distance (float32, NaN when unknown),
+        team (int8, 0 when unknown), has_ball (bool).
+    """
+
+    POINT_COLUMNS = ("position", "adjusted_position", "transformed_position")
+    SCALAR_COLUMNS = ("speed", "distance")
+
+    def __init__(self, frame, object_class, track_id, bbox, n_frames=None) -> None:
+        frame = np.asarray(frame, dtype=np.int32)
+        object_class = np.asarray(object_class, dtype=np.int8)
+        track_id = np.asarray(track_id, dtype=np.int32)
+        bbox = np.asarray(bbox, dtype=np.float32).reshape(-1, 4)
+
+        order = np.lexsort((track_id, object_class, frame))
+        self.frame = frame[order]
+        self.object_class = object_class[order]
+        self.track_id = track_id[order]
+        self.bbox = bbox[order]
+
+        n_rows = len(self.frame)
+        for column in self.POINT_COLUMNS:
+            setattr(self, column, np.full((n_rows, 2), np.nan, dtype=np.float32))
+        for column in self.SCALAR_COLUMNS:
+            setattr(self, column, np.full(n_rows, np.nan, dtype=np.float32))
+        self.team = np.zeros(n_rows, dtype=np.int8)
+        self.has_ball = np.zeros(n_rows, dtype=bool)
+
+        # Names of the optional columns that have been filled in by a stage
+        self.populated = set()
+
+        if n_frames is None:
+            n_frames = int(self.frame[-1]) + 1 if n_rows else 0
+        self.n_frames = n_frames
+
+        # frame_offsets[f]:frame_offsets[f + 1] are the rows of frame f
+        self.frame_offsets = np.searchsorted(self.frame, np.arange(n_frames + 1))
+
+        self._track_order = None
+        self._track_slices = None
+
+    def __len__(self):
+        return len(self.frame)
+
+    @classmethod
+    def from_tracks(cls, tracks):
+        """
+        Build a store from the nested `tracks[objects][frame_num][track_id]` dicts,
+        keeping any per-object fields the earlier stages already added.
+        """
+        n_frames = len(tracks[OBJECT_CLASSES[0]])
+        rows = []
+        for class_index, objects in enumerate(OBJECT_CLASSES):
+            for frame_num, track in enumerate(tracks.get(objects, [])):
+                for track_id, track_info in track.items():
+                    rows.append((frame_num, class_index, int(track_id), track_info))
+
+        store = cls(
+            [row[0] for row in rows],
+            [row[1] for row in rows],
+            [row[2] for row in rows],
+            [row[3]["bbox"] for row in rows],
+            n_frames=n_frames,
+        )
+
+        # Rows were reordered by the constructor, so look them up in sorted order
+        order = np.lexsort(
+            (
+                np.array([row[2] for row in rows], dtype=np.int32),
+                np.array([row[1] for row in rows], dtype=np.int8),
+                np.array([row[0] for row in rows], dtype=np.int32),
+            )
+        )
+        for row_index, source_index in enumerate(order):
+            track_info = rows[source_index][3]
+            for column in cls.POINT_COLUMNS:
+                if column not in track_info:
+                    continue
+                store.populated.add(column)
+                if track_info[column] is not None:
+                    getattr(store, column)[row_index] = track_info[column]
+            for column in cls.SCALAR_COLUMNS:
+                if track_info.get(column) is not None:
+                    store.populated.add(column)
+                    getattr(store, column)[row_index] = track_info[column]
+            if "team" in track_info:
+                store.populated.add("team")
+                store.team[row_index] = track_info["team"]
+            if track_info.get("has_ball", False):
+                store.populated.add("has_ball")
+                store.has_ball[row_index] = True
+
+        return store
+
+    def set(self, column, values, rows=None):
+        """
+        Write `values` into `column` (for all rows, or only `rows`) and mark it
+        as populated so the compatibility view exposes it.
+        """
+        if rows is None:
+            getattr(self, column)[:] = values
+        else:
+            getattr(self, column)[rows] = values
+        self.populated.add(column)
+
+    def frame_slice(self, frame_num):
+        return slice(
+            int(self.frame_offsets[frame_num]), int(self.frame_offsets[frame_num + 1])
+        )
+
+    def frame_rows(self, frame_num, objects=None):
+        """
+        Row indices of `frame_num`, optionally restricted to one object class.
+        """
+        rows = np.arange(
+            self.frame_offsets[frame_num], self.frame_offsets[frame_num + 1]
+        )
+        if objects is not None:
+            rows = rows[self.object_class[rows] == OBJECT_CLASSES.index(objects)]
+        return rows
+
+    def track_rows(self, objects, track_id):
+        """
+        Row indices of one track, in frame order.
+        """
+        self._build_track_index()
+        key = (OBJECT_CLASSES.index(objects), int(track_id))
+        start, stop = self._track_slices.get(key, (0, 0))
+        return self._track_order[start:stop]
+
+    def track_keys(self, objects=None):
+        """
+        The (objects, track_id) pairs present in the store.
+        """
+        self._build_track_index()
+        return [
+            (OBJECT_CLASSES[class_index], track_id)
+            for class_index, track_id in self._track_slices
+            if objects is None or OBJECT_CLASSES[class_index] == objects
+        ]
+
+    def _build_track_index(self):
+        if self._track_order is not None:
+            return
+
+        # Rows grouped by (object_class, track_id), each group in frame order
+        order = np.lexsort((self.frame, self.track_id, self.object_class))
+        grouped_class = self.object_class[order]
+        grouped_id = self.track_id[order]
+        boundaries = np.flatnonzero(
+            (np.diff(grouped_class) != 0) | (np.diff(grouped_id) != 0)
+        )
+        starts = np.concatenate(([0], boundaries + 1))
+        stops = np.concatenate((boundaries + 1, [len(order)]))
+
+        self._track_order = order
+        self._track_slices = {
+            (int(grouped_class[start]), int(grouped_id[start])): (int(start), int(stop))
+            for start, stop in zip(starts, stops)
+            if stop > start
+        }
+
+    def frame_tracks(self, frame_num, team_colors=None):
+        """
+        Compatibility view of a single frame in the nested dict shape:
+        {"players": {track_id: {"bbox": [...], ...}}, "referees": {...}, "ball": {...}}.
+        """
+        frame_tracks = {objects: {} for objects in OBJECT_CLASSES}
+        for row in range(*self.frame_slice(frame_num).indices(len(self))):
+            objects = OBJECT_CLASSES[self.object_class[row]]
+            frame_tracks[objects][int(self.track_id[row])] = self.row_dict(
+                row, team_colors
+            )
+        return frame_tracks
+
+    def to_tracks(self, team_colors=None):
+        """
+        Compatibility view of the whole store in the nested
+        `tracks[objects][frame_num][track_id]` shape used by the drawing code.
+        """
+        tracks = {objects: [] for objects in OBJECT_CLASSES}
+        for frame_num in range(self.n_frames):
+            for objects, track in self.frame_tracks(frame_num, team_colors).items():
+                tracks[objects].append(track)
+        return tracks
+
+    def row_dict(self, row, team_colors=None):
+        track_info = {"bbox": self.bbox[row].tolist()}
+
+        position = self.position[row]
+        if "position" in self.populated and not np.isnan(position).any():
+            track_info["position"] = tuple(int(v) for v in position)
+        adjusted_position = self.adjusted_position[row]
+        if (
+            "adjusted_position" in self.populated
+            and not np.isnan(adjusted_position).any()
+        ):
+            track_info["adjusted_position"] = adjusted_position.tolist()
+        if "transformed_position" in self.populated:
+            transformed_position = self.transformed_position[row]
+            track_info["transformed_position"] = (
+                None
+                if np.isnan(transformed_position).any()
+                else transformed_position.tolist()
+            )
+        for column in self.SCALAR_COLUMNS:
+            value = getattr(self, column)[row]
+            if column in self.populated and not np.isnan(value):
+                track_info[column] = float(value)
+        if self.team[row] > 0:
+            track_info["team"] = int(self.team[row])
+            if team_colors is not None:
+                track_info["color"] = team_colors[int(self.team[row])]
+        if self.has_ball[row]:
+            track_info["has_ball"] = True
+
+        return track_info
@@ -1 +1,2 @@
+from .ball_interpolator import BallInterpolator
 from .tracker import Tracker
@@ -0,0 +1,98 @@
+from collections import deque
+
+import numpy as np
+
+
+class BallInterpolator:
+    """
+    Online interpolation of the ball track with a bounded lookahead.
+
+    Detections whose centre jumped more than `max_jump` pixels per frame since the
+    last accepted detection are rejected as outliers. A gap of at most `max_gap`
+    frames between two accepted detections is filled linearly. Frames are emitted
+    in order once they can no longer change, at most `lookahead` frames after they
+    arrive, so gaps longer than the lookahead are left empty, as are the frames
+    before the first and after the last detection.
+    """
+
+    def __init__(self, lookahead=24, max_gap=24, max_jump=100.0) -> None:
+        """
+        Args:
+            lookahead: Maximum number of frames held back waiting for the end of a
+                gap, i.e. the latency added to a streaming pipeline.
+            max_gap: Longest run of missing frames that is filled.
+            max_jump: Maximum movement of the ball centre per frame, in pixels.
+                Once `max_gap` frames passed without an accepted detection, the
+                next detection is accepted whatever its position.
+        """
+        self.lookahead = lookahead
+        self.max_gap = min(max_gap, lookahead)
+        self.max_jump = max_jump
+
+    def is_outlier(self, bbox, frame_num, last_frame_num, last_bbox):
+        if last_bbox is None or frame_num - last_frame_num > self.max_gap + 1:
+            return False
+        center = (bbox[:2] + bbox[2:]) / 2
+        last_center = (last_bbox[:2] + last_bbox[2:]) / 2
+        jump = np.hypot(*(center - last_center))
+        return jump > self.max_jump * (frame_num - last_frame_num)
+
+    def interpolate_stream(self, items):
+        """
+        Consumes `(payload, bbox)` pairs, `bbox` being the xyxy ball box or None,
+        and yields `(payload, bbox, interpolated)` in the same order, where `bbox`
+        is a NumPy array or None.
+        """
+        # [frame_num, payload, bbox, interpolated] of the frames not emitted yet
+        pending = deque()
+        last_frame_num, last_bbox = None, None
+
+        for frame_num, (payload, bbox) in enumerate(items):
+            if bbox is not None and len(bbox):
+                bbox = np.asarray(bbox, dtype=np.float64)
+                if self.is_outlier(bbox, frame_num, last_frame_num, last_bbox):
+                    bbox = None
+            else:
+                bbox = None
+
+            if bbox is not None:
+                gap = 0 if last_frame_num is None else frame_num - last_frame_num - 1
+                if 0 < gap <= self.max_gap:
+                    # The frames of the gap are the last ones pending
+                    steps = np.arange(1, gap + 1)[:, None] / (gap + 1)
+                    filled = last_bbox + steps * (bbox - last_bbox)
+                    for entry, filled_bbox in zip(list(pending)[-gap:], filled):
+                        entry[2] = filled_bbox
+                        entry[3] = True
+                last_frame_num, last_bbox = frame_num, bbox
+
+            pending.append([frame_num, payload, bbox, False])
+
+            # A missing frame is final once no gap it belongs to can still be filled
+            while pending and (
+                pending[0][2] is not None
+                or frame_num - pending[0][0] >= self.lookahead
+                or last_frame_num is None
+                or pending[0][0] - last_frame_num > self.max_gap
+            ):
+                _, payload, bbox, interpolated = pending.popleft()
+                yield payload, bbox, interpolated
+
+        for _, payload, bbox, interpolated in pending:
+            yield payload, bbox, interpolated
+
+    def interpolate(self, ball_bboxes):
+        """
+        Batch `interpolate_stream` of a list of boxes (None when missing). Returns
+        the `(n_frames, 4)` boxes, NaN when missing, and the interpolated flags.
+        """
+        n_frames = len(ball_bboxes)
+        bboxes = np.full((n_frames, 4), np.nan)
+        interpolated = np.zeros(n_frames, dtype=bool)
+        for frame_num, bbox, is_interpolated in self.interpolate_stream(
+            enumerate(ball_bboxes)
+        ):
+            if bbox is not None:
+                bboxes[frame_num] = bbox
+            interpolated[frame_num] = is_interpolated
+        return bboxes, interpolated
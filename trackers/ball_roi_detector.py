@@ -0,0 +1,135 @@
+import numpy as np
+
+
+class BallRoiDetector:
+    """
+    High resolution ball detection on a small region of the frame.
+
+    The full frame is detected at the model's (low) input resolution, where the
+    ball is only a few pixels wide. This detector crops a `roi_size` square around
+    the expected ball position and runs the model on it at `roi_size`, i.e. at the
+    native resolution of the video. The expected position is the ball found by the
+    full-frame pass, or else the last ball position moved by its last velocity.
+    A ball of the full-frame pass that the crop does not confirm is kept.
+    After `max_missed` frames without a ball, the whole frame is searched in
+    overlapping tiles, once every `search_every` frames.
+    """
+
+    def __init__(
+        self,
+        model,
+        conf,
+        roi_size=640,
+        max_missed=12,
+        search_every=6,
+        tile_overlap=64,
+    ) -> None:
+        """
+        Args:
+            model: A YOLO model, not shared with other threads.
+            conf: Confidence threshold of the detections.
+            roi_size: Side of the square crops, in pixels of the frame.
+            max_missed: Frames without a ball after which its motion is no longer
+                extrapolated and the frame is searched in tiles instead.
+            search_every: Frames between two tiled searches while the ball is lost.
+            tile_overlap: Overlap of neighbouring tiles, larger than the ball.
+        """
+        self.model = model
+        self.conf = conf
+        self.roi_size = roi_size
+        self.max_missed = max_missed
+        self.search_every = search_every
+        self.tile_overlap = tile_overlap
+
+        self.last_center = None
+        self.velocity = np.zeros(2)
+        self.missed = 0
+        self.frames_since_search = search_every
+
+        # Number of crops the model ran on, for reports
+        self.crop_count = 0
+
+    def get_expected_center(self, ball_boxes):
+        if len(ball_boxes):
+            x1, y1, x2, y2 = ball_boxes[0]
+            return np.array([(x1 + x2) / 2, (y1 + y2) / 2])
+        if self.last_center is not None and self.missed <= self.max_missed:
+            return self.last_center + self.velocity * (self.missed + 1)
+        return None
+
+    def get_crop_origin(self, center, frame_shape):
+        height, width = frame_shape[:2]
+        x = int(
+            np.clip(center[0] - self.roi_size / 2, 0, max(width - self.roi_size, 0))
+        )
+        y = int(
+            np.clip(center[1] - self.roi_size / 2, 0, max(height - self.roi_size, 0))
+        )
+        return x, y
+
+    def get_tile_origins(self, frame_shape):
+        height, width = frame_shape[:2]
+        step = self.roi_size - self.tile_overlap
+
+        def starts(length):
+            last = max(length - self.roi_size, 0)
+            return sorted({*range(0, last, step), last})
+
+        return [(x, y) for y in starts(height) for x in starts(width)]
+
+    def detect(self, frame, ball_boxes=()):
+        """
+        Returns the xyxy box of the ball in `frame`, or None.
+
+        `ball_boxes` are the ball boxes of the full-frame pass, most confident
+        first.
+        """
+        center = self.get_expected_center(ball_boxes)
+        origins = []
+        if center is not None:
+            origins = [self.get_crop_origin(center, frame.shape)]
+        elif self.frames_since_search >= self.search_every:
+            origins = self.get_tile_origins(frame.shape)
+            self.frames_since_search = 0
+        self.frames_since_search += 1
+
+        bbox = self.detect_crops(frame, origins) if origins else None
+        if bbox is None and len(ball_boxes):
+            bbox = list(ball_boxes[0])
+        self.update(bbox)
+        return bbox
+
+    def detect_crops(self, frame, origins):
+        crops = [
+            frame[y : y + self.roi_size, x : x + self.roi_size] for x, y in origins
+        ]
+        results = self.model.predict(
+            crops, conf=self.conf, imgsz=self.roi_size, verbose=False
+        )
+        self.crop_count += len(crops)
+
+        best_bbox = None
+        best_conf = 0.0
+        for (x, y), result in zip(origins, results):
+            ball_class = {name: cls for cls, name in result.names.items()}["ball"]
+            boxes = result.boxes
+            for bbox, cls, conf in zip(
+                boxes.xyxy.tolist(), boxes.cls.tolist(), boxes.conf.tolist()
+            ):
+                if int(cls) == ball_class and conf > best_conf:
+                    best_conf = conf
+                    best_bbox = [bbox[0] + x, bbox[1] + y, bbox[2] + x, bbox[3] + y]
+        return best_bbox
+
+    def update(self, bbox):
+        if bbox is None:
+            self.missed += 1
+            return
+
+        center = np.array([(bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2])
+        if self.last_center is not None and self.missed <= self.max_missed:
+            self.velocity = (center - self.last_center) / (self.missed + 1)
+        else:
+            self.velocity = np.zeros(2)
+        self.last_center = center
+        self.missed = 0
@@ -0,0 +1,117 @@
+import cv2
+import numpy as np
+
+
+class BboxPropagator:
+    """
+    Moves detection boxes from one frame to the next with sparse optical flow, so
+    the detector only has to run on some of the frames.
+
+    A grid of points inside each box is tracked with pyramidal Lucas-Kanade and
+    the box is shifted by the median displacement of its points. Boxes with too
+    few tracked points are dropped as lost. After each `propagate`, `lost_fraction`
+    and `motion` (the median displacement of all points in pixels, dominated by
+    the camera movement) tell whether the detector should run again.
+    """
+
+    def __init__(
+        self,
+        downscale=0.5,
+        grid_size=4,
+        min_points=4,
+        max_lost_fraction=0.2,
+        max_motion=12.0,
+    ) -> None:
+        """
+        Args:
+            downscale: Factor applied to the grey frames before tracking points.
+            grid_size: The points of a box are a `grid_size` x `grid_size` grid over
+                its central half, away from the background at its edges.
+            min_points: Minimum number of tracked points for a box to be kept.
+            max_lost_fraction: Share of lost boxes above which `needs_detection`.
+            max_motion: Median movement per frame, in pixels of the original frame,
+                above which `needs_detection`.
+        """
+        self.downscale = downscale
+        self.grid_size = grid_size
+        self.min_points = min_points
+        self.max_lost_fraction = max_lost_fraction
+        self.max_motion = max_motion
+
+        self.lk_params = dict(
+            winSize=(15, 15),
+            maxLevel=2,
+            criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03),
+        )
+
+        # Grid of relative positions inside a box, shape (grid_size ** 2, 2)
+        steps = (np.arange(grid_size) + 0.5) / grid_size * 0.5 + 0.25
+        self.grid = np.stack(np.meshgrid(steps, steps), axis=-1).reshape(-1, 2)
+
+        self.lost_fraction = 0.0
+        self.motion = 0.0
+
+    def to_grey(self, frame):
+        frame_grey = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self.downscale != 1.0:
+            frame_grey = cv2.resize(
+                frame_grey,
+                None,
+                fx=self.downscale,
+                fy=self.downscale,
+                interpolation=cv2.INTER_AREA,
+            )
+        return frame_grey
+
+    def propagate_boxes(self, old_grey, frame_grey, boxes):
+        """
+        Returns the `(N, 4)` xyxy `boxes` moved to the new frame and a mask of the
+        boxes that could be tracked.
+        """
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        if len(boxes) == 0:
+            self.lost_fraction = 0.0
+            self.motion = 0.0
+            return boxes, np.zeros(0, dtype=bool)
+
+        # (N, P, 2) points in the downscaled frame
+        top_left = boxes[:, None, :2]
+        size = boxes[:, None, 2:] - top_left
+        points = (top_left + self.grid[None] * size) * self.downscale
+        old_points = points.reshape(-1, 1, 2).astype(np.float32)
+
+        new_points, status, _ = cv2.calcOpticalFlowPyrLK(
+            old_grey, frame_grey, old_points, None, **self.lk_params
+        )
+        displacement = (new_points - old_points).reshape(len(boxes), -1, 2)
+        found = status.reshape(len(boxes), -1) == 1
+        displacement[~found] = np.nan
+
+        tracked = found.sum(axis=1) >= self.min_points
+        shift = np.zeros((len(boxes), 2), dtype=np.float32)
+        if tracked.any():
+            shift[tracked] = (
+                np.nanmedian(displacement[tracked], axis=1) / self.downscale
+            )
+
+        self.lost_fraction = 1.0 - tracked.mean()
+        self.motion = (
+            float(np.hypot(*np.nanmedian(displacement[found], axis=0))) / self.downscale
+            if found.any()
+            else 0.0
+        )
+        return boxes + np.tile(shift, 2), tracked
+
+    def propagate(self, old_grey, frame_grey, detections):
+        """
+        Propagate `sv.Detections` to the new frame, dropping the lost boxes.
+        """
+        boxes, tracked = self.propagate_boxes(old_grey, frame_grey, detections.xyxy)
+        propagated = detections[tracked]
+        propagated.xyxy = boxes[tracked]
+        return propagated
+
+    def needs_detection(self):
+        return (
+            self.lost_fraction > self.max_lost_fraction or self.motion > self.max_motion
+        )
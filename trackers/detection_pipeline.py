@@ -0,0 +1,172 @@
+import queue
+import threading
+
+
+class DetectionPipeline:
+    """
+    Producer/consumer pipeline overlapping frame decoding, inference and tracking.
+
+    A decoder thread pulls frames from the input iterable (which may be a lazy video
+    reader, so decoding happens on that thread) into a bounded queue. Inference
+    workers take adaptive batches from it: each batch starts with one frame and then
+    takes whatever else is already queued, up to `batch_size`, waiting at most
+    `batch_timeout` seconds for more. Results are re-ordered by frame number and
+    yielded in order, so the caller can run ByteTrack updates on the main thread
+    while the next batches are being decoded and predicted.
+
+    A frame takes one of `queue_depth` slots before it is decoded and frees it once
+    it is yielded, so at most `queue_depth` frames are held between the queues, the
+    workers and the re-ordering buffer, however slow the caller is.
+    """
+
+    _END = object()
+
+    def __init__(
+        self,
+        predictors,
+        batch_size=20,
+        queue_depth=64,
+        batch_timeout=0.01,
+    ) -> None:
+        """
+        Args:
+            predictors: One callable per inference worker, mapping a list of frames
+                to a list of detections. Each worker gets its own predictor because
+                model objects are not safe to share between threads.
+            batch_size: Maximum number of frames per inference batch.
+            queue_depth: Maximum number of decoded frames held by the pipeline, from
+                decoding until they are yielded.
+            batch_timeout: Seconds to wait for more frames before running a batch
+                that is smaller than `batch_size`.
+        """
+        self.predictors = predictors
+        self.batch_size = batch_size
+        self.queue_depth = queue_depth
+        self.batch_timeout = batch_timeout
+
+    def run(self, frames):
+        """
+        Yields `(frame, detection)` pairs in the order of `frames`.
+        """
+        frame_queue = queue.Queue(maxsize=self.queue_depth)
+        result_queue = queue.Queue(maxsize=self.queue_depth)
+        # Bounds the frames decoded and not yielded yet, in whichever queue or buffer
+        self.frame_slots = threading.Semaphore(self.queue_depth)
+        # Exposed for monitoring the queue depths
+        self.frame_queue = frame_queue
+        self.result_queue = result_queue
+        stop = threading.Event()
+
+        threads = [
+            threading.Thread(
+                target=self._decode,
+                args=(frames, frame_queue, result_queue, stop),
+                daemon=True,
+            )
+        ]
+        threads += [
+            threading.Thread(
+                target=self._infer,
+                args=(predictor, frame_queue, result_queue, stop),
+                daemon=True,
+            )
+            for predictor in self.predictors
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            yield from self._in_order(result_queue)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def _in_order(self, result_queue):
+        pending = {}
+        next_frame_num = 0
+        finished_workers = 0
+        while finished_workers < len(self.predictors):
+            result = result_queue.get()
+            if result is self._END:
+                finished_workers += 1
+                continue
+            if isinstance(result, BaseException):
+                raise result
+
+            for frame_num, frame, detection in result:
+                pending[frame_num] = (frame, detection)
+
+            while next_frame_num in pending:
+                frame_and_detection = pending.pop(next_frame_num)
+                self.frame_slots.release()
+                yield frame_and_detection
+                next_frame_num += 1
+
+    def _put(self, target_queue, item, stop):
+        # Bounded put that gives up once the consumer has stopped
+        while not stop.is_set():
+            try:
+                target_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _acquire_frame_slot(self, stop):
+        while not stop.is_set():
+            if self.frame_slots.acquire(timeout=0.1):
+                return True
+        return False
+
+    def _decode(self, frames, frame_queue, result_queue, stop):
+        try:
+            frames = iter(frames)
+            frame_num = 0
+            # Take a slot before pulling the next frame out of `frames`
+            while self._acquire_frame_slot(stop):
+                frame = next(frames, self._END)
+                if frame is self._END:
+                    return
+                if not self._put(frame_queue, (frame_num, frame), stop):
+                    return
+                frame_num += 1
+        except BaseException as e:
+            self._put(result_queue, e, stop)
+        finally:
+            for _ in self.predictors:
+                self._put(frame_queue, self._END, stop)
+
+    def _infer(self, predictor, frame_queue, result_queue, stop):
+        try:
+            finished = False
+            while not finished and not stop.is_set():
+                try:
+                    item = frame_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is self._END:
+                    break
+
+                batch = [item]
+                while len(batch) < self.batch_size:
+                    try:
+                        item = frame_queue.get(timeout=self.batch_timeout)
+                    except queue.Empty:
+                        break
+                    if item is self._END:
+                        finished = True
+                        break
+                    batch.append(item)
+
+                detections = predictor([frame for _, frame in batch])
+                result = [
+                    (frame_num, frame, detection)
+                    for (frame_num, frame), detection in zip(batch, detections)
+                ]
+                if not self._put(result_queue, result, stop):
+                    return
+        except BaseException as e:
+            self._put(result_queue, e, stop)
+        finally:
+            self._put(result_queue, self._END, stop)
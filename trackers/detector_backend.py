@@ -0,0 +1,126 @@
+import hashlib
+import os
+
+import numpy as np
+
+from .track_cache import TrackCache
+
+
+class DetectorBackend:
+    """
+    Loads the YOLO detector for an inference backend.
+
+    "ultralytics" runs the PyTorch weights. "onnx" (ONNX Runtime) and "openvino"
+    run a model exported from the weights once and cached in
+    `<weights dir>/<weights name>_exports/`, keyed by the hash of the weights, the
+    backend, the precision and, for int8, the calibration dataset, so later runs
+    load it directly. Exported models
+    are loaded through ultralytics too, so the detection results have the same
+    format for every backend.
+    """
+
+    # Export format, suffix by which ultralytics recognizes the exported model and
+    # supported precisions of each backend. ultralytics only exports ONNX in fp16
+    # on a GPU, so ONNX Runtime on the CPU runs fp32.
+    BACKENDS = {
+        "ultralytics": (None, None, ("fp32",)),
+        "onnx": ("onnx", ".onnx", ("fp32",)),
+        "openvino": ("openvino", "_openvino_model", ("fp32", "fp16", "int8")),
+    }
+
+    def __init__(
+        self, model_path, backend="ultralytics", precision="fp32", int8_data=None
+    ) -> None:
+        """
+        Args:
+            model_path: Path to the YOLO `.pt` weights.
+            backend: One of `BACKENDS`.
+            precision: "fp32", "fp16" or "int8", as supported by the backend.
+            int8_data: Dataset YAML used to calibrate int8 quantization, e.g. the
+                one the model was trained on.
+        """
+        if backend not in self.BACKENDS:
+            raise ValueError(
+                f"Unknown backend {backend!r}, use one of {tuple(self.BACKENDS)}"
+            )
+        export_format, export_suffix, precisions = self.BACKENDS[backend]
+        if precision not in precisions:
+            raise ValueError(
+                f"The {backend} backend supports {precisions}, not {precision!r}"
+            )
+        if precision == "int8" and int8_data is None:
+            raise ValueError("int8 quantization needs a calibration dataset")
+
+        self.model_path = model_path
+        self.backend = backend
+        self.export_format = export_format
+        self.export_suffix = export_suffix
+        self.precision = precision
+        self.int8_data = int8_data
+
+    @property
+    def int8_data_hash(self):
+        """
+        Hash of the int8 calibration dataset YAML, or of its name when ultralytics
+        resolves it itself (e.g. "coco8.yaml"). None without int8 quantization.
+        """
+        if self.precision != "int8":
+            return None
+        if os.path.isfile(self.int8_data):
+            return TrackCache.file_hash(self.int8_data)[:12]
+        return hashlib.sha256(self.int8_data.encode()).hexdigest()[:12]
+
+    @property
+    def export_path(self):
+        model_dir, model_name = os.path.split(self.model_path)
+        model_stem = os.path.splitext(model_name)[0]
+        weights_hash = TrackCache.file_hash(self.model_path)[:12]
+        precision = self.precision
+        if self.int8_data_hash is not None:
+            precision += f"-{self.int8_data_hash}"
+        name = f"{weights_hash}_{precision}{self.export_suffix}"
+        return os.path.join(model_dir, f"{model_stem}_exports", name)
+
+    def get_detector_path(self):
+        """
+        Path of the model to load for the backend, exporting it on first use.
+        """
+        if self.export_format is None:
+            return self.model_path
+
+        export_path = self.export_path
+        if not os.path.exists(export_path):
+            self.export(export_path)
+        return export_path
+
+    def export(self, export_path):
+        from ultralytics import YOLO
+
+        # Exported with dynamic input shapes, so the full frame and the ball crops
+        # can be predicted at different sizes
+        exported_path = YOLO(self.model_path).export(
+            format=self.export_format,
+            dynamic=True,
+            half=self.precision == "fp16",
+            int8=self.precision == "int8",
+            data=self.int8_data,
+        )
+
+        # ultralytics exports next to the weights under a fixed name, move it
+        # into the cache in one step so a crash never leaves a partial export
+        os.makedirs(os.path.dirname(export_path), exist_ok=True)
+        os.replace(exported_path, export_path)
+
+    def load(self):
+        from ultralytics import YOLO
+
+        return YOLO(self.get_detector_path(), task="detect")
+
+    @staticmethod
+    def warm_up(model, imgsz=640, batch_size=1, **predict_options):
+        """
+        Run `model` once on blank frames, so the first real batch does not pay for
+        lazy initialization (graph compilation, memory allocation).
+        """
+        frames = [np.zeros((imgsz, imgsz, 3), dtype=np.uint8)] * batch_size
+        model.predict(frames, imgsz=imgsz, verbose=False, **predict_options)
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+import pickle
+
+import numpy as np
+
+from track_store import OBJECT_CLASSES, TrackStore
+
+
+class TrackCache:
+    """
+    Incremental, content-keyed cache of tracker output.
+
+    The cache lives in `cache_dir/<key>/`, where the key is derived from the hashes
+    of the video file and model weights, the confidence threshold and the other
+    tracker settings, so a changed video, model or setting never returns stale
+    tracks. Tracks are appended one
+    chunk of frames at a time as `.npz` files of columnar arrays, next to a small
+    JSON manifest that is only updated once a chunk is fully written. Every write
+    goes to a temporary file first and is moved into place atomically, so an
+    interrupted run leaves a valid cache that can be resumed from the last chunk.
+    """
+
+    MANIFEST_NAME = "manifest.json"
+    HASH_BLOCK_SIZE = 1 << 20
+
+    def __init__(self, cache_dir, video_path, model_path, conf, settings=None) -> None:
+        """
+        `settings` is a dict of any other tracker options that change the tracks,
+        such as the detection interval.
+        """
+        self.video_hash = self.file_hash(video_path)
+        self.model_hash = self.file_hash(model_path)
+        self.conf = conf
+        self.settings = settings or {}
+
+        key_source = f"{self.video_hash}:{self.model_hash}:{conf}"
+        if self.settings:
+            key_source += ":" + json.dumps(self.settings, sort_keys=True)
+        key = hashlib.sha256(key_source.encode()).hexdigest()[:32]
+        self.path = os.path.join(cache_dir, key)
+        os.makedirs(self.path, exist_ok=True)
+
+        self.manifest = self.read_manifest()
+
+    @classmethod
+    def file_hash(cls, path):
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(cls.HASH_BLOCK_SIZE), b""):
+                sha.update(block)
+        return sha.hexdigest()
+
+    def read_manifest(self):
+        manifest_path = os.path.join(self.path, self.MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r") as f:
+                return json.load(f)
+
+        return {
+            "video_hash": self.video_hash,
+            "model_hash": self.model_hash,
+            "conf": self.conf,
+            "settings": self.settings,
+            "chunks": [],  # [frame_start, frame_stop, file_name]
+            "tracker_state": None,
+        }
+
+    @property
+    def completed_frames(self):
+        """
+        Number of frames, from the start of the video, already in the cache.
+        """
+        chunks = self.manifest["chunks"]
+        return chunks[-1][1] if chunks else 0
+
+    def append_chunk(self, frame_start, frames_tracks, tracker_state=None):
+        """
+        Append the tracks of consecutive frames starting at `frame_start`.
+
+        `frames_tracks` is a list of per-frame dicts in the shape returned by
+        `Tracker.get_frame_tracks`. `tracker_state` (the ByteTrack object) is pickled
+        alongside so tracking can resume with the same IDs after an interruption.
+        """
+        if frame_start != self.completed_frames:
+            raise ValueError(
+                f"Chunk starts at frame {frame_start}, "
+                f"but the cache ends at frame {self.completed_frames}"
+            )
+
+        frame_stop = frame_start + len(frames_tracks)
+        frame, object_class, track_id, bbox = [], [], [], []
+        for frame_num, frame_tracks in enumerate(frames_tracks, start=frame_start):
+            for class_index, objects in enumerate(OBJECT_CLASSES):
+                for object_id, track_info in frame_tracks[objects].items():
+                    frame.append(frame_num)
+                    object_class.append(class_index)
+                    track_id.append(int(object_id))
+                    bbox.append(track_info["bbox"])
+
+        chunk_name = f"chunk_{frame_start:08d}_{frame_stop:08d}.npz"
+        self.write_atomic(
+            chunk_name,
+            lambda f: np.savez(
+                f,
+                frame=np.array(frame, dtype=np.int32),
+                object_class=np.array(object_class, dtype=np.int8),
+                track_id=np.array(track_id, dtype=np.int32),
+                bbox=np.array(bbox, dtype=np.float32).reshape(-1, 4),
+            ),
+        )
+
+        previous_state = self.manifest["tracker_state"]
+        if tracker_state is not None:
+            state_name = f"tracker_state_{frame_stop:08d}.pkl"
+            self.write_atomic(state_name, lambda f: pickle.dump(tracker_state, f))
+            self.manifest["tracker_state"] = state_name
+
+        # The manifest is the commit point of the chunk
+        self.manifest["chunks"].append([frame_start, frame_stop, chunk_name])
+        self.write_atomic(
+            self.MANIFEST_NAME,
+            lambda f: f.write(json.dumps(self.manifest).encode()),
+        )
+
+        if tracker_state is not None and previous_state is not None:
+            os.remove(os.path.join(self.path, previous_state))
+
+    def load_tracker_state(self):
+        state_name = self.manifest["tracker_state"]
+        if state_name is None:
+            return None
+
+        with open(os.path.join(self.path, state_name), "rb") as f:
+            return pickle.load(f)
+
+    def load(self, frame_start=0, frame_stop=None):
+        """
+        Load the cached tracks of frames `frame_start` to `frame_stop` (exclusive)
+        as a `TrackStore`. Only the chunks overlapping the range are read, and frame
+        numbers stay absolute so the store's frame index covers `[0, frame_stop)`.
+        """
+        if frame_stop is None:
+            frame_stop = self.completed_frames
+        frame_stop = min(frame_stop, self.completed_frames)
+
+        columns = {"frame": [], "object_class": [], "track_id": [], "bbox": []}
+        for chunk_start, chunk_stop, chunk_name in self.manifest["chunks"]:
+            if chunk_stop <= frame_start or chunk_start >= frame_stop:
+                continue
+
+            with np.load(os.path.join(self.path, chunk_name)) as chunk:
+                in_range = (chunk["frame"] >= frame_start) & (
+                    chunk["frame"] < frame_stop
+                )
+                for name in columns:
+                    columns[name].append(chunk[name][in_range])
+
+        if not columns["frame"]:
+            return TrackStore([], [], [], np.empty((0, 4)), n_frames=frame_stop)
+
+        return TrackStore(
+            np.concatenate(columns["frame"]),
+            np.concatenate(columns["object_class"]),
+            np.concatenate(columns["track_id"]),
+            np.concatenate(columns["bbox"]),
+            n_frames=frame_stop,
+        )
+
+    def write_atomic(self, file_name, write):
+        final_path = os.path.join(self.path, file_name)
+        temp_path = final_path + ".tmp"
+        with open(temp_path, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, final_path)
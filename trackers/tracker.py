@@ -3,100 +3,432 @@ import pickle
 
 import cv2
 import numpy as np
-import pandas as pd
-import supervision as sv
-from ultralytics import YOLO
 
-from utils import get_bbox_width, get_center_of_bbox, get_foot_position
+from player_ball_assigner import PossessionCounter
+from track_store import OBJECT_CLASSES
+from utils import (
+    get_bbox_width,
+    get_center_of_bbox,
+    get_centers_of_bboxes,
+    get_foot_position,
+    get_foot_positions,
+)
+
+from .ball_interpolator import BallInterpolator
+from .ball_roi_detector import BallRoiDetector
+from .bbox_propagator import BboxPropagator
+from .detection_pipeline import DetectionPipeline
+from .detector_backend import DetectorBackend
+from .track_cache import TrackCache
 
 
 class Tracker:
-    def __init__(self, model_path):
-        self.model = YOLO(model_path)
-        self.tracker = sv.ByteTrack()
+    def __init__(
+        self,
+        model_path,
+        batch_size=20,
+        queue_depth=64,
+        num_workers=1,
+        num_threads=None,
+        detect_every=1,
+        imgsz=None,
+        ball_roi_size=None,
+        backend="ultralytics",
+        precision="fp32",
+        int8_data=None,
+        warm_up=True,
+    ):
+        """
+        Args:
+            model_path: Path to the YOLO weights.
+            batch_size: Maximum number of frames per inference batch.
+            queue_depth: Maximum number of decoded frames held by the detection
+                pipeline.
+            num_workers: Number of inference worker threads, each with its own model.
+            num_threads: Number of CPU threads used by the inference backend, or None
+                to keep its default.
+            detect_every: Run the detector on every `detect_every`-th frame only and
+                move the boxes with optical flow in between (see `BboxPropagator`).
+                The detector also runs early when the camera moves fast or tracks
+                are lost.
+            imgsz: Input size of the full-frame detector, or None for the model's
+                default. A low size is cheap and enough for players.
+            ball_roi_size: When set, the ball is detected again at high resolution
+                on a crop of this size around its expected position (see
+                `BallRoiDetector`).
+            backend: Inference backend, "ultralytics", "onnx" or "openvino", see
+                `DetectorBackend`.
+            precision: "fp32", or "fp16" or "int8" with the openvino backend.
+            int8_data: Dataset YAML to calibrate int8 quantization with.
+            warm_up: Run every model once on blank frames when it is loaded, so the
+                latency of the first batch is predictable.
+        """
+        self.model_path = model_path
+        self.conf = 0.1
+        self.imgsz = imgsz
+        self.batch_size = batch_size
+        self.queue_depth = queue_depth
+        self.num_workers = num_workers
+        self.num_threads = num_threads
+
+        self.warm_up = warm_up
+        self.detector_backend = DetectorBackend(
+            model_path, backend, precision, int8_data
+        )
+        # ultralytics, supervision and the models are only loaded by
+        # `load_models`, before the first detection, so tracks read from a stub or
+        # the cache need neither
+        self.detector_path = None
+        self.model = None
+        self.worker_models = []
+        self.detection_pipeline = None
+        self.tracker = None
+
+        # Number of frames per chunk appended to the track cache
+        self.cache_chunk_size = 200
+
+        self.detect_every = detect_every
+        self.bbox_propagator = BboxPropagator()
+        # Frames the detector ran on in the last `get_object_tracks_stream`
+        self.detected_frames = []
+
+        self.ball_roi_size = ball_roi_size
+        self.ball_detector = None
+
+    def load_models(self):
+        """
+        Load the detector (exporting it for the backend on first use), the ball
+        detector and ByteTrack, unless already loaded.
+        """
+        if self.tracker is None:
+            import supervision as sv
+
+            self.tracker = sv.ByteTrack()
+        if self.model is not None:
+            return
+
+        self.detector_path = self.detector_backend.get_detector_path()
+        self.model = self.load_model()
+        self.worker_models = [self.model]
+        if self.ball_roi_size is not None:
+            # Own model instance, the detection workers may be predicting
+            self.ball_detector = BallRoiDetector(
+                self.load_model(self.ball_roi_size, batch_size=1),
+                self.conf,
+                self.ball_roi_size,
+            )
+
+    def load_model(self, imgsz=None, batch_size=None):
+        """
+        Load a new instance of the detector, warmed up on a batch of `batch_size`
+        frames at `imgsz` (by default those of the full-frame detector).
+        """
+        from ultralytics import YOLO
+
+        model = YOLO(self.detector_path, task="detect")
+        if self.warm_up:
+            DetectorBackend.warm_up(
+                model,
+                imgsz or self.imgsz or 640,
+                batch_size or self.batch_size,
+                conf=self.conf,
+            )
+        return model
 
     def add_position_to_tracks(self, tracks):
-        for objects, object_track in tracks.items():
-            for frame_num, track in enumerate(object_track):
-                for track_id, track_info in track.items():
-                    bbox = track_info["bbox"]
-                    if objects == "ball":
-                        position = get_center_of_bbox(bbox)
-                    else:
-                        position = get_foot_position(bbox)
+        for frame_num in range(len(tracks["players"])):
+            self.add_position_to_frame_tracks(
+                {objects: tracks[objects][frame_num] for objects in tracks}
+            )
 
-                    tracks[objects][frame_num][track_id]["position"] = position
+    def add_position_to_frame_tracks(self, frame_tracks):
+        for objects, track in frame_tracks.items():
+            for track_id, track_info in track.items():
+                bbox = track_info["bbox"]
+                if objects == "ball":
+                    position = get_center_of_bbox(bbox)
+                else:
+                    position = get_foot_position(bbox)
+
+                track[track_id]["position"] = position
+
+    def add_position_to_store(self, store):
+        """
+        Vectorized `add_position_to_tracks` for a `TrackStore`.
+        """
+        is_ball = store.object_class == OBJECT_CLASSES.index("ball")
+        positions = get_foot_positions(store.bbox)
+        positions[is_ball] = get_centers_of_bboxes(store.bbox[is_ball])
+        store.set("position", positions)
 
     def detect_frames(self, frames):
-        batch_size = 20
-        detections = []
-        for i in range(0, len(frames), batch_size):
-            batch_detections = self.model.predict(frames[i : i + batch_size], conf=0.1)
-            detections += batch_detections
-
-        return detections  # List[dict] {'boxes': [[],[],[]], 'conf': [], 'cls_names': [0,0,0,2,2,1,1,1,1]}
-
-    def get_object_tracks(self, frames, read_from_stub=False, stub_path=None):
-
-        if read_from_stub and stub_path is not None and os.path.exists(stub_path):
+        return [
+            detection for _, detection in self.detect_frames_stream(frames)
+        ]  # List[dict] {'boxes': [[],[],[]], 'conf': [], 'cls_names': [0,0,0,2,2,1,1,1,1]}
+
+    def detect_frames_stream(self, frames):
+        """
+        Same as `detect_frames`, but consumes any iterable of frames and yields
+        `(frame, detection)` pairs in order.
+
+        Frames are pulled from `frames` on a decoder thread and predicted in adaptive
+        batches by `num_workers` inference threads (see `DetectionPipeline`), so at
+        most `queue_depth` frames wait in memory and decoding, inference and the
+        caller's tracker updates overlap.
+        """
+        self.load_models()
+        if self.num_threads is not None:
+            import torch
+
+            torch.set_num_threads(self.num_threads)
+
+        while len(self.worker_models) < self.num_workers:
+            self.worker_models.append(self.load_model())
+
+        self.detection_pipeline = DetectionPipeline(
+            [
+                lambda batch, model=model: self.predict(model, batch)
+                for model in self.worker_models[: self.num_workers]
+            ],
+            batch_size=self.batch_size,
+            queue_depth=self.queue_depth,
+        )
+        yield from self.detection_pipeline.run(frames)
+
+    def predict(self, model, frames):
+        if self.imgsz is None:
+            return model.predict(frames, conf=self.conf)
+        return model.predict(frames, conf=self.conf, imgsz=self.imgsz)
+
+    def add_roi_ball_to_frame_tracks(self, frame, frame_tracks):
+        """
+        Replace the ball of `frame_tracks` by the one of the `BallRoiDetector`.
+        """
+        ball_boxes = [ball["bbox"] for ball in frame_tracks["ball"].values()]
+        bbox = self.ball_detector.detect(frame, ball_boxes)
+        frame_tracks["ball"] = {} if bbox is None else {1: {"bbox": bbox}}
+
+    def get_settings(self):
+        """
+        The options that change the tracks compared to the defaults, which key the
+        track cache.
+        """
+        settings = {}
+        if self.detect_every != 1:
+            settings["detect_every"] = self.detect_every
+        if self.imgsz is not None:
+            settings["imgsz"] = self.imgsz
+        if self.ball_roi_size is not None:
+            settings["ball_roi_size"] = self.ball_roi_size
+        if self.detector_backend.backend != "ultralytics":
+            settings["backend"] = self.detector_backend.backend
+        if self.detector_backend.precision != "fp32":
+            settings["precision"] = self.detector_backend.precision
+        if self.detector_backend.int8_data_hash is not None:
+            settings["int8_data"] = self.detector_backend.int8_data_hash
+        return settings
+
+    def get_object_tracks(
+        self,
+        frames,
+        read_from_stub=False,
+        stub_path=None,
+        cache_dir=None,
+        video_path=None,
+    ):
+        """
+        Detect and track players, referees and the ball in `frames`.
+
+        With `cache_dir` and `video_path`, tracks are read from and appended to a
+        `TrackCache` keyed by the video, model weights and confidence threshold, and
+        an interrupted run resumes from the last cached chunk. Otherwise the legacy
+        pickle stub at `stub_path`, which is not keyed by anything, is read when
+        `read_from_stub` is set.
+        """
+        use_cache = cache_dir is not None and video_path is not None
+
+        if (
+            read_from_stub
+            and not use_cache
+            and stub_path is not None
+            and os.path.exists(stub_path)
+        ):
             with open(stub_path, "rb") as f:
                 tracks = pickle.load(f)
                 return tracks
 
-        detections = self.detect_frames(frames)
-
-        tracks = {
-            "players": [],
-            "referees": [],
-            "ball": [],
-        }
-
-        for frame_num, detection in enumerate(detections):
-            cls_name = detection.names  # {0: 'person', 1: 'car', ....}
-            cls_name_inv = {
-                v: k for k, v in cls_name.items()
-            }  # {'person': 0, 'car': 1, ....}
+        if use_cache:
+            tracks = self.get_cached_object_tracks(frames, cache_dir, video_path)
+        else:
+            tracks = {
+                "players": [],
+                "referees": [],
+                "ball": [],
+            }
+
+            # Tracker updates run while the next batches are decoded and predicted
+            for _, frame_tracks in self.get_object_tracks_stream(frames):
+                for objects, track in frame_tracks.items():
+                    tracks[objects].append(track)
+
+        if stub_path is not None:
+            # Write the stub once, atomically, so a crash never leaves it half written
+            with open(stub_path + ".tmp", "wb") as f:
+                pickle.dump(tracks, f)
+            os.replace(stub_path + ".tmp", stub_path)
 
-            # Convert the detections from ultralytics to Supervision format
-            supervision_detections = sv.Detections.from_ultralytics(detection)
-
-            # Convert Goalkeeper to player object
-            for object_ind, class_id in enumerate(supervision_detections.class_id):
-                if cls_name[class_id] == "goalkeeper":
-                    supervision_detections.class_id[object_ind] = cls_name_inv["player"]
+        return tracks
 
-            # Tracker objects
-            detection_with_tracker = self.tracker.update_with_detections(
-                supervision_detections
-            )
+    def get_cached_object_tracks(self, frames, cache_dir, video_path):
+        cache = TrackCache(
+            cache_dir, video_path, self.model_path, self.conf, self.get_settings()
+        )
 
-            tracks["players"].append({})
-            tracks["referees"].append({})
-            tracks["ball"].append({})
+        # Resume tracking with the ByteTrack state saved with the last chunk
+        frame_start = cache.completed_frames
+        if 0 < frame_start < len(frames):
+            self.tracker = cache.load_tracker_state()
+
+        for chunk_start in range(frame_start, len(frames), self.cache_chunk_size):
+            chunk_frames = frames[chunk_start : chunk_start + self.cache_chunk_size]
+            frames_tracks = [
+                frame_tracks
+                for _, frame_tracks in self.get_object_tracks_stream(chunk_frames)
+            ]
+            cache.append_chunk(chunk_start, frames_tracks, self.tracker)
+
+        return cache.load(0, len(frames)).to_tracks()
+
+    def get_object_tracks_stream(self, frames):
+        """
+        Streaming counterpart of `get_object_tracks`.
+
+        Yields `(frame, frame_tracks)` for every frame, where `frame_tracks` has the
+        same shape as one frame of `get_object_tracks` output:
+        {"players": {track_id: {"bbox": [...]}}, "referees": {...}, "ball": {...}}.
+        Only the ByteTrack state is carried between frames.
+        """
+        if self.detect_every > 1:
+            yield from self.get_propagated_tracks_stream(frames)
+            return
+
+        self.detected_frames = []
+        for frame_num, (frame, detection) in enumerate(
+            self.detect_frames_stream(frames)
+        ):
+            self.detected_frames.append(frame_num)
+            frame_tracks = self.get_frame_tracks(detection)
+            if self.ball_detector is not None:
+                self.add_roi_ball_to_frame_tracks(frame, frame_tracks)
+            yield frame, frame_tracks
+
+    def get_propagated_tracks_stream(self, frames):
+        """
+        `get_object_tracks_stream` running the detector on keyframes only.
+
+        The detections of a keyframe are moved to the following frames by the
+        `BboxPropagator` and fed to ByteTrack like detections, so track IDs carry
+        over. The next keyframe is `detect_every` frames later, or the next frame
+        when the propagator reports fast camera movement or lost boxes.
+        """
+        self.load_models()
+        if self.num_threads is not None:
+            import torch
+
+            torch.set_num_threads(self.num_threads)
+
+        self.detected_frames = []
+        detections = None
+        old_grey = None
+        for frame_num, frame in enumerate(frames):
+            frame_grey = self.bbox_propagator.to_grey(frame)
+            if (
+                detections is None
+                or frame_num - self.detected_frames[-1] >= self.detect_every
+                or self.bbox_propagator.needs_detection()
+            ):
+                detection = self.predict(self.model, [frame])[0]
+                detections = self.get_supervision_detections(detection)
+                self.detected_frames.append(frame_num)
+                self.bbox_propagator.lost_fraction = 0.0
+                self.bbox_propagator.motion = 0.0
+            else:
+                detections = self.bbox_propagator.propagate(
+                    old_grey, frame_grey, detections
+                )
+
+            old_grey = frame_grey
+            frame_tracks = self.track_detections(detections)
+            if self.ball_detector is not None:
+                self.add_roi_ball_to_frame_tracks(frame, frame_tracks)
+            yield frame, frame_tracks
+
+    def get_frame_tracks(self, detection):
+        """
+        Run ByteTrack on a single ultralytics detection result and split the
+        tracked objects into players, referees and ball.
+        """
+        return self.track_detections(self.get_supervision_detections(detection))
+
+    def get_supervision_detections(self, detection):
+        """
+        Convert an ultralytics detection result to `sv.Detections`, with
+        goalkeepers counted as players.
+        """
+        cls_name = detection.names  # {0: 'person', 1: 'car', ....}
+        self.class_ids = {
+            v: k for k, v in cls_name.items()
+        }  # {'person': 0, 'car': 1, ....}
+
+        import supervision as sv
+
+        # Convert the detections from ultralytics to Supervision format
+        supervision_detections = sv.Detections.from_ultralytics(detection)
+
+        # Convert Goalkeeper to player object
+        for object_ind, class_id in enumerate(supervision_detections.class_id):
+            if cls_name[class_id] == "goalkeeper":
+                supervision_detections.class_id[object_ind] = self.class_ids["player"]
+
+        return supervision_detections
+
+    def track_detections(self, supervision_detections):
+        """
+        Run ByteTrack on `sv.Detections` and split the tracked objects into
+        players, referees and ball.
+        """
+        cls_name_inv = self.class_ids
+
+        # Tracker objects
+        detection_with_tracker = self.tracker.update_with_detections(
+            supervision_detections
+        )
 
-            for frame_detection in detection_with_tracker:
-                bbox = frame_detection[0].tolist()
-                cls_id = frame_detection[3]
-                track_id = frame_detection[4]
+        frame_tracks = {
+            "players": {},
+            "referees": {},
+            "ball": {},
+        }
 
-                if cls_id == cls_name_inv["player"]:
-                    tracks["players"][frame_num][track_id] = {"bbox": bbox}
+        for frame_detection in detection_with_tracker:
+            bbox = frame_detection[0].tolist()
+            cls_id = frame_detection[3]
+            track_id = frame_detection[4]
 
-                if cls_id == cls_name_inv["referee"]:
-                    tracks["referees"][frame_num][track_id] = {"bbox": bbox}
+            if cls_id == cls_name_inv["player"]:
+                frame_tracks["players"][track_id] = {"bbox": bbox}
 
-            for frame_detection in supervision_detections:
-                bbox = frame_detection[0].tolist()
-                cls_id = frame_detection[3]
+            if cls_id == cls_name_inv["referee"]:
+                frame_tracks["referees"][track_id] = {"bbox": bbox}
 
-                if cls_id == cls_name_inv["ball"]:
-                    tracks["ball"][frame_num][1] = {"bbox": bbox}
+        for frame_detection in supervision_detections:
+            bbox = frame_detection[0].tolist()
+            cls_id = frame_detection[3]
 
-            if stub_path is not None:
-                with open(stub_path, "wb") as f:
-                    pickle.dump(tracks, f)
+            if cls_id == cls_name_inv["ball"]:
+                frame_tracks["ball"][1] = {"bbox": bbox}
 
-        return tracks
+        return frame_tracks
 
     def draw_triangel(self, frame, bbox, color):
         y = int(bbox[1])
@@ -157,24 +489,19 @@ class Tracker:
 
         return frame
 
-    def draw_team_ball_control(self, frame, frame_num, team_ball_control):
+    def draw_team_ball_control(self, frame, possession):
+        """
+        Draw the ball control percentages of a `PossessionCounter`.
+        """
         overlay = frame.copy()
         cv2.rectangle(overlay, (1350, 850), (1900, 970), (255, 255, 255), -1)
         alpha = 0.4
         cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
 
-        team_ball_control_till_frame = team_ball_control[: frame_num + 1]
-
-        # Number of time each team have the ball
-        team_1_num_frames = team_ball_control_till_frame[
-            team_ball_control_till_frame == 1
-        ].shape[0]
-        team_2_num_frames = team_ball_control_till_frame[
-            team_ball_control_till_frame == 2
-        ].shape[0]
-
-        team_1 = team_1_num_frames / (team_1_num_frames + team_2_num_frames)
-        team_2 = team_2_num_frames / (team_1_num_frames + team_2_num_frames)
+        # Share of the frames each team had the ball so far
+        percentages = possession.percentages()
+        team_1 = percentages[1]
+        team_2 = percentages[2]
 
         cv2.putText(
             frame,
@@ -197,7 +524,7 @@ class Tracker:
 
         return frame
 
-    def draw_camera_movement(self, frame, frame_num, camera_movement):
+    def draw_camera_movement(self, frame, camera_movement):
 
         overlay = frame.copy()
         cv2.rectangle(overlay, (0, 0), (500, 100), (255, 255, 255), -1)
@@ -206,7 +533,7 @@ class Tracker:
 
         cv2.putText(
             frame,
-            f"Camara Movement X: {camera_movement[frame_num][0]:.2f}",
+            f"Camara Movement X: {camera_movement[0]:.2f}",
             (10, 30),
             cv2.FONT_HERSHEY_SIMPLEX,
             1,
@@ -215,7 +542,7 @@ class Tracker:
         )
         cv2.putText(
             frame,
-            f"Camara Movement Y: {camera_movement[frame_num][1]:.2f}",
+            f"Camara Movement Y: {camera_movement[1]:.2f}",
             (10, 60),
             cv2.FONT_HERSHEY_SIMPLEX,
             1,
@@ -228,45 +555,69 @@ class Tracker:
         self, video_frames, team_ball_control, tracks, camera_movement
     ):
         output_video_frames = []
+        possession = PossessionCounter()
 
         for frame_num, frame in enumerate(video_frames):
-            frame = frame.copy()
-
-            player_dict = tracks["players"][frame_num]
-            referee_dict = tracks["referees"][frame_num]
-            ball_dict = tracks["ball"][frame_num]
-
-            # Draw players
-            for track_id, player in player_dict.items():
-                color = player.get("color", (0, 0, 225))
-                frame = self.draw_ellipse(frame, player["bbox"], color, track_id)
-                if player.get("has_ball", False):
-                    self.draw_triangel(frame, player["bbox"], (0, 0, 255))
-            # Draw Referees
-            for _, referee in referee_dict.items():
-                frame = self.draw_ellipse(frame, referee["bbox"], (0, 255, 255))
-            # Draw ball
-            for _, ball in ball_dict.items():
-                frame = self.draw_triangel(frame, ball["bbox"], (0, 255, 0))  # b.g.r
-
-            # Draw team ball control
-            frame = self.draw_team_ball_control(frame, frame_num, team_ball_control)
-
-            # Draw camera movement
-            frame = self.draw_camera_movement(frame, frame_num, camera_movement)
-
+            frame_tracks = {objects: tracks[objects][frame_num] for objects in tracks}
+            possession.update(team_ball_control[frame_num])
+            frame = self.draw_frame_annotations(
+                frame.copy(),
+                frame_tracks,
+                possession,
+                camera_movement[frame_num],
+            )
             output_video_frames.append(frame)
         return output_video_frames
 
-    def interpolate_ball_positions(self, ball_positionss):
-        ball_positionss = [
-            frame.get(1, {}).get("bbox", []) for frame in ball_positionss
-        ]
-        df_ball_positions = pd.DataFrame(
-            ball_positionss, columns=["x1", "y1", "x2", "y2"]
-        )
+    def draw_frame_annotations(self, frame, frame_tracks, possession, camera_movement):
+        """
+        Draw all annotations for a single frame in place and return it.
+
+        `possession` is the `PossessionCounter` updated up to this frame and
+        `camera_movement` the `[x, y]` movement of this frame.
+        """
+        player_dict = frame_tracks["players"]
+        referee_dict = frame_tracks["referees"]
+        ball_dict = frame_tracks["ball"]
+
+        # Draw players
+        for track_id, player in player_dict.items():
+            color = player.get("color", (0, 0, 225))
+            frame = self.draw_ellipse(frame, player["bbox"], color, track_id)
+            if player.get("has_ball", False):
+                self.draw_triangel(frame, player["bbox"], (0, 0, 255))
+        # Draw Referees
+        for _, referee in referee_dict.items():
+            frame = self.draw_ellipse(frame, referee["bbox"], (0, 255, 255))
+        # Draw ball
+        for _, ball in ball_dict.items():
+            frame = self.draw_triangel(frame, ball["bbox"], (0, 255, 0))  # b.g.r
+
+        # Draw team ball control
+        frame = self.draw_team_ball_control(frame, possession)
+
+        # Draw camera movement
+        frame = self.draw_camera_movement(frame, camera_movement)
+
+        return frame
 
-        df_ball_positions = df_ball_positions.interpolate()
-        df_ball_positions = df_ball_positions.bfill()
+    @staticmethod
+    def interpolate_ball_positions(ball_positionss, ball_interpolator=None):
+        """
+        Fill the short gaps of the ball track, see `BallInterpolator`. Filled balls
+        are marked with `interpolated`; frames outside any fillable gap stay empty.
+        """
+        if ball_interpolator is None:
+            ball_interpolator = BallInterpolator()
+        bboxes, interpolated = ball_interpolator.interpolate(
+            [frame.get(1, {}).get("bbox") for frame in ball_positionss]
+        )
 
-        return [{1: {"bbox": x}} for x in df_ball_positions.to_numpy().tolist()]
+        return [
+            (
+                {}
+                if np.isnan(bbox).any()
+                else {1: {"bbox": bbox.tolist(), "interpolated": bool(is_interpolated)}}
+            )
+            for bbox, is_interpolated in zip(bboxes, interpolated)
+        ]
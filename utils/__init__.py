@@ -1,8 +1,12 @@
 from .bbox_utils import (
     get_bbox_width,
     get_center_of_bbox,
+    get_centers_of_bboxes,
     get_foot_position,
+    get_foot_positions,
     measure_distance,
     measure_xy_distance,
 )
-from .video_utils import read_video, save_video
+from .video_encoder import ENCODERS, FFmpegEncoder, OpenCVEncoder, VideoEncoder
+from .video_reader import VideoReader
+from .video_utils import get_video_fps, iter_video, read_video, save_video
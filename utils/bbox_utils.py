@@ -1,3 +1,6 @@
+import numpy as np
+
+
 def get_center_of_bbox(bbox):
     x1, y1, x2, y2 = bbox
     return int((x1 + x2) / 2), int((y1 + y2) / 2)
@@ -19,3 +22,24 @@ def measure_xy_distance(point1, point2):
 def get_foot_position(bbox):
     x1, y1, x2, y2 = bbox
     return int((x1 + x2) / 2), int(y2)
+
+
+def get_centers_of_bboxes(bboxes):
+    """
+    Batched `get_center_of_bbox` for an (N, 4) array of bboxes, returns (N, 2).
+    """
+    bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    return np.trunc(
+        np.stack(
+            [(bboxes[:, 0] + bboxes[:, 2]) / 2, (bboxes[:, 1] + bboxes[:, 3]) / 2],
+            axis=1,
+        )
+    )
+
+
+def get_foot_positions(bboxes):
+    """
+    Batched `get_foot_position` for an (N, 4) array of bboxes, returns (N, 2).
+    """
+    bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    return np.trunc(np.stack([(bboxes[:, 0] + bboxes[:, 2]) / 2, bboxes[:, 3]], axis=1))
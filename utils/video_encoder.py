@@ -0,0 +1,205 @@
+import queue
+import shutil
+import subprocess
+import threading
+
+import cv2
+import numpy as np
+
+
+class VideoEncoder:
+    """
+    Encodes frames on a background thread fed by a bounded queue, so encoding
+    overlaps with producing the frames. The writer is opened on the first frame,
+    which sets the resolution of the video.
+
+    Subclasses implement `open_writer`, `write_frame` and `close_writer`.
+
+    Usage:
+        with OpenCVEncoder("out.mp4", fps=25.0) as encoder:
+            for frame in frames:
+                encoder.write(frame)
+    """
+
+    def __init__(self, output_video_path, fps=24.0, queue_size=32) -> None:
+        self.output_video_path = output_video_path
+        self.fps = fps
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.error = None
+        self.frame_count = 0
+
+    def open_writer(self, frame_size):
+        raise NotImplementedError
+
+    def write_frame(self, frame):
+        raise NotImplementedError
+
+    def close_writer(self):
+        raise NotImplementedError
+
+    def write(self, frame):
+        self.raise_error()
+        if self.thread is None:
+            self.thread = threading.Thread(
+                target=self.encode,
+                args=((frame.shape[1], frame.shape[0]),),
+                name="video-encoder",
+                daemon=True,
+            )
+            self.thread.start()
+        self.frames.put(frame)
+        self.frame_count += 1
+
+    def encode(self, frame_size):
+        try:
+            self.open_writer(frame_size)
+            while (frame := self.frames.get()) is not None:
+                self.write_frame(frame)
+        except BaseException as error:
+            self.error = error
+            # Keep draining so producers blocked on a full queue are released
+            while self.frames.get() is not None:
+                pass
+        finally:
+            try:
+                self.close_writer()
+            except BaseException as error:
+                self.error = self.error or error
+
+    def close(self):
+        """
+        Wait for all queued frames to be encoded and close the video.
+        """
+        if self.thread is not None:
+            self.frames.put(None)
+            self.thread.join()
+            self.thread = None
+        self.raise_error()
+
+    def raise_error(self):
+        if self.error is not None:
+            raise RuntimeError(
+                f"Encoding {self.output_video_path} failed"
+            ) from self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class OpenCVEncoder(VideoEncoder):
+    """
+    Encodes with `cv2.VideoWriter` and the given `fourcc` codec.
+    """
+
+    def __init__(self, output_video_path, fps=24.0, queue_size=32, fourcc="mp4v"):
+        super().__init__(output_video_path, fps, queue_size)
+        self.fourcc = fourcc
+        self.writer = None
+
+    def open_writer(self, frame_size):
+        self.writer = cv2.VideoWriter(
+            self.output_video_path,
+            cv2.VideoWriter_fourcc(*self.fourcc),
+            self.fps,
+            frame_size,
+        )
+        if not self.writer.isOpened():
+            raise RuntimeError(
+                f"cv2.VideoWriter cannot open {self.output_video_path} with {self.fourcc}"
+            )
+
+    def write_frame(self, frame):
+        self.writer.write(frame)
+
+    def close_writer(self):
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
+
+
+class FFmpegEncoder(VideoEncoder):
+    """
+    Pipes raw BGR frames to an `ffmpeg` subprocess.
+
+    `codec` is any ffmpeg video encoder, e.g. "libx264" on the CPU or
+    "h264_nvenc", "h264_qsv" or "h264_videotoolbox" on hardware encoders, with
+    its `preset` and constant quality `crf`. Either can be None to leave them
+    out for encoders that do not support them.
+    """
+
+    def __init__(
+        self,
+        output_video_path,
+        fps=24.0,
+        queue_size=32,
+        codec="libx264",
+        preset="veryfast",
+        crf=23,
+        ffmpeg_path="ffmpeg",
+    ):
+        super().__init__(output_video_path, fps, queue_size)
+        self.codec = codec
+        self.preset = preset
+        self.crf = crf
+        self.ffmpeg_path = ffmpeg_path
+        self.process = None
+
+    def get_command(self, frame_size):
+        width, height = frame_size
+        command = [
+            self.ffmpeg_path,
+            "-y",
+            "-loglevel",
+            "error",
+            "-f",
+            "rawvideo",
+            "-pix_fmt",
+            "bgr24",
+            "-s",
+            f"{width}x{height}",
+            "-r",
+            str(self.fps),
+            "-i",
+            "-",
+            "-c:v",
+            self.codec,
+        ]
+        if self.preset is not None:
+            command += ["-preset", self.preset]
+        if self.crf is not None:
+            command += ["-crf", str(self.crf)]
+        if width % 2 or height % 2:
+            # yuv420p needs even dimensions
+            command += ["-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2"]
+        return command + ["-pix_fmt", "yuv420p", self.output_video_path]
+
+    def open_writer(self, frame_size):
+        if shutil.which(self.ffmpeg_path) is None:
+            raise RuntimeError(f"{self.ffmpeg_path} was not found")
+        self.process = subprocess.Popen(
+            self.get_command(frame_size),
+            stdin=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+
+    def write_frame(self, frame):
+        self.process.stdin.write(np.ascontiguousarray(frame).data)
+
+    def close_writer(self):
+        if self.process is None:
+            return
+        process, self.process = self.process, None
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        stderr = process.stderr.read().decode(errors="replace")
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with {process.returncode}: {stderr}")
+
+
+ENCODERS = {"opencv": OpenCVEncoder, "ffmpeg": FFmpegEncoder}
@@ -0,0 +1,161 @@
+import queue
+import threading
+
+import cv2
+
+
+class VideoReader:
+    """
+    Seekable reader of a video file.
+
+    The number of frames, frame rate and resolution are read from the container
+    up front. `frames` decodes only the requested range, optionally every
+    `stride`-th frame, downscaled and with a background read-ahead thread.
+
+    Usage:
+        reader = VideoReader("match.mp4", downscale=0.5, read_ahead=16)
+        start, stop = reader.time_to_frame(60), reader.time_to_frame(90)
+        for frame in reader.frames(start, stop, stride=2):
+            ...
+    """
+
+    _END = object()
+
+    def __init__(self, video_path, downscale=1.0, read_ahead=0, default_fps=24.0):
+        """
+        Args:
+            video_path: Path to the video file.
+            downscale: Factor applied to every decoded frame, e.g. 0.5 for half
+                resolution.
+            read_ahead: Number of frames decoded ahead of the consumer on a
+                background thread, 0 to decode on the calling thread.
+            default_fps: Frame rate used when the container does not report one.
+        """
+        self.video_path = video_path
+        self.downscale = downscale
+        self.read_ahead = read_ahead
+
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise IOError(f"Cannot open video {video_path}")
+        self.frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps and fps > 0 else default_fps
+        self.source_resolution = (
+            int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        )
+        cap.release()
+
+    def __len__(self):
+        return self.frame_count
+
+    def __iter__(self):
+        return self.frames()
+
+    @property
+    def resolution(self):
+        """
+        `(width, height)` of the frames returned by the reader.
+        """
+        width, height = self.source_resolution
+        if self.downscale == 1.0:
+            return width, height
+        return round(width * self.downscale), round(height * self.downscale)
+
+    @property
+    def duration(self):
+        return self.frame_count / self.fps
+
+    def time_to_frame(self, seconds):
+        """
+        Number of the frame shown at `seconds` into the video.
+        """
+        return min(max(int(seconds * self.fps), 0), self.frame_count)
+
+    def frames(self, start=0, stop=None, stride=1):
+        """
+        Yields the frames `start`, `start + stride`, ... before `stop` (the end of
+        the video when None).
+        """
+        if stride < 1:
+            raise ValueError(f"stride must be at least 1, got {stride}")
+        if self.read_ahead > 0:
+            return self._read_ahead(self._decode(start, stop, stride))
+        return self._decode(start, stop, stride)
+
+    def frames_between(self, start_seconds, stop_seconds=None, stride=1):
+        """
+        Yields the frames from `start_seconds` up to `stop_seconds` into the video.
+        """
+        stop = None if stop_seconds is None else self.time_to_frame(stop_seconds)
+        return self.frames(self.time_to_frame(start_seconds), stop, stride)
+
+    def read_frame(self, frame_num):
+        """
+        Decode the single frame `frame_num`, or None past the end of the video.
+        """
+        return next(self._decode(frame_num, frame_num + 1, 1), None)
+
+    def _decode(self, start, stop, stride):
+        cap = cv2.VideoCapture(self.video_path)
+        if start > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        frame_num = start
+        try:
+            while stop is None or frame_num < stop:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if self.downscale != 1.0:
+                    frame = cv2.resize(
+                        frame,
+                        self.resolution,
+                        interpolation=cv2.INTER_AREA,
+                    )
+                yield frame
+
+                # Skipped frames are only demuxed, not converted
+                for _ in range(stride - 1):
+                    frame_num += 1
+                    if (stop is not None and frame_num >= stop) or not cap.grab():
+                        return
+                frame_num += 1
+        finally:
+            cap.release()
+
+    def _read_ahead(self, frames):
+        frame_queue = queue.Queue(maxsize=self.read_ahead)
+        stop = threading.Event()
+
+        def put(item):
+            # Bounded put that gives up once the consumer has stopped
+            while not stop.is_set():
+                try:
+                    frame_queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def decode():
+            try:
+                for frame in frames:
+                    if not put(frame):
+                        return
+            except BaseException as e:
+                put(e)
+            finally:
+                put(self._END)
+                frames.close()
+
+        thread = threading.Thread(target=decode, name="video-reader", daemon=True)
+        thread.start()
+        try:
+            while (frame := frame_queue.get()) is not self._END:
+                if isinstance(frame, BaseException):
+                    raise frame
+                yield frame
+        finally:
+            stop.set()
+            thread.join()
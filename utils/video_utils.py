@@ -1,46 +1,62 @@
 import cv2
 
+from .video_encoder import ENCODERS
+from .video_reader import VideoReader
+
 
 def read_video(video_path):
     """
     Reads a video file from the given `video_path` and returns a list of frames.
+    Use `VideoReader` to read only part of the video or to read it lazily.
     """
-    cap = cv2.VideoCapture(video_path)
-    frames = []
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if ret is False:
-            break
-        frames.append(frame)
+    return list(VideoReader(video_path))
+
+
+def iter_video(video_path, frame_start=0, frame_stop=None):
+    """
+    Yields the frames of the video file at `video_path` one at a time, so the
+    whole video never has to be held in memory. Optionally only the frames from
+    `frame_start` up to (not including) `frame_stop` are read.
+    """
+    return VideoReader(video_path).frames(frame_start, frame_stop)
 
-    return frames
 
+def get_video_fps(video_path, default=24.0):
+    """
+    Returns the frame rate of the video at `video_path`, or `default` when the
+    container does not report one.
+    """
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+    return fps if fps and fps > 0 else default
 
-def save_video(output_video_frames, output_video_path):
+
+def save_video(
+    output_video_frames, output_video_path, fps=24.0, encoder="opencv", **options
+):
     """
     Saves the given `output_video_frames` as a video file at the specified `output_video_path`.
 
     Parameters:
-        output_video_frames (List): A list of frames representing the video.
+        output_video_frames (Iterable): A list, or any iterable such as a generator, of frames representing the video.
         output_video_path (str): The path where the video file will be saved.
+        fps (float): Frame rate of the saved video, pass the one of the source video to keep its timing.
+        encoder (str): "opencv" for `cv2.VideoWriter` or "ffmpeg" to pipe the frames to an ffmpeg subprocess.
+        **options: Options of the encoder, e.g. `fourcc` for OpenCV or `codec`, `preset` and `crf` for ffmpeg.
 
     Returns:
         None
 
-    This function uses the OpenCV library to save the video frames as a video file. It first creates a VideoWriter object
-    with the specified output video path, fourcc code, frame rate, and frame size. Then, it iterates over each frame in
-    the `output_video_frames` list and writes it to the video file using the `write` method of the VideoWriter object.
-    Finally, it releases the VideoWriter object to close the video file.
-    """
-    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-    out = cv2.VideoWriter(
-        output_video_path,
-        fourcc,
-        24.0,
-        (output_video_frames[0].shape[1], output_video_frames[0].shape[0]),
-    )
+    Frames are consumed lazily and encoded on a background thread with a bounded queue, so when the frames come
+    from a generator, encoding overlaps with producing them. The resolution of the video is that of the first frame.
+    """
     print("Write frames to the video")
-    for frame in output_video_frames:
-        out.write(frame)
-    out.release()
+    with ENCODERS[encoder](output_video_path, fps, **options) as video_encoder:
+        for frame in output_video_frames:
+            video_encoder.write(frame)
+
+    if video_encoder.frame_count == 0:
+        print("No frames to write")
+        return
     print(f"The Video is saved at path: {output_video_path}")
@@ -1 +1,2 @@
+from .homography_track import HomographyTrack
 from .view_transformer import ViewTransformer
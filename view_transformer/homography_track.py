@@ -0,0 +1,223 @@
+import os
+
+import cv2
+import numpy as np
+
+from .view_transformer import ViewTransformer
+
+
+class HomographyTrack:
+    """
+    Per-frame homography from the pixels of each frame to the pitch, in metres.
+
+    The static calibration of `ViewTransformer` holds for the first frame. The
+    camera motion is followed with features tracked by Lucas-Kanade from a
+    keyframe, and a RANSAC homography from the current frame to the keyframe is
+    composed with the keyframe's own mapping to the first frame. Estimating
+    against the keyframe rather than the previous frame keeps the error from
+    accumulating every frame. A new keyframe is anchored at the current frame
+    every `keyframe_interval` frames, or earlier when too few features survive
+    (the camera panned away or zoomed).
+
+    The homographies are kept as an `(n_frames, 3, 3)` array and applied to all
+    points at once, without the polygon test of `ViewTransformer`, so pitch
+    coordinates stay valid when the calibrated area leaves the frame.
+    """
+
+    def __init__(
+        self,
+        calibration=None,
+        keyframe_interval=48,
+        min_inliers=40,
+        max_features=400,
+        downscale=0.5,
+    ) -> None:
+        """
+        Args:
+            calibration: 3x3 homography from the pixels of the first frame to the
+                pitch, by default the one of `ViewTransformer`.
+            keyframe_interval: Maximum number of frames between two keyframes.
+            min_inliers: Minimum number of RANSAC inliers for the homography to the
+                keyframe to be trusted; below it the frame becomes a keyframe.
+            max_features: Number of features detected on a keyframe.
+            downscale: Factor applied to the grey frames before tracking features.
+                The homographies are in pixels of the original frame.
+        """
+        if calibration is None:
+            calibration = ViewTransformer().perspective_transformer
+        self.calibration = np.asarray(calibration, dtype=np.float64)
+        self.keyframe_interval = keyframe_interval
+        self.min_inliers = min_inliers
+        self.downscale = downscale
+
+        self.features = dict(
+            maxCorners=max_features, qualityLevel=0.01, minDistance=8, blockSize=7
+        )
+        self.lk_params = dict(
+            winSize=(21, 21),
+            maxLevel=3,
+            criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03),
+        )
+
+        # Downscaled to original pixels and back
+        self.scale = np.diag([downscale, downscale, 1.0])
+        self.unscale = np.diag([1 / downscale, 1 / downscale, 1.0])
+
+        self.homographies = np.empty((0, 3, 3), dtype=np.float32)
+
+    def to_grey(self, frame):
+        frame_grey = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self.downscale != 1.0:
+            frame_grey = cv2.resize(
+                frame_grey,
+                None,
+                fx=self.downscale,
+                fy=self.downscale,
+                interpolation=cv2.INTER_AREA,
+            )
+        return frame_grey
+
+    def get_homography_stream(self, frames):
+        """
+        Consumes any iterable of frames and yields `(frame, homography)` pairs,
+        where `homography` maps the pixels of the frame to the pitch.
+        """
+        old_grey = None
+        # Pixels of the keyframe to pixels of the first frame
+        keyframe_to_first = np.eye(3)
+        frame_to_first = np.eye(3)
+        keyframe_points = points = None
+        frames_since_keyframe = 0
+
+        for frame in frames:
+            frame_grey = self.to_grey(frame)
+            is_keyframe = old_grey is None
+
+            if not is_keyframe:
+                frames_since_keyframe += 1
+                points, keyframe_points, homography = self.track_to_keyframe(
+                    old_grey, frame_grey, points, keyframe_points
+                )
+                if homography is not None:
+                    frame_to_first = keyframe_to_first @ (
+                        self.unscale @ homography @ self.scale
+                    )
+                # Otherwise the camera is assumed still since the last frame
+                is_keyframe = (
+                    homography is None
+                    or frames_since_keyframe >= self.keyframe_interval
+                )
+
+            if is_keyframe:
+                keyframe_to_first = frame_to_first
+                keyframe_points = cv2.goodFeaturesToTrack(frame_grey, **self.features)
+                if keyframe_points is None:
+                    keyframe_points = np.empty((0, 1, 2), dtype=np.float32)
+                points = keyframe_points
+                frames_since_keyframe = 0
+
+            old_grey = frame_grey
+            frame_to_pitch = self.calibration @ frame_to_first
+            yield frame, frame_to_pitch / frame_to_pitch[2, 2]
+
+    def track_to_keyframe(self, old_grey, frame_grey, points, keyframe_points):
+        """
+        Track `points` into the new frame and fit the homography from the new frame
+        to the keyframe. Returns the inlier points, their keyframe positions and the
+        homography, None when there are not enough inliers.
+        """
+        if len(points) < self.min_inliers:
+            return points, keyframe_points, None
+
+        new_points, status, _ = cv2.calcOpticalFlowPyrLK(
+            old_grey, frame_grey, points, None, **self.lk_params
+        )
+        found = status.ravel() == 1
+        new_points = new_points[found]
+        keyframe_points = keyframe_points[found]
+        if len(new_points) < self.min_inliers:
+            return new_points, keyframe_points, None
+
+        homography, inliers = cv2.findHomography(
+            new_points, keyframe_points, cv2.RANSAC, 2.0
+        )
+        if homography is None or inliers.sum() < self.min_inliers:
+            return new_points, keyframe_points, None
+
+        # Features on moving players are dropped with the outliers
+        inliers = inliers.ravel() == 1
+        return new_points[inliers], keyframe_points[inliers], homography
+
+    def get_homographies(self, frames, read_from_stub=False, stub_path=None):
+        """
+        Homographies of all `frames` as an `(n_frames, 3, 3)` array, also kept in
+        `homographies`. Saved to (and read back from) `stub_path` as `.npy`; a stub
+        with another number of frames is from another video and is recomputed.
+        """
+        if read_from_stub and stub_path is not None and os.path.exists(stub_path):
+            homographies = np.load(stub_path)
+            if len(homographies) == len(frames):
+                self.homographies = homographies
+                return self.homographies
+
+        homographies = [
+            homography for _, homography in self.get_homography_stream(frames)
+        ]
+        self.homographies = np.array(homographies, dtype=np.float32).reshape(-1, 3, 3)
+
+        if stub_path is not None:
+            np.save(stub_path, self.homographies)
+        return self.homographies
+
+    @staticmethod
+    def transform_points(points, homographies):
+        """
+        Map `(N, 2)` pixel positions with their `(N, 3, 3)` homographies (or one
+        `(3, 3)` homography for all). Points beyond the horizon are NaN.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        homographies = np.asarray(homographies, dtype=np.float64)
+        homogeneous = np.concatenate([points, np.ones((len(points), 1))], axis=1)
+        if homographies.ndim == 2:
+            projected = homogeneous @ homographies.T
+        else:
+            projected = np.einsum("nij,nj->ni", homographies, homogeneous)
+
+        scale = projected[:, 2:]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            transformed_points = projected[:, :2] / scale
+        transformed_points[scale[:, 0] <= 0] = np.nan
+        return transformed_points.astype(np.float32)
+
+    def add_transformed_position_to_store(self, store):
+        """
+        Transformed positions of all rows of a `TrackStore`, from their positions
+        in the frame (the homographies already account for the camera movement).
+        """
+        if len(self.homographies) < store.n_frames:
+            raise ValueError(
+                f"{len(self.homographies)} homographies for {store.n_frames} frames"
+            )
+        transformed_positions = self.transform_points(
+            store.position, self.homographies[store.frame]
+        )
+        store.set("transformed_position", transformed_positions)
+
+    def add_transformed_position_to_frame_tracks(self, frame_tracks, homography):
+        track_infos = [
+            track_info
+            for track in frame_tracks.values()
+            for track_info in track.values()
+        ]
+        if not track_infos:
+            return
+
+        transformed_positions = self.transform_points(
+            [track_info["position"] for track_info in track_infos], homography
+        )
+        for track_info, transformed_position in zip(track_infos, transformed_positions):
+            track_info["transformed_position"] = (
+                None
+                if np.isnan(transformed_position).any()
+                else transformed_position.tolist()
+            )
@@ -56,29 +56,70 @@ class ViewTransformer:
         # This is the expected format for the point representation
         return transformed_point.reshape(-1, 2)
 
+    def transform_points(self, points):
+        """
+        Batched `transform_point` for an (N, 2) array of pixel positions.
+
+        Returns the (N, 2) transformed positions, NaN for points outside the pixel
+        vertices, and the (N,) boolean mask of points inside them.
+        """
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+
+        # Same inside test as `transform_point`, done on the integer pixel coordinates
+        is_inside = self.points_inside_pixel_vertices(np.trunc(points))
+
+        transformed_points = np.full_like(points, np.nan)
+        if is_inside.any():
+            transformed_points[is_inside] = cv2.perspectiveTransform(
+                points[is_inside].reshape(-1, 1, 2), self.perspective_transformer
+            ).reshape(-1, 2)
+
+        return transformed_points, is_inside
+
+    def points_inside_pixel_vertices(self, points):
+        # The pixel vertices form a convex quadrilateral, so a point is inside (or on
+        # the border) when it lies on the same side of every edge
+        vertices = self.pixel_vertices
+        edges = np.roll(vertices, -1, axis=0) - vertices
+        relative = points[:, None, :] - vertices[None, :, :]
+        cross = (
+            edges[None, :, 0] * relative[..., 1] - edges[None, :, 1] * relative[..., 0]
+        )
+        return np.all(cross >= 0, axis=1) | np.all(cross <= 0, axis=1)
+
+    def add_transformed_position_to_store(self, store):
+        """
+        Vectorized `add_transformed_position_to_tracks` for a `TrackStore`.
+        """
+        transformed_positions, _ = self.transform_points(store.adjusted_position)
+        store.set("transformed_position", transformed_positions)
+
     def add_transformed_position_to_tracks(self, tracks):
-        # Iterate over the tracks dictionary
-        for objects, object_track in tracks.items():
-            # Iterate over the frames in each object track
-            for frame_num, track in enumerate(object_track):
-                # Iterate over the tracks in each frame
-                for track_id, track_info in track.items():
-                    # Get the adjusted position of the track
-                    position = track_info["adjusted_position"]
-                    # Convert the position to a NumPy array
-                    position = np.array(position)
-
-                    # Transform the position using the perspective transformer
-                    transformer_position = self.transform_point(position)
-
-                    # If the transformed position is not None (i.e., it is inside the target vertices)
-                    if transformer_position is not None:
-                        # Squeeze the transformed position to remove any unnecessary dimensions
-                        # and convert it to a list
-                        transformer_position = transformer_position.squeeze().tolist()
-
-                        # Add the transformed position to the track dictionary under the
-                        # key "transformed_position"
-                    tracks[objects][frame_num][track_id][
-                        "transformed_position"
-                    ] = transformer_position
+        # Iterate over the frames of the tracks dictionary
+        for frame_num in range(len(tracks["players"])):
+            self.add_transformed_position_to_frame_tracks(
+                {objects: tracks[objects][frame_num] for objects in tracks}
+            )
+
+    def add_transformed_position_to_frame_tracks(self, frame_tracks):
+        # Iterate over the objects of a single frame
+        for objects, track in frame_tracks.items():
+            # Iterate over the tracks in the frame
+            for track_id, track_info in track.items():
+                # Get the adjusted position of the track
+                position = track_info["adjusted_position"]
+                # Convert the position to a NumPy array
+                position = np.array(position)
+
+                # Transform the position using the perspective transformer
+                transformer_position = self.transform_point(position)
+
+                # If the transformed position is not None (i.e., it is inside the target vertices)
+                if transformer_position is not None:
+                    # Squeeze the transformed position to remove any unnecessary dimensions
+                    # and convert it to a list
+                    transformer_position = transformer_position.squeeze().tolist()
+
+                # Add the transformed position to the track dictionary under the
+                # key "transformed_position"
+                track[track_id]["transformed_position"] = transformer_position
@@ -1,7 +1,7 @@
-from ultralytics import YOLO
+from trackers.detector_backend import DetectorBackend
 
-# model = YOLO("yolov8n")
-model = YOLO("models/best.pt")
+# "ultralytics", "onnx" or "openvino", exported models are cached next to the weights
+model = DetectorBackend("models/best.pt", backend="ultralytics").load()
 
 results = model.predict("input_videos/08fd33_4.mp4", save=True)
 print(results[0])